@@ -1,4 +1,6 @@
 from typing import TypedDict
+from heapq import merge
+from itertools import islice
 from django.db.models import Model
 from django.http.request import QueryDict
 from apps.datastreams.models import Datastream
@@ -12,9 +14,12 @@ from apps.dsreadings.models import (
     InvalidDsReading,
     NoDataMarker,
     UnusedNoDataMarker,
+    DsReadingRollup,
 )
-from apps.dfreadings.models import DfReading
-from monapps.additional_settings.custom_settings import MAX_READINGS_PER_API_CALL
+from apps.dfreadings.models import DfReading, DfReadingSpan, DfReadingStats
+from monapps.additional_settings.custom_settings import MAX_READINGS_PER_API_CALL, DS_ROLLUP_TIERS_MS
+from utils.rollup_utils import get_rollup_tier, combine_rollups
+from utils.dfr_span_utils import expand_df_reading_spans
 
 
 class ReadingDict(TypedDict):
@@ -28,6 +33,7 @@ class ReadingDict(TypedDict):
 
 reading_to_base_model_map = {
     "dfreading": Datafeed,
+    "dfreadingstats": Datafeed,
     "dsreading": Datastream,
     "invaliddsreading": Datastream,
     "unuseddsreading": Datastream,
@@ -38,6 +44,7 @@ reading_to_base_model_map = {
 
 shortened_names_map = {
     "dfreading": "dfReadings",
+    "dfreadingstats": "dfrStats",
     "dsreading": "dsReadings",
     "invaliddsreading": "invDsReadings",
     "unuseddsreading": "unusDsReadings",
@@ -59,12 +66,19 @@ def get_readings(
     if reading_model_name not in reading_to_base_model_map:
         raise Exception(f"Unknown reading model: {reading_model_name}")
 
+    if reading_model is DfReading:
+        # df readings can be partly stored as spans
+        return get_df_readings(base_model_instance_pk, query_params, serializer)
+
     reading_dict: ReadingDict = {}
     shortened_reading_model_name = shortened_names_map[reading_model_name]
     reading_dict["id"] = f"{base_model_name} {base_model_instance_pk}"
     reading_dict["readingType"] = shortened_reading_model_name
 
     filter_dict = {base_model_name: base_model_instance_pk}
+    if reading_model is DfReadingStats:
+        # the stats of a shared datafeed are stored under its source datafeed
+        filter_dict = {base_model_name: Datafeed.objects.get(pk=base_model_instance_pk).reading_df_id}
     qs = reading_model.objects.filter(**filter_dict).order_by("time")
 
     tot_num_readings = qs.count()
@@ -129,3 +143,135 @@ def create_http_response(reading_model, query_params: QueryDict, reading_seriali
         return Response({"error": "Invalid query parameters"}, status=400)
     except Exception as e:
         return Response({"error": str(e)}, status=500)
+
+
+def get_df_readings(df_pk: int, query_params: QueryDict, serializer: Serializer) -> ReadingDict:
+
+    df = Datafeed.objects.select_related("parent").get(pk=df_pk)
+    time_resample = df.time_resample
+
+    reading_dict: ReadingDict = {}
+    reading_dict["id"] = f"datafeed {df_pk}"
+    reading_dict["readingType"] = shortened_names_map["dfreading"]
+
+    # the df readings of a shared datafeed are stored under its source datafeed
+    qs = DfReading.objects.filter(datafeed=df.reading_df_id).order_by("time")
+    span_qs = DfReadingSpan.objects.filter(datafeed=df.reading_df_id).order_by("time")
+
+    spans = list(span_qs)  # there are few spans by design
+    tot_num_readings = qs.count() + sum(span.get_num_readings(time_resample) for span in spans)
+    reading_dict["totalNumReadings"] = tot_num_readings
+
+    if tot_num_readings == 0:
+        reading_dict["batch"] = []
+        reading_dict["firstReadingTs"] = None
+        reading_dict["lastReadingTs"] = None
+        return reading_dict
+
+    first_reading = qs.first()
+    last_reading = qs.last()
+    first_tss = [first_reading.time] if first_reading is not None else []
+    last_tss = [last_reading.time] if last_reading is not None else []
+    if len(spans) > 0:
+        first_tss.append(spans[0].time)
+        last_tss.append(max(span.end_time for span in spans))
+    reading_dict["firstReadingTs"] = min(first_tss)
+    reading_dict["lastReadingTs"] = max(last_tss)
+
+    from_rts = None
+    if "gt" in query_params:
+        from_rts = int(query_params.get("gt"))
+    elif "gte" in query_params:
+        from_rts = int(query_params.get("gte")) - 1
+    if from_rts is not None:
+        qs = qs.filter(time__gt=from_rts)
+        spans = [span for span in spans if span.end_time > from_rts]
+
+    num_readings = MAX_READINGS_PER_API_CALL
+    to_rts = None
+    if "qty" in query_params:
+        num_readings = min(int(query_params.get("qty")), num_readings)
+    elif "lte" in query_params:
+        to_rts = int(query_params.get("lte"))
+        qs = qs.filter(time__lte=to_rts)
+        spans = [span for span in spans if span.time <= to_rts]
+
+    # the spans are expanded lazily, only the readings that get into the response are created
+    df_readings = merge(
+        qs[:num_readings].iterator(),
+        expand_df_reading_spans(spans, df, from_rts, to_rts),
+        key=lambda dfr: dfr.time,
+    )
+    readings = serializer(list(islice(df_readings, num_readings)), many=True)
+    reading_dict["batch"] = readings.data
+
+    return reading_dict
+
+
+def get_rollups(ds_pk: int, query_params: QueryDict, serializer: Serializer) -> ReadingDict:
+
+    # 'resol' should be a multiple of one of the rollup tiers, by default the smallest tier is used
+    resol = int(query_params.get("resol", min(DS_ROLLUP_TIERS_MS)))
+    tier = get_rollup_tier(resol)
+    if tier is None:
+        raise ValueError(f"Resolution {resol} is not a multiple of any rollup tier")
+
+    reading_dict: ReadingDict = {}
+    reading_dict["id"] = f"datastream {ds_pk}"
+    reading_dict["readingType"] = "dsRollups"
+
+    qs = DsReadingRollup.objects.filter(datastream=ds_pk, tier=tier).order_by("time")
+
+    tot_num_readings = qs.count()
+    reading_dict["totalNumReadings"] = tot_num_readings
+
+    if tot_num_readings == 0:
+        reading_dict["batch"] = []
+        reading_dict["firstReadingTs"] = None
+        reading_dict["lastReadingTs"] = None
+        return reading_dict
+
+    reading_dict["firstReadingTs"] = qs.first().time
+    reading_dict["lastReadingTs"] = qs.last().time
+
+    if "gt" in query_params:
+        gt = int(query_params.get("gt"))
+        qs = qs.filter(time__gt=gt)
+    elif "gte" in query_params:
+        gte = int(query_params.get("gte"))
+        qs = qs.filter(time__gte=gte)
+
+    num_rollups_per_bin = resol // tier
+    if "qty" in query_params:
+        qty = int(query_params.get("qty"))
+        qs = qs[: qty * num_rollups_per_bin]
+    elif "lte" in query_params:
+        lte = int(query_params.get("lte"))
+        qs = qs.filter(time__lte=lte)
+
+    # limit the number of readings in the response
+    rollups = list(qs[: MAX_READINGS_PER_API_CALL * num_rollups_per_bin])
+    if tier != resol:
+        rollups = combine_rollups(rollups, resol)
+    rollups = rollups[:MAX_READINGS_PER_API_CALL]
+
+    reading_dict["batch"] = serializer(rollups, many=True).data
+    return reading_dict
+
+
+def create_rollups_http_response(query_params: QueryDict, rollup_serializer: Serializer, **kwargs) -> Response:
+
+    try:
+        ds_pk = int(kwargs.get("pk"))
+        Datastream.objects.get(pk=ds_pk)
+    except Datastream.DoesNotExist:
+        return Response({"error": "Corresponding Datastream instance not found"}, status=404)
+    except ValueError:
+        return Response({"error": "Invalid datastream pk"}, status=400)
+    try:
+        reading_dict = get_rollups(ds_pk, query_params, rollup_serializer)
+        return Response(reading_dict, status=200)
+    except ValueError:
+        return Response({"error": "Invalid query parameters"}, status=400)
+    except Exception as e:
+        return Response({"error": str(e)}, status=500)
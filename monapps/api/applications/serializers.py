@@ -2,12 +2,14 @@ from rest_framework import serializers
 
 from apps.applications.models import Application
 from utils.db_field_utils import get_parent_full_id, get_instance_full_id
+from utils.exec_profile_utils import get_profile_percentiles
 
 
 class AppSerializer(serializers.ModelSerializer):
 
     id = serializers.SerializerMethodField()
     parentId = serializers.SerializerMethodField()
+    execProfile = serializers.SerializerMethodField()
 
     def get_id(self, instance):
         return get_instance_full_id(instance)
@@ -15,6 +17,9 @@ class AppSerializer(serializers.ModelSerializer):
     def get_parentId(self, instance):
         return get_parent_full_id(instance)
 
+    def get_execProfile(self, instance):
+        return get_profile_percentiles(instance.exec_profile)
+
     timeResample = serializers.IntegerField(source="time_resample")
     cursorTs = serializers.IntegerField(source="cursor_ts")
     isCatchingUp = serializers.BooleanField(source="is_catching_up")
@@ -26,6 +31,8 @@ class AppSerializer(serializers.ModelSerializer):
     lastCurrStateUpdateTs = serializers.IntegerField(source="last_curr_state_update_ts")
     statusUse = serializers.IntegerField(source="status_use")
     currStateUse = serializers.IntegerField(source="curr_state_use")
+    stateSize = serializers.IntegerField(source="state_size")
+    catchUpProgress = serializers.JSONField(source="catch_up_progress")
 
     class Meta:
         model = Application
@@ -35,6 +42,7 @@ class AppSerializer(serializers.ModelSerializer):
             "timeResample",
             "cursorTs",
             "isCatchingUp",
+            "catchUpProgress",
             "isEnabled",
             "isStatusStale",
             "isCurrStateStale",
@@ -44,6 +52,8 @@ class AppSerializer(serializers.ModelSerializer):
             "lastCurrStateUpdateTs",
             "statusUse",
             "currStateUse",
+            "stateSize",
+            "execProfile",
             "errors",
             "warnings",
             "health",
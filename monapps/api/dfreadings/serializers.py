@@ -15,3 +15,32 @@ class DfrSerializer(serializers.Serializer):
 
     class Meta:
         fields = ["t", "v", "r"]
+
+
+class DfrStatsSerializer(serializers.Serializer):
+
+    t = serializers.IntegerField(source="time")
+    n = serializers.IntegerField(source="count")
+    avg = serializers.SerializerMethodField()
+    sum = serializers.SerializerMethodField()
+    min = serializers.SerializerMethodField()
+    max = serializers.SerializerMethodField()
+    last = serializers.SerializerMethodField()
+
+    def get_avg(self, instance):
+        return round(instance.sum / instance.count, 3) if instance.count > 0 else None
+
+    def get_sum(self, instance):
+        return round(instance.sum, 3)
+
+    def get_min(self, instance):
+        return round(instance.min, 3)
+
+    def get_max(self, instance):
+        return round(instance.max, 3)
+
+    def get_last(self, instance):
+        return round(instance.last, 3)
+
+    class Meta:
+        fields = ["t", "n", "avg", "sum", "min", "max", "last"]
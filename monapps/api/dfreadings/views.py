@@ -1,8 +1,8 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .serializers import DfrSerializer
+from .serializers import DfrSerializer, DfrStatsSerializer
 from apps.datafeeds.models import Datafeed
-from apps.dfreadings.models import DfReading
+from apps.dfreadings.models import DfReading, DfReadingStats
 from monapps.additional_settings.custom_settings import MAX_READINGS_PER_API_CALL
 from api.api_utils.get_readings import create_http_response
 
@@ -11,3 +11,9 @@ class ListDfReadings(APIView):
 
     def get(self, request, **kwargs):
         return create_http_response(DfReading, self.request.query_params, DfrSerializer, **kwargs)
+
+
+class ListDfReadingStats(APIView):
+
+    def get(self, request, **kwargs):
+        return create_http_response(DfReadingStats, self.request.query_params, DfrStatsSerializer, **kwargs)
@@ -17,3 +17,32 @@ class DsrSerializer(serializers.Serializer):
 
     class Meta:
         fields = ["t", "v"]
+
+
+class DsRollupSerializer(serializers.Serializer):
+
+    t = serializers.IntegerField(source="time")
+    n = serializers.IntegerField(source="count")
+    avg = serializers.SerializerMethodField()
+    sum = serializers.SerializerMethodField()
+    min = serializers.SerializerMethodField()
+    max = serializers.SerializerMethodField()
+    last = serializers.SerializerMethodField()
+
+    def get_avg(self, instance):
+        return round(instance.sum / instance.count, 3) if instance.count > 0 else None
+
+    def get_sum(self, instance):
+        return round(instance.sum, 3)
+
+    def get_min(self, instance):
+        return round(instance.min, 3) if instance.min is not None else None
+
+    def get_max(self, instance):
+        return round(instance.max, 3) if instance.max is not None else None
+
+    def get_last(self, instance):
+        return round(instance.last, 3) if instance.last is not None else None
+
+    class Meta:
+        fields = ["t", "n", "avg", "sum", "min", "max", "last"]
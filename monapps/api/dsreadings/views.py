@@ -1,6 +1,6 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .serializers import DsrSerializer
+from .serializers import DsrSerializer, DsRollupSerializer
 from apps.dsreadings.models import (
     DsReading,
     UnusedDsReading,
@@ -9,7 +9,7 @@ from apps.dsreadings.models import (
     NoDataMarker,
     UnusedNoDataMarker,
 )
-from api.api_utils.get_readings import create_http_response
+from api.api_utils.get_readings import create_http_response, create_rollups_http_response
 
 
 class ListDsReadings(APIView):
@@ -40,3 +40,8 @@ class ListNoDataMarkers(APIView):
 class ListUnusedNoDataMarkers(APIView):
     def get(self, request, **kwargs):
         return create_http_response(UnusedNoDataMarker, self.request.query_params, DsrSerializer, **kwargs)
+
+
+class ListDsRollups(APIView):
+    def get(self, request, **kwargs):
+        return create_rollups_http_response(self.request.query_params, DsRollupSerializer, **kwargs)
@@ -6,8 +6,9 @@ from api.dsreadings.views import (
     ListNonRocDsReadings,
     ListUnusedNoDataMarkers,
     ListNoDataMarkers,
+    ListDsRollups,
 )
-from api.dfreadings.views import ListDfReadings
+from api.dfreadings.views import ListDfReadings, ListDfReadingStats
 
 
 urlpatterns = [
@@ -19,10 +20,12 @@ urlpatterns = [
     path("nodes/", include("api.nodes.urls")),
     path("health/", include("api.health_check.urls")),
     path("dfreadings/<int:pk>/", ListDfReadings.as_view()),
+    path("dfrstats/<int:pk>/", ListDfReadingStats.as_view()),
     path("dsreadings/<int:pk>/", ListDsReadings.as_view()),
     path("unusdsreadings/<int:pk>/", ListUnusedDsReadings.as_view()),
     path("invdsreadings/<int:pk>/", ListInvalidDsReadings.as_view()),
     path("norcdsreadings/<int:pk>/", ListNonRocDsReadings.as_view()),
     path("unusndmarkers/<int:pk>/", ListUnusedNoDataMarkers.as_view()),
     path("ndmarkers/<int:pk>/", ListNoDataMarkers.as_view()),
+    path("dsrollups/<int:pk>/", ListDsRollups.as_view()),
 ]
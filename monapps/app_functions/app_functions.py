@@ -1,21 +1,17 @@
-from .stall_detection_by_two_temps import stall_detection_by_two_temps_0_0_1, stall_detection_by_two_temps_1_0_0
-from .sv_leak_detection_by_two_temps import sv_leak_detection_by_two_temps_1_0_0
-from .monitoring import monitoring_1_0_0
-from .fake_data_generator import fake_data_generator_1_0_0
-
-
-app_function_map = {
+# {func_name: {func_version: "<module>:<attribute>"}}, the modules are imported on first use
+# (see 'utils/app_func_map_utils.py'), app functions of other packages are added with entry points
+app_function_paths = {
     "stall_detection_by_two_temps": {
-        "0.0.1": stall_detection_by_two_temps_0_0_1,
-        "1.0.0": stall_detection_by_two_temps_1_0_0,
+        "0.0.1": "app_functions.stall_detection_by_two_temps.ver_0_0_1:stall_detection_by_two_temps_0_0_1",
+        "1.0.0": "app_functions.stall_detection_by_two_temps.ver_1_0_0:stall_detection_by_two_temps_1_0_0",
     },
     "sv_leak_detection_by_two_temps": {
-        "1.0.0": sv_leak_detection_by_two_temps_1_0_0,
+        "1.0.0": "app_functions.sv_leak_detection_by_two_temps.ver_1_0_0:sv_leak_detection_by_two_temps_1_0_0",
     },
     "monitoring": {
-        "1.0.0": monitoring_1_0_0,
+        "1.0.0": "app_functions.monitoring.ver_1_0_0:monitoring_1_0_0",
     },
     "fake_data_generator": {
-        "1.0.0": fake_data_generator_1_0_0,
+        "1.0.0": "app_functions.fake_data_generator.ver_1_0_0:fake_data_generator_1_0_0",
     },
 }
@@ -0,0 +1,151 @@
+import time
+from typing import TypedDict, Any
+
+import numpy as np
+
+from apps.applications.models import Application, AppType
+from apps.datafeeds.models import Datafeed
+from apps.datatypes.models import DataType
+from common.complex_types import AppFunction, DerivedDfReadingMap
+from common.constants import DataAggTypes, VariableTypes, STATUS_FIELD_NAME, CURR_STATE_FIELD_NAME
+from utils.app_state_utils import serialize_app_state, get_app_state_size
+from utils.dfr_store_utils import MemDfReadingStore, mem_dfr_store
+
+
+class NativeDfArrays(TypedDict):
+    var_type: VariableTypes
+    agg_type: DataAggTypes
+    rtss: np.ndarray  # int64 timestamps on the grid of the application
+    values: np.ndarray  # float64 values, NaN - no df reading
+
+
+class AppRunReport(TypedDict):
+    num_calls: int
+    num_ticks: int  # the number of 'time_resample' steps the cursor moved
+    total_time: float  # seconds
+    time_per_tick: float  # microseconds
+    phase_times: dict[str, float]  # seconds, {"app_func": ..., "state": ..., "outputs": ...}
+    state_size: int
+
+
+# the derived datafeeds of the app functions have these data types in the db
+DERIVED_DF_TYPES = {
+    STATUS_FIELD_NAME: (VariableTypes.NOMINAL, DataAggTypes.LAST),
+    CURR_STATE_FIELD_NAME: (VariableTypes.NOMINAL, DataAggTypes.LAST),
+}
+
+
+class InMemoryAppRunner:
+    """
+    Executes an app function without the db. The application and its datafeeds are unsaved instances,
+    the df readings of the native datafeeds (synthetic or recorded arrays) are kept in a 'MemDfReadingStore',
+    the derived df readings returned by the app function are added to the store too. The app function
+    is executed window after window, the same way 'AppFuncExecutor' does it, until its cursor stops,
+    the derived df values, the alarm payload and the state are captured, and the time of every phase is measured.
+    """
+
+    def __init__(
+        self,
+        app_func: AppFunction,
+        func_name: str,
+        app_settings: dict[str, Any],
+        time_resample: int,
+        cursor_ts: int,
+        native_dfs: dict[str, NativeDfArrays],
+        derived_df_names: list[str],
+        state: dict[str, Any] | None = None,
+    ):
+        self.app_func = app_func
+        self.app = Application(
+            pk=1,
+            type=AppType(name=func_name, func_name=func_name),
+            settings=app_settings,
+            state=state or {},
+            time_resample=time_resample,
+            cursor_ts=cursor_ts,
+            is_enabled=True,
+        )
+        self.store = MemDfReadingStore()
+        self.native_df_map: dict[str, Datafeed] = {}
+        self.derived_df_map: dict[str, Datafeed] = {}
+
+        df_pk = 0
+        for name, arrays in native_dfs.items():
+            df_pk += 1
+            df = self.create_df(df_pk, name, arrays["var_type"], arrays["agg_type"])
+            self.store.add_df_values(df_pk, arrays["rtss"], arrays["values"])
+            # the app functions process the df readings up to the last one
+            df.ts_to_start_with = int(arrays["rtss"][-1]) if len(arrays["rtss"]) > 0 else cursor_ts
+            self.native_df_map[name] = df
+        for name in derived_df_names:
+            df_pk += 1
+            self.derived_df_map[name] = self.create_df(df_pk, name, *DERIVED_DF_TYPES[name])
+
+        self.outputs: dict[str, list[tuple[np.ndarray, np.ndarray]]] = {name: [] for name in derived_df_names}
+        self.alarm_payload: dict[int, dict] = {}
+        self.update_maps: list[dict] = []
+        self.phase_times = {"app_func": 0.0, "state": 0.0, "outputs": 0.0}
+
+    def create_df(self, df_pk: int, name: str, var_type: VariableTypes, agg_type: DataAggTypes) -> Datafeed:
+        data_type = DataType(name=name, var_type=var_type, agg_type=agg_type)
+        return Datafeed(pk=df_pk, name=name, parent=self.app, data_type=data_type)
+
+    def run(self, max_calls: int | None = None) -> AppRunReport:
+        start_cursor_ts = self.app.cursor_ts
+        num_calls = 0
+        token = mem_dfr_store.set(self.store)
+        try:
+            while max_calls is None or num_calls < max_calls:
+                num_calls += 1
+                t0 = time.perf_counter()
+                derived_df_readings, update_map = self.app_func(self.app, self.native_df_map, self.derived_df_map)
+                t1 = time.perf_counter()
+                if "state" in update_map:
+                    self.app.state = serialize_app_state(update_map["state"])
+                t2 = time.perf_counter()
+                self.capture_outputs(derived_df_readings)
+                self.alarm_payload.update(update_map.get("alarm_payload", {}))
+                self.update_maps.append({k: v for k, v in update_map.items() if k not in ("state", "alarm_payload")})
+                t3 = time.perf_counter()
+                self.phase_times["app_func"] += t1 - t0
+                self.phase_times["state"] += t2 - t1
+                self.phase_times["outputs"] += t3 - t2
+
+                cursor_ts = update_map.get("cursor_ts", self.app.cursor_ts)
+                if cursor_ts <= self.app.cursor_ts:
+                    break
+                self.app.cursor_ts = cursor_ts
+        finally:
+            mem_dfr_store.reset(token)
+
+        num_ticks = (self.app.cursor_ts - start_cursor_ts) // self.app.time_resample
+        total_time = sum(self.phase_times.values())
+        return {
+            "num_calls": num_calls,
+            "num_ticks": num_ticks,
+            "total_time": total_time,
+            "time_per_tick": total_time * 1e6 / num_ticks if num_ticks > 0 else 0.0,
+            "phase_times": dict(self.phase_times),
+            "state_size": get_app_state_size(self.app.state),
+        }
+
+    def capture_outputs(self, derived_df_readings: DerivedDfReadingMap):
+        # the derived df readings are returned either as instances or as arrays
+        for name, df_row in derived_df_readings.items():
+            if "values" in df_row:
+                rtss, values = df_row["grid"], df_row["values"]
+            else:
+                rtss = np.array([dfr.time for dfr in df_row["new_df_readings"]], dtype=np.int64)
+                values = np.array([dfr.db_value for dfr in df_row["new_df_readings"]], dtype=np.float64)
+            self.outputs.setdefault(name, []).append((rtss, values))
+            self.store.add_df_values(df_row["df"].pk, rtss, values)
+
+    def get_outputs(self) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        # {derived df name: (timestamps, values)} of all the windows, NaN values are dropped
+        outputs = {}
+        for name, chunks in self.outputs.items():
+            rtss = np.concatenate([c[0] for c in chunks]) if chunks else np.empty(0, dtype=np.int64)
+            values = np.concatenate([c[1] for c in chunks]) if chunks else np.empty(0, dtype=np.float64)
+            is_set = ~np.isnan(values)
+            outputs[name] = (rtss[is_set], values[is_set])
+        return outputs
@@ -0,0 +1,127 @@
+from typing import TypedDict, Any, Callable
+
+import numpy as np
+
+from app_functions.bench.runner import NativeDfArrays
+from common.constants import DataAggTypes, VariableTypes, STATUS_FIELD_NAME, CURR_STATE_FIELD_NAME
+from utils.ts_utils import create_now_ts_ms, floor_timestamp
+
+TIME_RESAMPLE = 60000
+START_TS = 1_700_000_000_000 - 1_700_000_000_000 % 3600000
+
+
+class BenchScenario(TypedDict):
+    name: str
+    settings: dict[str, Any]
+    time_resample: int
+    cursor_ts: int
+    native_dfs: dict[str, NativeDfArrays]
+    derived_df_names: list[str]
+
+
+def create_temp_arrays(rng: np.random.Generator, num_ticks: int, base: float, amplitude: float) -> NativeDfArrays:
+    # a daily cycle with noise, some df readings are missing
+    rtss = START_TS + TIME_RESAMPLE * np.arange(1, num_ticks + 1, dtype=np.int64)
+    phase = 2 * np.pi * np.arange(num_ticks) / (24 * 60)
+    values = base + amplitude * np.sin(phase) + rng.normal(0, amplitude / 5, num_ticks)
+    values[rng.random(num_ticks) < 0.05] = np.nan
+    return {"var_type": VariableTypes.CONTINUOUS, "agg_type": DataAggTypes.AVG, "rtss": rtss, "values": values}
+
+
+def create_two_temps_scenario(
+    name: str,
+    num_ticks: int,
+    temp_in: tuple[float, float],
+    temp_out: tuple[float, float],
+    derived_df_names: list[str],
+    native_df_names: tuple[str, str] = ("Temp in", "Temp out"),
+) -> BenchScenario:
+    rng = np.random.default_rng(1)
+    return {
+        "name": name,
+        "settings": {},
+        "time_resample": TIME_RESAMPLE,
+        "cursor_ts": START_TS,
+        "native_dfs": {
+            native_df_names[0]: create_temp_arrays(rng, num_ticks, *temp_in),
+            native_df_names[1]: create_temp_arrays(rng, num_ticks, *temp_out),
+        },
+        "derived_df_names": derived_df_names,
+    }
+
+
+def create_sv_leak_scenario(num_ticks: int) -> BenchScenario:
+    # the temperatures go around the default thresholds (110 and 70)
+    return create_two_temps_scenario(
+        "sv leak, temperatures around the thresholds",
+        num_ticks,
+        (110.0, 15.0),
+        (70.0, 15.0),
+        [STATUS_FIELD_NAME, CURR_STATE_FIELD_NAME],
+    )
+
+
+def create_stall_scenario(num_ticks: int) -> BenchScenario:
+    # the inlet temperature goes around the default threshold (50), the difference - around 10
+    return create_two_temps_scenario(
+        "stall, temperatures around the thresholds",
+        num_ticks,
+        (50.0, 10.0),
+        (40.0, 10.0),
+        [STATUS_FIELD_NAME, CURR_STATE_FIELD_NAME],
+    )
+
+
+def create_stall_0_0_1_scenario(num_ticks: int) -> BenchScenario:
+    # the legacy function has other names of the native datafeeds
+    return create_two_temps_scenario(
+        "stall, temperatures around the thresholds",
+        num_ticks,
+        (50.0, 10.0),
+        (40.0, 10.0),
+        [CURR_STATE_FIELD_NAME],
+        ("Temp inlet", "Temp outlet"),
+    )
+
+
+def create_monitoring_scenario(num_ticks: int) -> BenchScenario:
+    rng = np.random.default_rng(1)
+    return {
+        "name": "monitoring, one datafeed",
+        "settings": {},
+        "time_resample": TIME_RESAMPLE,
+        "cursor_ts": START_TS,
+        "native_dfs": {"Temp": create_temp_arrays(rng, num_ticks, 20.0, 5.0)},
+        "derived_df_names": [],
+    }
+
+
+def create_fake_data_scenario(num_ticks: int) -> BenchScenario:
+    # the function works till now and sleeps for 1-3 seconds in every invocation, it is included in the time
+    return {
+        "name": "fake data, no exceptions",
+        "settings": {"prob_exeption": 0},
+        "time_resample": TIME_RESAMPLE,
+        "cursor_ts": floor_timestamp(create_now_ts_ms(), TIME_RESAMPLE) - num_ticks * TIME_RESAMPLE,
+        "native_dfs": {},
+        "derived_df_names": [STATUS_FIELD_NAME, CURR_STATE_FIELD_NAME],
+    }
+
+
+# {func_name: {func_version: function creating the scenario for the number of ticks}},
+# every entry of 'app_function_paths' should have a scenario here
+bench_scenario_map: dict[str, dict[str, Callable[[int], BenchScenario]]] = {
+    "stall_detection_by_two_temps": {
+        "0.0.1": create_stall_0_0_1_scenario,
+        "1.0.0": create_stall_scenario,
+    },
+    "sv_leak_detection_by_two_temps": {
+        "1.0.0": create_sv_leak_scenario,
+    },
+    "monitoring": {
+        "1.0.0": create_monitoring_scenario,
+    },
+    "fake_data_generator": {
+        "1.0.0": create_fake_data_scenario,
+    },
+}
@@ -1 +0,0 @@
-from .ver_1_0_0 import fake_data_generator_1_0_0
@@ -1,7 +1,11 @@
+import operator
 from typing import TypedDict, Literal, Any
 
+import numpy as np
+
 from common.constants import StatusTypes
 from app_functions.helpers.utils.occ_cluster_list import OccurrenceClusterList
+from app_functions.helpers.utils.rolling_occ_counter import RollingOccurrenceCounter
 
 type CondLiteral = Literal[">", "<", ">=", "<=", "==", "!="]
 
@@ -21,6 +25,17 @@ def eval_cond(first: Any, cond: CondLiteral, second: Any) -> bool:
         return first <= second
 
 
+# the same conditions for arrays
+cond_ufunc_map = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
 class InitDictForConditionType1(TypedDict):
     total_occs: int
     ok_cond: CondLiteral
@@ -45,13 +60,51 @@ class ConditionType1(dict):
             raise ValueError("num_of_ok_occs + num_of_warn_occs + num_of_undef_occs > total_occs")
         self.update(init_dict)
 
-    def match(self, occs: OccurrenceClusterList) -> bool:
-        last_occs = occs.get_slice_with_last_n_occurrences(self["total_occs"])
-        num_of_ok_occs = last_occs.count_occurrences_of_value(StatusTypes.OK)
-        num_of_undef_occs = last_occs.count_occurrences_of_value(StatusTypes.UNDEFINED)
-        num_of_warn_occs = last_occs.count_occurrences_of_value(StatusTypes.WARNING)
+    def match(self, occs: OccurrenceClusterList | RollingOccurrenceCounter) -> bool:
+        if isinstance(occs, RollingOccurrenceCounter):
+            # the counter keeps the numbers for the window, no need to walk the clusters
+            total_occs = int(self["total_occs"])
+            num_of_ok_occs = occs.get_num_occurrences(total_occs, StatusTypes.OK)
+            num_of_undef_occs = occs.get_num_occurrences(total_occs, StatusTypes.UNDEFINED)
+            num_of_warn_occs = occs.get_num_occurrences(total_occs, StatusTypes.WARNING)
+        else:
+            last_occs = occs.get_slice_with_last_n_occurrences(self["total_occs"])
+            num_of_ok_occs = last_occs.count_occurrences_of_value(StatusTypes.OK)
+            num_of_undef_occs = last_occs.count_occurrences_of_value(StatusTypes.UNDEFINED)
+            num_of_warn_occs = last_occs.count_occurrences_of_value(StatusTypes.WARNING)
         return (
             eval_cond(num_of_ok_occs, self["ok_cond"], self["num_of_ok_occs"])
             and eval_cond(num_of_undef_occs, self["undef_cond"], self["num_of_undef_occs"])
             and eval_cond(num_of_warn_occs, self["warn_cond"], self["num_of_warn_occs"])
         )
+
+    def match_batch(self, occ_counter: RollingOccurrenceCounter, new_occ_values: np.ndarray) -> np.ndarray:
+        """
+        Does the same as 'match' after each of 'new_occ_values' is appended to 'occ_counter'
+        (the counter itself is not changed). Only the occurrences that go out of the window
+        during the batch are read, so the cost doesn't depend on 'total_occs'.
+        """
+        total_occs = int(self["total_occs"])
+        window = occ_counter.windows[total_occs]
+        num_new_occs = len(new_occ_values)
+        # how many occurrences have gone out of the window after each new one
+        nums_expired = np.maximum(window.total + np.arange(1, num_new_occs + 1) - total_occs, 0)
+        max_num_expired = int(nums_expired[-1]) if num_new_occs > 0 else 0
+        expired_values = np.concatenate(
+            (occ_counter.get_oldest_values(total_occs, max_num_expired), new_occ_values)
+        )[:max_num_expired]
+
+        is_matched = np.ones(num_new_occs, dtype=bool)
+        for value, cond_key, num_key in (
+            (StatusTypes.OK, "ok_cond", "num_of_ok_occs"),
+            (StatusTypes.UNDEFINED, "undef_cond", "num_of_undef_occs"),
+            (StatusTypes.WARNING, "warn_cond", "num_of_warn_occs"),
+        ):
+            cum_nums_expired = np.concatenate(([0], np.cumsum(expired_values == value)))
+            nums = (
+                occ_counter.get_num_occurrences(total_occs, value)
+                + np.cumsum(new_occ_values == value)
+                - cum_nums_expired[nums_expired]
+            )
+            is_matched &= cond_ufunc_map[self[cond_key]](nums, self[num_key])
+        return is_matched
@@ -0,0 +1,257 @@
+from collections.abc import Sequence
+from typing import Callable
+
+import numpy as np
+
+from common.constants import CurrStateTypes, StatusTypes, HealthGrades
+from app_functions.helpers.automatas.automata_conditions import ConditionType1
+from app_functions.helpers.automatas.curr_state_automata_type1 import CurrStateAutomataType1
+from app_functions.helpers.automatas.status_automata_type1 import StatusAutomataType1
+from app_functions.helpers.utils.counters import OnDelayCounter, run_on_delay_counter
+from app_functions.helpers.utils.rolling_occ_counter import RollingOccurrenceCounter
+
+type TransitionRow = tuple[str, bool, int]  # (input name, expected input value, next state)
+
+
+class AutomataTable:
+    """
+    A finite automata described by a table: for every state there is a list of transitions
+    that are checked in order, the first one whose input has the expected value is fired.
+    The inputs of a tick are packed into a bit mask ('symbol') and the table is compiled
+    into 'next_state_table[state][symbol]', the transitions fired one after another
+    within one tick ('again' in the hand-written automatas) are resolved at this stage.
+    Inputs that would make the automata go round in circles (for example, both OK and WARNING conditions
+    are fulfilled) get None in the table, they are not expected to happen.
+    """
+
+    def __init__(self, num_states: int, inputs: Sequence[str], transitions: dict[int, list[TransitionRow]]) -> None:
+        self.input_bits = {name: 1 << i for i, name in enumerate(inputs)}
+        self.transitions = transitions
+        self.next_state_table = [
+            [self.resolve_next_state(state, symbol) for symbol in range(1 << len(inputs))]
+            for state in range(num_states)
+        ]
+
+    def resolve_next_state(self, state: int, symbol: int) -> int | None:
+        visited_states = {state}
+        while True:
+            for name, expected_value, next_state in self.transitions.get(state, []):
+                if bool(symbol & self.input_bits[name]) == expected_value:
+                    break
+            else:
+                return state
+            if next_state in visited_states:
+                return None
+            visited_states.add(next_state)
+            state = next_state
+
+    def encode(self, input_flags: dict[str, np.ndarray]) -> np.ndarray:
+        symbols = None
+        for name, flags in input_flags.items():
+            bits = np.where(flags, self.input_bits[name], 0)
+            symbols = bits if symbols is None else symbols | bits
+        return symbols
+
+    def run(self, state: int, symbols: np.ndarray) -> np.ndarray:
+        """
+        Returns the state after every tick. A state reached in a tick has no transitions to fire
+        for the same inputs, so the table is looked up only when the inputs change.
+        """
+        num_ticks = len(symbols)
+        states = np.empty(num_ticks, dtype=np.int64)
+        if num_ticks == 0:
+            return states
+
+        run_start_idxs = np.concatenate(([0], np.flatnonzero(np.diff(symbols)) + 1))
+        run_end_idxs = np.concatenate((run_start_idxs[1:], [num_ticks]))
+        for start_idx, end_idx, symbol in zip(
+            run_start_idxs.tolist(), run_end_idxs.tolist(), symbols[run_start_idxs].tolist()
+        ):
+            next_state = self.next_state_table[state][symbol]
+            if next_state is None:
+                raise ValueError(f"Transitions of state {state} for inputs {symbol:b} never stop")
+            state = next_state
+            states[start_idx:end_idx] = state
+        return states
+
+
+CsStates = CurrStateAutomataType1.States
+
+curr_state_automata_type1_table = AutomataTable(
+    len(CsStates),
+    ("err", "off", "ok", "warn"),
+    {
+        CsStates.OFF: [("err", True, CsStates.ERROR), ("off", False, CsStates.UNDEFINED)],
+        CsStates.UNDEFINED: [
+            ("err", True, CsStates.ERROR),
+            ("off", True, CsStates.OFF),
+            ("warn", True, CsStates.WARNING),
+            ("ok", True, CsStates.OK),
+        ],
+        CsStates.ERROR: [("err", False, CsStates.UNDEFINED)],
+        CsStates.OK: [("err", True, CsStates.ERROR), ("off", True, CsStates.OFF), ("warn", True, CsStates.WARNING)],
+        CsStates.WARNING: [("err", True, CsStates.ERROR), ("off", True, CsStates.OFF), ("ok", True, CsStates.OK)],
+    },
+)
+
+# permanent actions of the states
+curr_state_by_cs_state = np.array(
+    [
+        CurrStateTypes.UNDEFINED,  # OFF
+        CurrStateTypes.UNDEFINED,  # UNDEFINED
+        CurrStateTypes.OK,  # OK
+        CurrStateTypes.WARNING,  # WARNING
+        CurrStateTypes.UNDEFINED,  # ERROR
+    ],
+    dtype=np.int64,
+)
+alarms_by_cs_state = {
+    CsStates.ERROR: ("Bad input data", "e"),
+    CsStates.WARNING: ("Stall detected", "w"),
+}
+
+
+class CurrStateTableAutomataType1:
+    """
+    Gives the same results and state as 'CurrStateAutomataType1', but processes the flags
+    of a whole batch of ticks at once.
+    """
+
+    def __init__(
+        self,
+        state: CsStates,
+        prev_state: CsStates,
+        add_to_alarm_payload: Callable,
+        count_thres: int,
+        err_counts: int = 0,
+        off_counts: int = 0,
+        ok_counts: int = 0,
+        warn_counts: int = 0,
+    ) -> None:
+        self.state = state
+        self.prev_state = prev_state
+        self.count_thres = count_thres
+        self.err_counter = OnDelayCounter(err_counts, count_thres)
+        self.off_counter = OnDelayCounter(off_counts, count_thres)
+        self.ok_counter = OnDelayCounter(ok_counts, count_thres)
+        self.warn_counter = OnDelayCounter(warn_counts, count_thres)
+        self.curr_state = CurrStateTypes.UNDEFINED
+        self.health_from_app = HealthGrades.UNDEFINED
+        self.add_to_alarm_payload = add_to_alarm_payload
+
+    def execute_batch(
+        self,
+        rtss: Sequence[int],
+        err_flags: np.ndarray,
+        off_flags: np.ndarray,
+        ok_flags: np.ndarray,
+        warn_flags: np.ndarray,
+    ) -> np.ndarray:
+        # returns the current state for every tick
+        input_flags = {}
+        for name, counter, flags in (
+            ("err", self.err_counter, err_flags),
+            ("off", self.off_counter, off_flags),
+            ("ok", self.ok_counter, ok_flags),
+            ("warn", self.warn_counter, warn_flags),
+        ):
+            input_flags[name], counter.counts = run_on_delay_counter(flags, counter.counts, self.count_thres)
+            counter.out = bool(input_flags[name][-1]) if len(rtss) > 0 else counter.out
+
+        table = curr_state_automata_type1_table
+        states = table.run(self.state, table.encode(input_flags))
+        curr_states = curr_state_by_cs_state[states]
+
+        if len(rtss) > 0:
+            self.state = CsStates(int(states[-1]))
+            self.prev_state = self.state
+            self.curr_state = CurrStateTypes(int(curr_states[-1]))
+            self.health_from_app = HealthGrades.ERROR if self.state == CsStates.ERROR else HealthGrades.UNDEFINED
+
+        for state, (alarm_name, key) in alarms_by_cs_state.items():
+            for idx in np.flatnonzero(states == state).tolist():
+                self.add_to_alarm_payload(alarm_name, {}, rtss[idx], key)
+
+        return curr_states
+
+
+StStates = StatusAutomataType1.States
+
+status_automata_type1_table = AutomataTable(
+    len(StStates),
+    ("undef", "ok_from_undef", "ok_from_warn", "warn"),
+    {
+        StStates.UNDEFINED: [("ok_from_undef", True, StStates.OK), ("warn", True, StStates.WARNING)],
+        StStates.OK: [("warn", True, StStates.WARNING), ("undef", True, StStates.UNDEFINED)],
+        StStates.WARNING: [("ok_from_warn", True, StStates.OK), ("undef", True, StStates.UNDEFINED)],
+        # ERROR is not handled by 'StatusAutomataType1', it doesn't have any transitions
+    },
+)
+
+# permanent actions of the states
+status_by_st_state = np.array(
+    [
+        StatusTypes.UNDEFINED,  # UNDEFINED
+        StatusTypes.OK,  # OK
+        StatusTypes.WARNING,  # WARNING
+    ],
+    dtype=np.int64,
+)
+
+
+class StatusTableAutomataType1:
+    """
+    Gives the same results and state as 'StatusAutomataType1', but evaluates the conditions
+    for a whole batch of ticks at once.
+    """
+
+    def __init__(
+        self,
+        state: StStates,
+        prev_state: StStates,
+        add_to_alarm_payload: Callable,
+        undef_cond: ConditionType1,
+        ok_from_undef_cond: ConditionType1,
+        ok_from_warn_cond: ConditionType1,
+        warn_cond: ConditionType1,
+    ) -> None:
+        self.state = state
+        self.prev_state = prev_state
+        self.conds = {
+            "undef": undef_cond,
+            "ok_from_undef": ok_from_undef_cond,
+            "ok_from_warn": ok_from_warn_cond,
+            "warn": warn_cond,
+        }
+        self.status = StatusTypes.UNDEFINED
+        self.add_to_alarm_payload = add_to_alarm_payload
+
+    def execute_batch(self, occ_counter: RollingOccurrenceCounter, curr_states: np.ndarray) -> np.ndarray:
+        """
+        Appends the current states to 'occ_counter' and returns the status for every tick,
+        the conditions are evaluated as if the status was evaluated after appending each current state.
+        The counter should have the windows of all the conditions.
+        """
+
+        num_ticks = len(curr_states)
+        if num_ticks == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        if self.state == StStates.ERROR:
+            # there is no 'case' for ERROR in 'StatusAutomataType1', so nothing happens
+            statuses = np.full(num_ticks, self.status, dtype=np.int64)
+        else:
+            table = status_automata_type1_table
+            input_flags = {name: cond.match_batch(occ_counter, curr_states) for name, cond in self.conds.items()}
+            states = table.run(self.state, table.encode(input_flags))
+            statuses = status_by_st_state[states]
+
+            self.state = StStates(int(states[-1]))
+            self.prev_state = self.state
+            self.status = StatusTypes(int(statuses[-1]))
+
+        run_start_idxs = np.concatenate(([0], np.flatnonzero(np.diff(curr_states)) + 1))
+        run_lengths = np.diff(np.concatenate((run_start_idxs, [num_ticks])))
+        for value, num_occs in zip(curr_states[run_start_idxs].tolist(), run_lengths.tolist()):
+            occ_counter.append_occurrences(value, num_occs)
+        return statuses
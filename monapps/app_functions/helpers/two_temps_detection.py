@@ -0,0 +1,278 @@
+import copy
+from functools import partial
+from typing import Callable
+
+import numpy as np
+
+from apps.applications.models import Application
+from apps.datafeeds.models import Datafeed
+from common.complex_types import AppFuncReturn, DerivedDfReadingMap, UpdateMap
+from common.constants import STATUS_FIELD_NAME, CURR_STATE_FIELD_NAME
+from utils.app_func_utils import get_end_rts, get_df_frame, get_fleet_df_frame, get_fleet_periods
+from utils.alarm_utils import add_to_alarm_payload
+
+from app_functions.helpers.automatas.automata_conditions import ConditionType1, InitDictForConditionType1
+from app_functions.helpers.utils.occ_cluster_list import OccurrenceClusterList
+from app_functions.helpers.utils.rolling_occ_counter import RollingOccurrenceCounter
+from app_functions.helpers.automatas.curr_state_automata_type1 import CurrStateAutomataType1
+from app_functions.helpers.automatas.status_automata_type1 import StatusAutomataType1
+from app_functions.helpers.automatas.table_automata import CurrStateTableAutomataType1, StatusTableAutomataType1
+
+# the common part of the app functions that detect a problem by the inlet and outlet temperatures,
+# an app function provides only the thresholds from its settings and the flags of the current state
+
+type CsFlags = tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]  # (err, off, ok, warn)
+type GetCsThresholds = Callable[[Application], tuple[float, float]]
+type GetCsFlags = Callable[[np.ndarray, np.ndarray, float | np.ndarray, float | np.ndarray], CsFlags]
+
+TEMP_DIFF_ERROR_THRESHOLD = 0.1
+NUM_DF_TO_PROCESS = 4  # 4 is because we use 2 temperature datafeeds + curr_state datafeed + status datafeed
+
+
+def detect_by_two_temps(
+    app: Application,
+    native_df_map: dict[str, Datafeed],
+    derived_df_map: dict[str, Datafeed],
+    get_cs_thresholds: GetCsThresholds,
+    get_cs_flags: GetCsFlags,
+) -> AppFuncReturn:
+
+    # get end time
+    start_rts = app.cursor_ts
+    end_rts, is_catching_up = get_end_rts(native_df_map.values(), app.time_resample, start_rts, NUM_DF_TO_PROCESS)
+
+    if end_rts <= start_rts:  # not all datafeeds have readings with ts > cursor_ts
+        return create_empty_results(derived_df_map)
+
+    # get new df values as arrays aligned with the grid and evaluate the flags for the whole grid at once
+    df_frame = get_df_frame(native_df_map.values(), start_rts, end_rts, app.time_resample)
+    cs_flags = get_cs_flags(df_frame["columns"]["Temp in"], df_frame["columns"]["Temp out"], *get_cs_thresholds(app))
+
+    return run_automatas(app, derived_df_map, df_frame["grid"], cs_flags, end_rts, is_catching_up)
+
+
+def detect_by_two_temps_in_fleet(
+    apps: list[Application],
+    native_df_maps: list[dict[str, Datafeed]],
+    derived_df_maps: list[dict[str, Datafeed]],
+    get_cs_thresholds: GetCsThresholds,
+    get_cs_flags: GetCsFlags,
+) -> list[AppFuncReturn]:
+    """
+    Does the same as 'detect_by_two_temps' for several applications. The flags of the applications
+    with the same period to process are evaluated together as 2D arrays (apps x ticks).
+    """
+
+    results = [create_empty_results(derived_df_map) for derived_df_map in derived_df_maps]
+    fleet_periods = get_fleet_periods(apps, native_df_maps, NUM_DF_TO_PROCESS)
+    for (start_rts, end_rts, time_resample), members in fleet_periods.items():
+        idxs = [idx for idx, _ in members]
+        df_frame = get_fleet_df_frame([native_df_maps[idx] for idx in idxs], start_rts, end_rts, time_resample)
+        # the thresholds become columns, so every application is compared with its own ones
+        thresholds = np.array([get_cs_thresholds(apps[idx]) for idx in idxs], dtype=np.float64).T[:, :, np.newaxis]
+        cs_flags = get_cs_flags(df_frame["columns"]["Temp in"], df_frame["columns"]["Temp out"], *thresholds)
+        for row, (idx, is_catching_up) in enumerate(members):
+            app_cs_flags = tuple(flags[row] for flags in cs_flags)
+            results[idx] = run_automatas(
+                apps[idx], derived_df_maps[idx], df_frame["grid"], app_cs_flags, end_rts, is_catching_up
+            )
+    return results
+
+
+def create_empty_results(derived_df_map: dict[str, Datafeed]) -> AppFuncReturn:
+    derived_df_reading_map: DerivedDfReadingMap = {
+        STATUS_FIELD_NAME: {"df": derived_df_map[STATUS_FIELD_NAME], "new_df_readings": []},
+        CURR_STATE_FIELD_NAME: {"df": derived_df_map[CURR_STATE_FIELD_NAME], "new_df_readings": []},
+    }
+    return derived_df_reading_map, {}
+
+
+def run_automatas(
+    app: Application,
+    derived_df_map: dict[str, Datafeed],
+    grid_array: np.ndarray,
+    cs_flags: CsFlags,
+    end_rts: int,
+    is_catching_up: bool,
+) -> AppFuncReturn:
+
+    # get datafeeds
+    status_df = derived_df_map[STATUS_FIELD_NAME]
+    curr_state_df = derived_df_map[CURR_STATE_FIELD_NAME]
+
+    # prepare other variables
+    update_map: UpdateMap = {}
+    alarm_payload = {}  # {1734567890123: {"e": {"Wrong data":{}, "Something else": {"st": "in"}}, "w": {...}}, ...}
+    derived_df_reading_map, _ = create_empty_results(derived_df_map)
+    grid = grid_array.tolist()
+
+    # -1- get app settings
+    # -1-1- get app settings for curr_state automata
+    # current state transition counts - how many counts in a row needed to fulfill the condition
+    cs_trans_counts = app.settings.get("cs_trans_counts", 3)
+
+    # -1-2- get app settings for status automata
+    default_undef_cond_dict: InitDictForConditionType1 = {
+        "total_occs": 30 * 24 * 60,
+        "ok_cond": "==",
+        "num_of_ok_occs": 0,
+        "warn_cond": "==",
+        "num_of_warn_occs": 0,
+        "undef_cond": ">=",
+        "num_of_undef_occs": 30 * 24 * 60,
+    }
+    undef_cond = ConditionType1(app.settings.get("undef_cond", default_undef_cond_dict))
+
+    default_ok_from_warn_cond_dict: InitDictForConditionType1 = {
+        "total_occs": 30 * 24 * 60,
+        "num_of_undef_occs": 0,
+        "undef_cond": ">=",
+        "num_of_ok_occs": 15 * 24 * 60,
+        "ok_cond": ">=",
+        "num_of_warn_occs": 0,
+        "warn_cond": "==",
+    }
+    ok_from_warn_cond = ConditionType1(app.settings.get("ok_from_warn_cond", default_ok_from_warn_cond_dict))
+
+    default_warn_cond_dict: InitDictForConditionType1 = {
+        "total_occs": 5 * 24 * 60,
+        "ok_cond": ">=",
+        "num_of_ok_occs": 0,
+        "warn_cond": ">=",
+        "num_of_warn_occs": 1 * 24 * 60,
+        "undef_cond": ">=",
+        "num_of_undef_occs": 0,
+    }
+    warn_cond = ConditionType1(app.settings.get("warn_cond", default_warn_cond_dict))
+
+    default_ok_from_undef_cond_dict: InitDictForConditionType1 = {
+        "total_occs": 1 * 24 * 60,
+        "num_of_undef_occs": 0,
+        "undef_cond": ">=",
+        "num_of_ok_occs": 12 * 60,
+        "ok_cond": ">=",
+        "num_of_warn_occs": 0,
+        "warn_cond": "==",
+    }
+    ok_from_undef_cond = ConditionType1(app.settings.get("ok_from_undef_cond", default_ok_from_undef_cond_dict))
+
+    # -2- get app state
+
+    # -2-1- get app state for curr_state automata
+    cs_automata_state = CurrStateAutomataType1.States(
+        app.state.get("cs_automata_state", CurrStateAutomataType1.States.UNDEFINED.value)
+    )  # to start with UNDEFINED
+    cs_automata_prev_state = CurrStateAutomataType1.States(
+        app.state.get("cs_automata_prev_state", CurrStateAutomataType1.States.OFF.value)
+    )  # any value different from UNDEFINED
+    err_counts = app.state.get("err_counts", 0)
+    off_counts = app.state.get("off_counts", 0)
+    ok_counts = app.state.get("ok_counts", 0)
+    warn_counts = app.state.get("warn_counts", 0)
+
+    # -2-2- get app state for status automata
+    st_automata_state = StatusAutomataType1.States(
+        app.state.get("st_automata_state", StatusAutomataType1.States.UNDEFINED.value)
+    )
+    st_automata_prev_state = StatusAutomataType1.States(
+        app.state.get("st_automata_prev_state", StatusAutomataType1.States.OK.value)
+    )
+
+    # the occurrences are stored as clusters, the counts of the condition windows are restored from them
+    occ_counter = RollingOccurrenceCounter(
+        OccurrenceClusterList(app.state.get("all_occs")),
+        [int(cond["total_occs"]) for cond in (undef_cond, ok_from_undef_cond, ok_from_warn_cond, warn_cond)],
+    )
+
+    # -3- create automatas
+
+    add_to_alarm_payload_part = partial(add_to_alarm_payload, alarm_payload)
+    # create an automata instance for "current state"
+    cs_automata = CurrStateTableAutomataType1(
+        cs_automata_state,
+        cs_automata_prev_state,
+        add_to_alarm_payload_part,
+        cs_trans_counts,
+        err_counts=err_counts,
+        off_counts=off_counts,
+        ok_counts=ok_counts,
+        warn_counts=warn_counts,
+    )
+
+    # create an automata instance for "status"
+    st_automata = StatusTableAutomataType1(
+        st_automata_state,
+        st_automata_prev_state,
+        add_to_alarm_payload_part,
+        undef_cond,
+        ok_from_undef_cond,
+        ok_from_warn_cond,
+        warn_cond,
+    )
+
+    # -6- run the automatas for the whole grid
+    for rts in grid:
+        alarm_payload[rts] = {}  # NOTE: this is very important, add at least an empty dict for each rts
+
+    # -6-1- evaluate current state, execute CS finite automata
+    curr_states = cs_automata.execute_batch(grid, *cs_flags)
+
+    # -6-2- update interval maps and evaluate status, execute ST finite automata
+    statuses = st_automata.execute_batch(occ_counter, curr_states)
+
+    # -6-3- get the results, the executor saves them without creating df reading instances
+    derived_df_reading_map[CURR_STATE_FIELD_NAME] = {
+        "df": curr_state_df,
+        "grid": grid_array,
+        "values": curr_states.astype(np.float64),
+    }
+    derived_df_reading_map[STATUS_FIELD_NAME] = {
+        "df": status_df,
+        "grid": grid_array,
+        "values": statuses.astype(np.float64),
+    }
+
+    # -7-  update app output
+    update_map["cursor_ts"] = end_rts
+    update_map["is_catching_up"] = is_catching_up
+    update_map["alarm_payload"] = alarm_payload
+    update_map["health"] = cs_automata.health_from_app
+
+    updated_state = copy.deepcopy(app.state)
+    updated_state["cs_automata_state"] = cs_automata.state.value  # NOTE: 'value' to serialize JSON
+    updated_state["cs_automata_prev_state"] = cs_automata.prev_state.value  # NOTE: 'value' to serialize JSON
+    updated_state["err_counts"] = cs_automata.err_counter.counts
+    updated_state["off_counts"] = cs_automata.off_counter.counts
+    updated_state["warn_counts"] = cs_automata.warn_counter.counts
+    updated_state["ok_counts"] = cs_automata.ok_counter.counts
+    updated_state["st_automata_state"] = st_automata.state.value  # NOTE: 'value' to serialize JSON
+    updated_state["st_automata_prev_state"] = st_automata.prev_state.value  # NOTE: 'value' to serialize JSON
+    updated_state["all_occs"] = occ_counter  # compacted when the state is saved
+    update_map["state"] = updated_state
+
+    return derived_df_reading_map, update_map
+
+
+df_schema = {
+    "Temp in": {"derived": False, "data_type": "Temperature"},
+    "Temp out": {"derived": False, "data_type": "Temperature"},
+    CURR_STATE_FIELD_NAME: {"derived": True, "data_type": CURR_STATE_FIELD_NAME},
+    STATUS_FIELD_NAME: {"derived": True, "data_type": STATUS_FIELD_NAME},
+}
+
+condition_jsonschema = {
+    "$schema": "https://json-schema.org/draft/2020-12/schema",
+    "$id": "#/conditions/type1",
+    "title": "Condition type 1",
+    "description": "Conditions for state transitions of StatusAutomataType1",
+    "type": "object",
+    "properties": {
+        "total_occs": {"type": "number", "maximum": 100000, "minimum": 1},
+        "ok_cond": {"type": "string", "enum": ["==", ">=", "<="]},
+        "num_of_ok_occs": {"type": "number", "maximum": 100000, "minimum": 0},
+        "warn_cond": {"type": "string", "enum": ["==", ">=", "<="]},
+        "num_of_warn_occs": {"type": "number", "maximum": 100000, "minimum": 0},
+        "undef_cond": {"type": "string", "enum": ["==", ">=", "<="]},
+        "num_of_undef_occs": {"type": "number", "maximum": 100000, "minimum": 0},
+    },
+}
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class PlcLikeCounter:
     def __init__(self, initial: int = 0, preset: int = 1) -> None:
         self.counts = initial
@@ -25,3 +28,23 @@ class OnDelayCounter(PlcLikeCounter):
         else:
             self.counts = 0
             self.out = False
+
+
+def run_on_delay_counter(flags: np.ndarray, initial: int, preset: int) -> tuple[np.ndarray, int]:
+    """
+    Does the same as calling 'OnDelayCounter.tick' for every flag, but for the whole array at once.
+    Returns the 'out' values after every tick and the final 'counts'.
+    """
+    preset = preset if preset > 0 else 1
+    flags = np.asarray(flags, dtype=bool)
+    if len(flags) == 0:
+        return np.zeros(0, dtype=bool), initial
+
+    idxs = np.arange(len(flags))
+    # the number of 'True' flags in a row till every tick
+    last_false_idxs = np.maximum.accumulate(np.where(flags, -1, idxs))
+    counts = idxs - last_false_idxs
+    # the initial counts continue only if there was no 'False' flag since the beginning
+    counts = np.where(last_false_idxs == -1, counts + initial, counts)
+    counts = np.minimum(counts, preset)
+    return flags & (counts >= preset), int(counts[-1])
@@ -6,7 +6,9 @@ class OccurrenceClusterList(list):
     def __init__(self, init_list=None):
         super().__init__()
         if init_list is not None:
-            self.extend(init_list)
+            # the clusters are copied, the last one is changed in place when occurrences are appended,
+            # and the list it is created from (the app state) must stay as it was to detect the change
+            self.extend([value, num] for value, num in init_list)
 
     def get_total_occurrences(self):
         num_of_occs = 0
@@ -39,3 +41,11 @@ class OccurrenceClusterList(list):
             else:
                 break
         return type(self)(reversed(sliced))
+
+    def append_occurrences(self, value: int | str, number_of_occurrences: int) -> None:
+        if number_of_occurrences <= 0:
+            return
+        if len(self) > 0 and self[len(self) - 1][0] == value:
+            self[len(self) - 1][1] += number_of_occurrences
+            return
+        self.append([value, number_of_occurrences])
@@ -0,0 +1,110 @@
+from collections.abc import Iterable
+
+import numpy as np
+
+from app_functions.helpers.utils.occ_cluster_list import OccurrenceClusterList
+
+
+class OccurrenceWindow:
+    # the numbers of occurrences of every value among the last 'length' occurrences
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.counts: dict[int | str, int] = {}
+        self.total = 0
+        # position of the oldest occurrence in the window - index of the cluster and
+        # the number of occurrences of this cluster that are already out of the window
+        self.cluster_idx = 0
+        self.offset = 0
+
+
+class RollingOccurrenceCounter:
+    """
+    Keeps the numbers of occurrences of every value within the last N occurrences of an 'OccurrenceClusterList'
+    for several N (windows). The counts are updated when occurrences are appended and go out of the windows,
+    so getting them doesn't depend on the window length. Only the cluster list itself is stored in the app state,
+    the windows are restored from its tail.
+    """
+
+    def __init__(self, occs: OccurrenceClusterList, window_lengths: Iterable[int]) -> None:
+        self.occs = occs
+        self.windows: dict[int, OccurrenceWindow] = {}
+        for length in set(window_lengths):
+            self.windows[length] = self.create_window(length)
+
+    def create_window(self, length: int) -> OccurrenceWindow:
+        window = OccurrenceWindow(length)
+        window.cluster_idx = len(self.occs)
+        for i in range(len(self.occs) - 1, -1, -1):
+            if window.total >= length:
+                break
+            value, num = self.occs[i]
+            num_in_window = min(num, length - window.total)
+            window.counts[value] = window.counts.get(value, 0) + num_in_window
+            window.total += num_in_window
+            window.cluster_idx = i
+            window.offset = num - num_in_window
+        return window
+
+    def get_num_occurrences(self, window_length: int, value: int | str) -> int:
+        return self.windows[window_length].counts.get(value, 0)
+
+    def append_occurrence(self, value: int | str) -> None:
+        self.append_occurrences(value, 1)
+
+    def append_occurrences(self, value: int | str, number_of_occurrences: int) -> None:
+        if number_of_occurrences <= 0:
+            return
+        self.occs.append_occurrences(value, number_of_occurrences)
+        for window in self.windows.values():
+            window.counts[value] = window.counts.get(value, 0) + number_of_occurrences
+            window.total += number_of_occurrences
+            if window.total > window.length:
+                self.expire_occurrences(window, window.total - window.length)
+
+    def expire_occurrences(self, window: OccurrenceWindow, number_of_occurrences: int) -> None:
+        while number_of_occurrences > 0:
+            value, num = self.occs[window.cluster_idx]
+            num_expired = min(num - window.offset, number_of_occurrences)
+            window.counts[value] -= num_expired
+            window.total -= num_expired
+            window.offset += num_expired
+            number_of_occurrences -= num_expired
+            if window.offset == num:
+                window.cluster_idx += 1
+                window.offset = 0
+
+    def get_oldest_values(self, window_length: int, number_of_occurrences: int) -> np.ndarray:
+        # the values of the oldest occurrences of the window (the next ones to go out of it), one element per occurrence
+        window = self.windows[window_length]
+        values = []
+        nums = []
+        offset = window.offset
+        for i in range(window.cluster_idx, len(self.occs)):
+            if number_of_occurrences <= 0:
+                break
+            value, num = self.occs[i]
+            num_taken = min(num - offset, number_of_occurrences)
+            values.append(value)
+            nums.append(num_taken)
+            number_of_occurrences -= num_taken
+            offset = 0
+        return np.repeat(np.array(values, dtype=np.int64), np.array(nums, dtype=np.int64))
+
+    def compact(self) -> None:
+        # drops the occurrences that are out of all the windows, they are not needed anymore
+        if len(self.windows) == 0:
+            return
+        first_idx, first_offset = min((window.cluster_idx, window.offset) for window in self.windows.values())
+        del self.occs[:first_idx]
+        if first_offset > 0:
+            value, num = self.occs[0]
+            self.occs[0] = [value, num - first_offset]
+        for window in self.windows.values():
+            if window.cluster_idx == first_idx:
+                window.offset -= first_offset
+            window.cluster_idx -= first_idx
+
+    def to_state(self) -> OccurrenceClusterList:
+        # the counter is stored in the app state as the cluster list compacted to the longest window
+        self.compact()
+        return self.occs
@@ -1 +0,0 @@
-from .ver_1_0_0 import monitoring_1_0_0
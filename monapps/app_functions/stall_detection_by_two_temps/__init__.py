@@ -1,2 +0,0 @@
-from .ver_0_0_1 import stall_detection_by_two_temps_0_0_1
-from .ver_1_0_0 import stall_detection_by_two_temps_1_0_0
@@ -7,6 +7,7 @@ from utils.ts_utils import create_grid
 from common.complex_types import AppFuncReturn, DerivedDfReadingMap, UpdateMap
 from common.constants import CURR_STATE_FIELD_NAME
 from utils.app_func_utils import get_end_rts, get_df_value_map
+from utils.dfr_span_utils import get_df_reading_at
 from utils.alarm_utils import add_to_alarm_payload
 
 logger = logging.getLogger("#stall_det_0_0_1")
@@ -42,7 +43,7 @@ def function(
         delta_t_in = app.settings.get("delta_t_in", 10)
         delta_t_out = app.settings.get("delta_t_out", 5)
 
-        prev_curr_state_dfr = DfReading.objects.filter(datafeed__id=curr_state_df.pk, time=start_rts).first()
+        prev_curr_state_dfr = get_df_reading_at(curr_state_df, start_rts)
 
         if prev_curr_state_dfr is None:
             prev_curr_state = CurrStateTypes.UNDEFINED
@@ -1 +0,0 @@
-from .ver_1_0_0 import sv_leak_detection_by_two_temps_1_0_0
@@ -1,5 +1,54 @@
+import json
+
+from django.conf import settings
 from django.contrib import admin
-from .models import AppType, Application
+from django.db import transaction
+from django.utils.html import format_html
+
+from utils.app_state_utils import decode_app_state, encode_app_state, get_app_state_size
+from .models import AppType, Application, AppState
+
+
+class ApplicationAdmin(admin.ModelAdmin):
+
+    def get_readonly_fields(self, request, obj=None):
+        # the state in the side table overwrites 'Application.state' on every execution, see 'AppStateAdmin'
+        readonly_fields = super().get_readonly_fields(request, obj)
+        if settings.STORE_APP_STATE_IN_SIDE_TABLE:
+            readonly_fields = (*readonly_fields, "state")
+        return readonly_fields
+
+
+class AppStateAdmin(admin.ModelAdmin):
+    list_display = ("application", "version")
+    fields = ("application", "version", "decoded_data")
+    readonly_fields = ("application", "version", "decoded_data")
+    actions = ("reset_state",)
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="Data")
+    def decoded_data(self, obj: AppState):
+        return format_html("<pre>{}</pre>", json.dumps(decode_app_state(obj.data), indent=2))
+
+    @admin.action(description="Reset the state of the selected applications")
+    def reset_state(self, request, queryset):
+        with transaction.atomic():
+            # the application rows are locked, so the reset isn't overwritten by an execution running at the moment
+            app_pks = list(
+                Application.objects.select_for_update()
+                .filter(pk__in=queryset.values("application_id"))
+                .values_list("pk", flat=True)
+            )
+            for state_record in AppState.objects.filter(application_id__in=app_pks):
+                state_record.version += 1
+                state_record.data = encode_app_state({})
+                state_record.save()
+            Application.objects.filter(pk__in=app_pks).update(state={}, state_size=get_app_state_size({}))
+        self.message_user(request, f"The states of {len(app_pks)} applications were reset")
+
 
 admin.site.register(AppType)
-admin.site.register(Application)
+admin.site.register(Application, ApplicationAdmin)
+admin.site.register(AppState, AppStateAdmin)
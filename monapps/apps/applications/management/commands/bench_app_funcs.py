@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_functions.bench.runner import InMemoryAppRunner
+from app_functions.bench.scenarios import bench_scenario_map
+from utils.app_func_map_utils import get_app_func_paths, load_app_func_dict
+
+
+class Command(BaseCommand):
+    """Django command that executes the app functions in memory on the bench scenarios and reports their timing"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--func", type=str, default=None, help="name of the app function, all by default")
+        parser.add_argument("--ticks", type=int, default=10080, help="number of ticks of the synthetic df readings")
+        parser.add_argument("--fake-data-ticks", type=int, default=5, help="number of ticks of the fake data generator")
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        app_func_paths = get_app_func_paths()
+        if options["func"] is not None and options["func"] not in app_func_paths:
+            raise CommandError(f"No app function '{options['func']}'")
+
+        for func_name, version_map in app_func_paths.items():
+            if options["func"] is not None and func_name != options["func"]:
+                continue
+            for func_version in version_map:
+                if (app_func_dict := load_app_func_dict(func_name, func_version)) is None:
+                    self.stdout.write(self.style.ERROR(f"{func_name} {func_version}: cannot be imported"))
+                    continue
+                create_scenario = bench_scenario_map.get(func_name, {}).get(func_version)
+                if create_scenario is None:
+                    self.stdout.write(self.style.WARNING(f"{func_name} {func_version}: no bench scenario"))
+                    continue
+                num_ticks = options["fake_data_ticks"] if func_name == "fake_data_generator" else options["ticks"]
+                scenario = create_scenario(num_ticks)
+                runner = InMemoryAppRunner(
+                    app_func_dict["function"],
+                    func_name,
+                    scenario["settings"],
+                    scenario["time_resample"],
+                    scenario["cursor_ts"],
+                    scenario["native_dfs"],
+                    scenario["derived_df_names"],
+                )
+                report = runner.run()
+                phases = ", ".join(f"{name} {t * 1000:.1f} ms" for name, t in report["phase_times"].items())
+                outputs = ", ".join(f"{name} {len(rtss)}" for name, (rtss, _) in runner.get_outputs().items())
+                self.stdout.write(
+                    f"{func_name} {func_version} ({scenario['name']}): {report['num_ticks']} ticks "
+                    f"in {report['num_calls']} calls, {report['time_per_tick']:.1f} us/tick ({phases}), "
+                    f"df values: {outputs or '-'}, alarms: {len(runner.alarm_payload)}, "
+                    f"state: {report['state_size']} bytes"
+                )
+        self.stdout.write(self.style.SUCCESS("Bench finished!"))
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.applications.models import Application
+from services.app_recomputer import AppRecomputer
+from utils.ts_utils import create_ts_ms_from_iso_str
+
+
+def parse_ts(value: str) -> int:
+    # a timestamp in ms or an ISO-formatted string
+    return int(value) if value.isdigit() else create_ts_ms_from_iso_str(value)
+
+
+class Command(BaseCommand):
+    """Django command that recomputes the derived df readings of an application within a time range"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("app", type=int, help="pk of the application")
+        parser.add_argument("--start", type=parse_ts, required=True, help="start of the range, ms or ISO string")
+        parser.add_argument("--end", type=parse_ts, default=None, help="end of the range, the cursor by default")
+        parser.add_argument("--partitions", type=int, default=8, help="number of partitions of the range")
+        parser.add_argument("--workers", type=int, default=4, help="number of processes, 1 - sequential processing")
+        parser.add_argument(
+            "--warm-up", type=int, default=1440, help="number of ticks executed before a partition to get its state"
+        )
+        parser.add_argument("--no-checkpoints", action="store_true", help="don't seed the partitions from checkpoints")
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        try:
+            recomputer = AppRecomputer(
+                options["app"],
+                options["start"],
+                options["end"],
+                num_partitions=options["partitions"],
+                num_workers=options["workers"],
+                warm_up_ticks=options["warm_up"],
+                use_checkpoints=not options["no_checkpoints"],
+            )
+        except Application.DoesNotExist:
+            raise CommandError(f"No application with pk {options['app']}")
+        try:
+            report = recomputer.execute()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{report['num_partitions']} partitions ({report['num_seeded_from_checkpoints']} from checkpoints), "
+            f"{report['num_ticks']} ticks in {report['compute_time_ms']} ms - {report['ticks_per_sec']} ticks/s"
+        )
+        self.stdout.write(
+            f"{report['num_deleted']} df readings were deleted, {report['num_created']} were created "
+            f"in {report['replace_time_ms']} ms"
+        )
+        if report["num_cold_started"] > 0:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{report['num_cold_started']} partitions had neither a checkpoint nor a warm-up "
+                    "and started from an empty state"
+                )
+            )
+        if not report["is_state_replaced"]:
+            self.stdout.write(
+                self.style.WARNING("The application was executed in the meantime, its state was not replaced")
+            )
+        self.stdout.write(self.style.SUCCESS("Application recomputed!"))
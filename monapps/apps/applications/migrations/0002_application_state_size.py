@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='state_size',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-19 05:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0002_application_state_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppState',
+            fields=[
+                ('application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state_record', serialize=False, to='applications.application')),
+                ('version', models.BigIntegerField(default=0)),
+                ('data', models.BinaryField()),
+            ],
+            options={
+                'db_table': 'app_states',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0003_appstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='last_eval_ts',
+            field=models.BigIntegerField(blank=True, default=None, null=True),
+        ),
+    ]
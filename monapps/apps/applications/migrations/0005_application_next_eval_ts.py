@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0004_application_last_eval_ts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='next_eval_ts',
+            field=models.BigIntegerField(blank=True, db_index=True, default=None, null=True),
+        ),
+    ]
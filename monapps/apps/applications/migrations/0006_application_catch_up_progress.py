@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0005_application_next_eval_ts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='catch_up_progress',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
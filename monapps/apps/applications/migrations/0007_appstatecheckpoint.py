@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-19 06:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0006_application_catch_up_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppStateCheckpoint',
+            fields=[
+                ('pk', models.CompositePrimaryKey('application_id', 'time', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('time', models.BigIntegerField()),
+                ('settings_hash', models.CharField(max_length=64)),
+                ('data', models.BinaryField()),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='state_checkpoints', to='applications.application')),
+            ],
+            options={
+                'db_table': 'app_state_checkpoints',
+            },
+        ),
+    ]
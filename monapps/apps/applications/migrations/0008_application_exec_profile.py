@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0007_appstatecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='exec_profile',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
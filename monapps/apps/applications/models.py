@@ -56,6 +56,7 @@ class Application(PublishingOnSaveModel):
 
     settings = models.JSONField(default=dict, blank=True)  # application settings according to JSON schema
     state = models.JSONField(default=dict, blank=True)  # for retaining the state between calculations
+    state_size = models.IntegerField(default=0)  # bytes of the JSON-encoded state, updated when the state is saved
 
     errors = models.JSONField(default=dict, blank=True)
     warnings = models.JSONField(default=dict, blank=True)
@@ -73,6 +74,11 @@ class Application(PublishingOnSaveModel):
         related_query_name="catching_up_app",
     )
     is_catching_up = models.BooleanField(default=False)
+    catch_up_progress = models.JSONField(default=dict, blank=True)  # filled by 'CatchUpExecutor'
+    exec_profile = models.JSONField(default=dict, blank=True)  # filled when PROFILE_APP_EXECUTION is on
+    last_eval_ts = models.BigIntegerField(default=None, blank=True, null=True)  # when the app function was executed
+    # when the application is due for the next execution by the 'evaluate.due_apps' task, None - at once
+    next_eval_ts = models.BigIntegerField(default=None, blank=True, null=True, db_index=True)
 
     func_version = models.CharField(max_length=200, default="1.0.0")
 
@@ -136,3 +142,37 @@ class Application(PublishingOnSaveModel):
 
     def get_derived_df_qs(self):
         return self.datafeeds.filter(datastream__isnull=True)
+
+
+class AppState(models.Model):
+    # the state of an application stored apart from the application row, so the row (with the fields
+    # updated on every invocation) stays small, 'data' is the state encoded by 'encode_app_state'
+
+    class Meta:
+        db_table = "app_states"
+
+    application = models.OneToOneField(
+        Application, on_delete=models.CASCADE, primary_key=True, related_name="state_record"
+    )
+    version = models.BigIntegerField(default=0)  # incremented every time the state is written
+    data = models.BinaryField()
+
+    def __str__(self):
+        return f"State of application {self.application_id} v{self.version}"
+
+
+class AppStateCheckpoint(models.Model):
+    # the state of an application at 'time' saved by the 'recompute_app' command at the boundaries of the partitions,
+    # it can seed the recomputation of the next partition if the app settings haven't changed ('settings_hash')
+
+    class Meta:
+        db_table = "app_state_checkpoints"
+
+    pk = models.CompositePrimaryKey("application_id", "time")
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name="state_checkpoints")
+    time = models.BigIntegerField()
+    settings_hash = models.CharField(max_length=64)
+    data = models.BinaryField()  # the state encoded by 'encode_app_state'
+
+    def __str__(self):
+        return f"State checkpoint of application {self.application_id} at {self.time}"
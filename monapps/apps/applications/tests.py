@@ -1,3 +1,772 @@
-from django.test import TestCase
+import random
+import threading
+from functools import partial
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
+
+from utils.alarm_utils import add_to_alarm_payload
+from app_functions.helpers.automatas.automata_conditions import ConditionType1
+from app_functions.helpers.automatas.curr_state_automata_type1 import CurrStateAutomataType1
+from app_functions.helpers.automatas.status_automata_type1 import StatusAutomataType1
+from app_functions.helpers.automatas.table_automata import CurrStateTableAutomataType1, StatusTableAutomataType1
+from app_functions.helpers.utils.occ_cluster_list import OccurrenceClusterList
+from app_functions.helpers.utils.rolling_occ_counter import RollingOccurrenceCounter
+from app_functions.bench.runner import InMemoryAppRunner
+from app_functions.bench.scenarios import create_sv_leak_scenario, create_stall_scenario
+from app_functions.sv_leak_detection_by_two_temps.ver_1_0_0 import sv_leak_detection_by_two_temps_1_0_0
+from app_functions.stall_detection_by_two_temps.ver_1_0_0 import stall_detection_by_two_temps_1_0_0
+from utils.exec_profile_utils import ExecProfiler, get_profile_percentiles
+from utils.app_func_map_utils import app_func_dict_cache, get_app_func_paths, load_app_func_dict, preload_app_funcs
+from app_functions.monitoring.ver_1_0_0 import monitoring_1_0_0
+from apps.applications.models import Application, AppType, AppState
+from apps.datafeeds.models import Datafeed
+from apps.datastreams.models import Datastream
+from apps.datatypes.models import DataType
+from apps.devices.models import Device
+from apps.dsreadings.models import DsReading
+from apps.dfreadings.models import DfReading
+from common.constants import HealthGrades, STATUS_FIELD_NAME, DataAggTypes, VariableTypes
+from services.app_func_executor import AppFuncExecutor, STATE_TOO_LARGE_ALARM_NAME
+from services.multi_app_executor import MultiAppExecutor
+from services.catch_up_executor import CatchUpExecutor
+from services.fleet_executor import FleetExecutor
+from services.app_recomputer import AppRecomputer
+from tasks.exec_app_func import exec_app_fleet, is_due_apps_task_enabled
+from tasks.exec_due_apps import exec_due_apps
+from utils.app_trigger_utils import enqueue_app_evals
+from utils.app_state_utils import decode_app_state, serialize_app_state
+from utils.dfr_store_utils import MemDfReadingStore, mem_dfr_store
+from utils.ts_utils import create_now_ts_ms
+
+T0 = 1_700_000_000_000 - 1_700_000_000_000 % 3600000
+TIME_RESAMPLE = 60000
+
+
+def create_random_flags(rnd: random.Random, num_ticks: int) -> list[bool]:
+    # flags change rarely, like real ones do
+    flags = []
+    flag = rnd.random() < 0.5
+    for _ in range(num_ticks):
+        if rnd.random() < 0.1:
+            flag = not flag
+        flags.append(flag)
+    return flags
+
+
+def create_random_cond(rnd: random.Random) -> ConditionType1:
+    total_occs = rnd.randint(1, 60)
+    nums = [rnd.randint(0, total_occs // 3) for _ in range(3)]
+    return ConditionType1(
+        {
+            "total_occs": total_occs,
+            "ok_cond": rnd.choice(("==", ">=", "<=")),
+            "num_of_ok_occs": nums[0],
+            "warn_cond": rnd.choice(("==", ">=", "<=")),
+            "num_of_warn_occs": nums[1],
+            "undef_cond": rnd.choice(("==", ">=", "<=")),
+            "num_of_undef_occs": nums[2],
+        }
+    )
+
+
+class TableAutomataTest(SimpleTestCase):
+    # the hand-written automatas are the reference, the table ones should give exactly the same results
+
+    def test_curr_state_automata(self):
+        rnd = random.Random(1)
+        for _ in range(200):
+            state = rnd.choice(list(CurrStateAutomataType1.States))
+            prev_state = rnd.choice(list(CurrStateAutomataType1.States))
+            count_thres = rnd.randint(1, 5)
+            counts = {name: rnd.randint(0, count_thres) for name in ("err", "off", "ok", "warn")}
+            num_ticks = rnd.randint(0, 100)
+            rtss = list(range(60000, 60000 * (num_ticks + 1), 60000))
+            flags = {name: create_random_flags(rnd, num_ticks) for name in ("err", "off", "ok")}
+            # OK and WARNING flags are mutually exclusive in the application functions
+            flags["warn"] = [not flag for flag in flags["ok"]]
+
+            ref_alarm_payload = {rts: {} for rts in rtss}
+            ref_automata = CurrStateAutomataType1(
+                state,
+                prev_state,
+                partial(add_to_alarm_payload, ref_alarm_payload),
+                count_thres,
+                err_counts=counts["err"],
+                off_counts=counts["off"],
+                ok_counts=counts["ok"],
+                warn_counts=counts["warn"],
+            )
+            ref_curr_states = []
+            for i, rts in enumerate(rtss):
+                ref_automata.execute(rts, flags["err"][i], flags["off"][i], flags["ok"][i], flags["warn"][i])
+                ref_curr_states.append(ref_automata.curr_state)
+
+            alarm_payload = {rts: {} for rts in rtss}
+            automata = CurrStateTableAutomataType1(
+                state,
+                prev_state,
+                partial(add_to_alarm_payload, alarm_payload),
+                count_thres,
+                err_counts=counts["err"],
+                off_counts=counts["off"],
+                ok_counts=counts["ok"],
+                warn_counts=counts["warn"],
+            )
+            curr_states = automata.execute_batch(
+                rtss, *(np.array(flags[name], dtype=bool) for name in ("err", "off", "ok", "warn"))
+            )
+
+            self.assertEqual(ref_curr_states, curr_states.tolist())
+            self.assertEqual(ref_alarm_payload, alarm_payload)
+            for attr in ("state", "prev_state", "curr_state", "health_from_app"):
+                self.assertEqual(getattr(ref_automata, attr), getattr(automata, attr))
+            for attr in ("err_counter", "off_counter", "ok_counter", "warn_counter"):
+                self.assertEqual(getattr(ref_automata, attr).counts, getattr(automata, attr).counts)
+
+    def test_status_automata(self):
+        rnd = random.Random(2)
+        for _ in range(200):
+            state = rnd.choice(list(StatusAutomataType1.States))
+            prev_state = rnd.choice(list(StatusAutomataType1.States))
+            conds = [create_random_cond(rnd) for _ in range(4)]
+            init_occs = []
+            for _ in range(rnd.randint(0, 10)):
+                init_occs.append([rnd.randint(0, 2), rnd.randint(1, 20)])
+            num_ticks = rnd.randint(0, 150)
+            curr_states = []
+            curr_state = rnd.randint(0, 2)
+            for _ in range(num_ticks):
+                if rnd.random() < 0.1:
+                    curr_state = rnd.randint(0, 2)
+                curr_states.append(curr_state)
+
+            occ_counter = RollingOccurrenceCounter(
+                OccurrenceClusterList([list(item) for item in init_occs]), [cond["total_occs"] for cond in conds]
+            )
+            automata = StatusTableAutomataType1(state, prev_state, None, *conds)
+            try:
+                statuses = automata.execute_batch(occ_counter, np.array(curr_states, dtype=np.int64))
+            except ValueError:
+                # random conditions can make the automata go round in circles, the reference one would hang
+                continue
+
+            ref_all_occs = OccurrenceClusterList([list(item) for item in init_occs])
+            ref_automata = StatusAutomataType1(state, prev_state, None, *conds)
+            ref_statuses = []
+            for curr_state in curr_states:
+                ref_all_occs.append_occurrence(curr_state)
+                ref_automata.execute(0, ref_all_occs)
+                ref_statuses.append(ref_automata.status)
+
+            self.assertEqual(ref_statuses, statuses.tolist())
+            self.assertEqual(ref_all_occs, occ_counter.occs)
+            for attr in ("state", "prev_state", "status"):
+                self.assertEqual(getattr(ref_automata, attr), getattr(automata, attr))
+
+
+class RollingOccurrenceCounterTest(SimpleTestCase):
+
+    def test_same_as_slices(self):
+        rnd = random.Random(3)
+        for _ in range(50):
+            init_occs = OccurrenceClusterList()
+            for _ in range(rnd.randint(0, 10)):
+                init_occs.append([rnd.randint(0, 2), rnd.randint(1, 20)])
+            ref_occs = OccurrenceClusterList([list(item) for item in init_occs])
+            window_lengths = [rnd.randint(1, 60) for _ in range(3)]
+            occ_counter = RollingOccurrenceCounter(init_occs, window_lengths)
+            cond = create_random_cond(rnd)
+            cond_counter = RollingOccurrenceCounter(OccurrenceClusterList(), [cond["total_occs"]])
+
+            for _ in range(rnd.randint(0, 20)):
+                value = rnd.randint(0, 2)
+                num_occs = rnd.randint(1, 30)
+                ref_occs.append_occurrences(value, num_occs)
+                occ_counter.append_occurrences(value, num_occs)
+                if rnd.random() < 0.3:
+                    occ_counter.compact()
+                for length in window_lengths:
+                    last_occs = ref_occs.get_slice_with_last_n_occurrences(length)
+                    for v in range(3):
+                        self.assertEqual(
+                            last_occs.count_occurrences_of_value(v), occ_counter.get_num_occurrences(length, v)
+                        )
+                # the condition gives the same result with the counter and with the clusters
+                cond_counter.append_occurrences(value, num_occs)
+                self.assertEqual(cond.match(cond_counter.occs), cond.match(cond_counter))
+            # only the occurrences of the longest window are kept in the state
+            self.assertEqual(
+                ref_occs.get_slice_with_last_n_occurrences(max(window_lengths)), occ_counter.to_state()
+            )
+
+    def test_state_not_changed(self):
+        # the clusters of the state are not changed in place, otherwise the new state looks equal to the old one
+        state = {"all_occs": [[0, 4], [2, 10]]}
+        occ_counter = RollingOccurrenceCounter(OccurrenceClusterList(state["all_occs"]), [20])
+        occ_counter.append_occurrences(2, 5)
+        self.assertEqual(state["all_occs"], [[0, 4], [2, 10]])
+        self.assertEqual(occ_counter.to_state(), [[0, 4], [2, 15]])
+
+
+class InMemoryAppRunnerTest(SimpleTestCase):
+
+    def test_windows(self):
+        # the results don't depend on how many df readings are processed per invocation
+        results = []
+        for max_dfrs in (100000, 300):
+            with override_settings(NUM_MAX_DFREADINGS_TO_PROCESS=max_dfrs):
+                scenario = create_sv_leak_scenario(1000)
+                runner = InMemoryAppRunner(
+                    sv_leak_detection_by_two_temps_1_0_0["function"],
+                    "sv_leak_detection_by_two_temps",
+                    scenario["settings"],
+                    scenario["time_resample"],
+                    scenario["cursor_ts"],
+                    scenario["native_dfs"],
+                    scenario["derived_df_names"],
+                )
+                report = runner.run()
+            self.assertEqual(report["num_ticks"], 1000)
+            results.append((runner.get_outputs(), runner.app.state, runner.alarm_payload))
+
+        (outputs, state, alarm_payload), (ref_outputs, ref_state, ref_alarm_payload) = results
+        for name, (rtss, values) in ref_outputs.items():
+            self.assertEqual(len(rtss), 1000)
+            np.testing.assert_array_equal(rtss, outputs[name][0])
+            np.testing.assert_array_equal(values, outputs[name][1])
+        self.assertEqual(state, ref_state)
+        self.assertEqual(alarm_payload, ref_alarm_payload)
+
+
+class FleetFunctionTest(SimpleTestCase):
+    # the applications evaluated together should get the same results as evaluated one by one
+
+    def create_fleet(self, create_scenario, num_apps: int) -> tuple[list, list, list, MemDfReadingStore]:
+        store = MemDfReadingStore()
+        apps, native_df_maps, derived_df_maps = [], [], []
+        df_pk = 0
+        for idx in range(num_apps):
+            scenario = create_scenario(600)
+            app = Application(
+                pk=idx + 1,
+                type=AppType(name="Test", func_name="Test"),
+                # the first application has its own thresholds, the last one has another period to process
+                settings={"temp_in_threshold": 100.0} if idx == 0 else {},
+                state={},
+                time_resample=scenario["time_resample"],
+                cursor_ts=scenario["cursor_ts"] + (100 * scenario["time_resample"] if idx == num_apps - 1 else 0),
+                is_enabled=True,
+            )
+            native_df_map, derived_df_map = {}, {}
+            for name, arrays in scenario["native_dfs"].items():
+                df_pk += 1
+                data_type = DataType(name=name, var_type=arrays["var_type"], agg_type=arrays["agg_type"])
+                df = Datafeed(pk=df_pk, name=name, parent=app, data_type=data_type)
+                df.ts_to_start_with = int(arrays["rtss"][-1])
+                # every application gets its own values
+                store.add_df_values(df_pk, arrays["rtss"], arrays["values"] + 2.0 * idx)
+                native_df_map[name] = df
+            for name in scenario["derived_df_names"]:
+                df_pk += 1
+                derived_df_map[name] = Datafeed(pk=df_pk, name=name, parent=app, data_type=DataType(name=name))
+            apps.append(app)
+            native_df_maps.append(native_df_map)
+            derived_df_maps.append(derived_df_map)
+        return apps, native_df_maps, derived_df_maps, store
+
+    def get_comparable(self, app_results) -> tuple[dict, dict]:
+        derived_df_readings, update_map = app_results
+        outputs = {name: (df_row.get("grid"), df_row.get("values")) for name, df_row in derived_df_readings.items()}
+        update_map = {**update_map, "state": serialize_app_state(update_map.get("state", {}))}
+        return outputs, update_map
+
+    def test_same_as_per_app(self):
+        for app_func_dict, create_scenario in (
+            (sv_leak_detection_by_two_temps_1_0_0, create_sv_leak_scenario),
+            (stall_detection_by_two_temps_1_0_0, create_stall_scenario),
+        ):
+            apps, native_df_maps, derived_df_maps, store = self.create_fleet(create_scenario, 4)
+            token = mem_dfr_store.set(store)
+            try:
+                results = app_func_dict["fleet_function"](apps, native_df_maps, derived_df_maps)
+                ref_results = [
+                    app_func_dict["function"](*args) for args in zip(apps, native_df_maps, derived_df_maps)
+                ]
+            finally:
+                mem_dfr_store.reset(token)
+
+            self.assertEqual(len(results), 4)
+            for app_results, ref_app_results in zip(results, ref_results):
+                outputs, update_map = self.get_comparable(app_results)
+                ref_outputs, ref_update_map = self.get_comparable(ref_app_results)
+                self.assertGreater(len(ref_outputs[STATUS_FIELD_NAME][0]), 0)
+                np.testing.assert_equal(outputs, ref_outputs)
+                self.assertEqual(update_map, ref_update_map)
+
+
+class ExecProfilerTest(SimpleTestCase):
+
+    def test_rolling_profile(self):
+        profile = {}
+        for i in range(1, 8):
+            profiler = ExecProfiler(True)
+            profiler.add_time("app_func", float(i))
+            profiler.add_time("alarms", 10.0)
+            profiler.add_rows("alarms", i)
+            profile = profiler.add_to_profile(profile, 5)
+
+        # only the last 5 executions are kept
+        self.assertEqual(profile["app_func"]["ms"], [3.0, 4.0, 5.0, 6.0, 7.0])
+        self.assertEqual(profile["total"]["ms"], [13.0, 14.0, 15.0, 16.0, 17.0])
+        percentiles = get_profile_percentiles(profile)
+        self.assertEqual(list(percentiles), ["total", "alarms", "app_func"])
+        self.assertEqual(percentiles["app_func"]["p50Ms"], 5.0)
+        self.assertEqual(percentiles["app_func"]["maxMs"], 7.0)
+        self.assertEqual(percentiles["alarms"]["meanRows"], 5.0)
+
+        profiler = ExecProfiler(False)
+        with profiler.phase("app_func"):
+            profiler.add_rows("app_func", 1)
+        self.assertEqual(profiler.phase_map, {})
+
+
+class AppFuncRegistryTest(SimpleTestCase):
+
+    def test_lazy_loading(self):
+        app_func_dict = load_app_func_dict("monitoring", "1.0.0")
+        self.assertIs(app_func_dict, monitoring_1_0_0)
+        self.assertIs(app_func_dict_cache[("monitoring", "1.0.0")], app_func_dict)
+        self.assertIs(load_app_func_dict("monitoring", "1.0.0"), app_func_dict)
+        with self.assertLogs("#app_func_map_utils", level="ERROR"):
+            self.assertIsNone(load_app_func_dict("monitoring", "0.0.0"))
+
+        num_versions = sum(len(version_map) for version_map in get_app_func_paths().values())
+        self.assertEqual(preload_app_funcs(["*"]), num_versions)
+        self.assertEqual(preload_app_funcs(["stall_detection_by_two_temps", "monitoring/1.0.0"]), 3)
+
+
+def create_app(app_type: AppType, interval: IntervalSchedule, name: str) -> Application:
+    task = PeriodicTask.objects.create(name=name, task="evaluate.app_func", interval=interval)
+    return Application.objects.create(
+        type=app_type,
+        time_resample=TIME_RESAMPLE,
+        cursor_ts=T0,
+        is_enabled=True,
+        invoc_interval=interval,
+        catch_up_interval=interval,
+        task=task,
+    )
+
+
+@override_settings(MAX_APP_STATE_SIZE=100, STORE_APP_STATE_IN_SIDE_TABLE=True)
+class AppStateSizeTest(TestCase):
+
+    def setUp(self):
+        interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        self.app = create_app(AppType.objects.create(name="Test", func_name="monitoring"), interval, "App task")
+
+    def test_state_too_large(self):
+        def app_func(app, native_df_map, derived_df_map):
+            return {}, {"cursor_ts": T0 + 10 * TIME_RESAMPLE, "state": {"history": list(range(100))}}
+
+        with self.assertLogs("#app_func_executor", level="ERROR"):
+            AppFuncExecutor(self.app, app_func, self.app.task).evaluate()
+
+        # the results are saved and the cursor moves on with an empty state, so the application isn't stuck
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.cursor_ts, T0 + 10 * TIME_RESAMPLE)
+        self.assertEqual(decode_app_state(AppState.objects.get(application=self.app).data), {})
+        self.assertEqual(self.app.errors[STATE_TOO_LARGE_ALARM_NAME]["st"], "in")
+        self.assertEqual(self.app.health, HealthGrades.ERROR)
+
+
+@override_settings(MAX_APPS_TO_EXEC=2)
+class ClaimDueAppsTest(TestCase):
+
+    def setUp(self):
+        self.interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        app_type = AppType.objects.create(name="Test", func_name="monitoring")
+        now_ts = create_now_ts_ms()
+        self.apps = []
+        for i, next_eval_ts in enumerate((now_ts - 1000, None, now_ts + 600000, now_ts - 2000)):
+            app = create_app(app_type, self.interval, f"App {i} task")
+            app.next_eval_ts = next_eval_ts
+            app.save()
+            self.apps.append(app)
+        # an application without a task is never claimed
+        self.apps[3].task = None
+        self.apps[3].save()
+
+    def test_claim_due_apps(self):
+        now_ts = create_now_ts_ms()
+        # the applications never executed go first, then the ones due for longer
+        claimed = MultiAppExecutor().claim_due_apps()
+        self.assertEqual([app.pk for app in claimed], [self.apps[1].pk, self.apps[0].pk])
+        for app in claimed:
+            app.refresh_from_db()
+            # rescheduled at once, so the other workers don't claim them
+            self.assertGreaterEqual(app.next_eval_ts, now_ts + 60000)
+
+        self.assertEqual(MultiAppExecutor().claim_due_apps(), [])
+
+    def test_due_apps_task_enabled(self):
+        self.assertFalse(is_due_apps_task_enabled())
+        task = PeriodicTask.objects.create(name="Execute due apps", task="evaluate.due_apps", interval=self.interval)
+        self.assertTrue(is_due_apps_task_enabled())
+        task.enabled = False
+        task.save()
+        self.assertFalse(is_due_apps_task_enabled())
+
+
+def catching_up_app_func(app, native_df_map, derived_df_map, num_windows: int = 5, failing_window: int | None = None):
+    # processes a window of 10 ticks per invocation, the state counts the windows
+    window_idx = app.state.get("num_windows", 0)
+    if window_idx == failing_window:
+        raise ValueError("Test error")
+    cursor_ts = app.cursor_ts + 10 * TIME_RESAMPLE
+    update_map = {
+        "cursor_ts": cursor_ts,
+        "state": {"num_windows": window_idx + 1},
+        "is_catching_up": window_idx + 1 < num_windows,
+    }
+    return {}, update_map
+
+
+@override_settings(STORE_APP_STATE_IN_SIDE_TABLE=True, CATCH_UP_MAX_RUN_TIME_MS=600000)
+class CatchUpExecutorTest(TestCase):
+
+    def setUp(self):
+        interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        self.app = create_app(AppType.objects.create(name="Test", func_name="monitoring"), interval, "App task")
+
+    def execute(self, app_func):
+        CatchUpExecutor(Application.objects.get(pk=self.app.pk), app_func, self.app.task).execute()
+        self.app.refresh_from_db()
+
+    def get_state_record(self) -> AppState | None:
+        return AppState.objects.filter(application=self.app).first()
+
+    def test_one_checkpoint(self):
+        with self.settings(CATCH_UP_CHECKPOINT_INTERVAL_MS=600000):
+            self.execute(catching_up_app_func)
+
+        self.assertEqual(self.app.cursor_ts, T0 + 50 * TIME_RESAMPLE)
+        self.assertFalse(self.app.is_catching_up)
+        # the state is saved once, at the checkpoint
+        self.assertEqual(self.get_state_record().version, 1)
+        self.assertEqual(decode_app_state(self.get_state_record().data), {"num_windows": 5})
+        # the lease is released
+        self.assertEqual(self.app.catch_up_progress, {})
+
+    def test_checkpoint_per_window(self):
+        with self.settings(CATCH_UP_CHECKPOINT_INTERVAL_MS=-1):
+            self.execute(catching_up_app_func)
+
+        self.assertEqual(self.app.cursor_ts, T0 + 50 * TIME_RESAMPLE)
+        self.assertEqual(self.get_state_record().version, 5)
+        self.assertEqual(decode_app_state(self.get_state_record().data), {"num_windows": 5})
+
+    def test_rollback(self):
+        # the checkpoints before the failing window are kept
+        with self.settings(CATCH_UP_CHECKPOINT_INTERVAL_MS=-1), self.assertLogs("#catch_up_executor", level="ERROR"):
+            self.execute(partial(catching_up_app_func, failing_window=2))
+
+        self.assertEqual(self.app.cursor_ts, T0 + 20 * TIME_RESAMPLE)
+        # health stays frozen while the application is catching up
+        self.assertTrue(self.app.is_catching_up)
+        self.assertEqual(decode_app_state(self.get_state_record().data), {"num_windows": 2})
+        self.assertNotIn("leaseUntilTs", self.app.catch_up_progress)
+
+        # the whole checkpoint with the failing window is rolled back, the next run continues from the last one
+        with (
+            self.settings(CATCH_UP_CHECKPOINT_INTERVAL_MS=600000),
+            self.assertLogs("#catch_up_executor", level="ERROR"),
+        ):
+            self.execute(partial(catching_up_app_func, failing_window=4))
+
+        self.assertEqual(self.app.cursor_ts, T0 + 20 * TIME_RESAMPLE)
+        self.assertEqual(decode_app_state(self.get_state_record().data), {"num_windows": 2})
+
+        self.execute(catching_up_app_func)
+        self.assertEqual(self.app.cursor_ts, T0 + 50 * TIME_RESAMPLE)
+        self.assertFalse(self.app.is_catching_up)
+        self.assertEqual(decode_app_state(self.get_state_record().data), {"num_windows": 5})
+
+    def test_lease(self):
+        # another worker is catching up the application
+        self.app.catch_up_progress = {"leaseUntilTs": create_now_ts_ms() + 600000}
+        self.app.save()
+        self.execute(catching_up_app_func)
+
+        self.assertEqual(self.app.cursor_ts, T0)
+        self.assertIsNone(self.get_state_record())
+
+
+def moving_app_func(app, native_df_map, derived_df_map, failing_app_pk: int | None = None):
+    if app.pk == failing_app_pk:
+        raise ValueError("Test error")
+    return {}, {"cursor_ts": app.cursor_ts + 10 * TIME_RESAMPLE}
+
+
+class FleetExecutorTest(TestCase):
+
+    def setUp(self):
+        interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        app_type = AppType.objects.create(name="Test", func_name="monitoring")
+        self.apps = [create_app(app_type, interval, f"App task {i}") for i in range(4)]
+        self.fleets = []
+
+    def fleet_func(self, apps, native_df_maps, derived_df_maps):
+        self.fleets.append([app.pk for app in apps])
+        return [moving_app_func(*args) for args in zip(apps, native_df_maps, derived_df_maps)]
+
+    def failing_fleet_func(self, apps, native_df_maps, derived_df_maps):
+        raise ValueError("Test error")
+
+    def get_cursor_tss(self) -> list[int]:
+        return list(Application.objects.order_by("pk").values_list("cursor_ts", flat=True))
+
+    def test_fallback_to_per_app(self):
+        # the applications are evaluated one by one, only the one that fails gets an error
+        app_func = partial(moving_app_func, failing_app_pk=self.apps[1].pk)
+        with (
+            self.assertLogs("#fleet_executor", level="ERROR"),
+            self.assertLogs("#app_func_executor", level="ERROR") as app_logs,
+        ):
+            FleetExecutor(self.apps, app_func, self.failing_fleet_func).execute()
+
+        moved_ts = T0 + 10 * TIME_RESAMPLE
+        self.assertEqual(self.get_cursor_tss(), [moved_ts, T0, moved_ts, moved_ts])
+        self.assertEqual(len(app_logs.records), 1)
+
+    def test_executed_apps_skipped(self):
+        # the applications executed less than half an interval ago were executed with a fleet in this round
+        Application.objects.filter(pk__in=[self.apps[0].pk, self.apps[2].pk]).update(last_eval_ts=create_now_ts_ms())
+        apps = list(Application.objects.select_related("type", "task").order_by("pk"))
+
+        exec_app_fleet(apps[0], apps[0].task, moving_app_func, self.fleet_func)
+        self.assertEqual(self.fleets, [])
+
+        exec_app_fleet(apps[1], apps[1].task, moving_app_func, self.fleet_func)
+        self.assertEqual(self.fleets, [[apps[1].pk, apps[3].pk]])
+        self.assertEqual(self.get_cursor_tss(), [T0, T0 + 10 * TIME_RESAMPLE, T0, T0 + 10 * TIME_RESAMPLE])
+
+        # the rest of the round finds the whole fleet executed
+        exec_app_fleet(apps[3], apps[3].task, moving_app_func, self.fleet_func)
+        self.assertEqual(len(self.fleets), 1)
+
+
+@override_settings(MAX_DFR_CREATOR_WORKERS=4)
+class ConcurrentResamplingTest(TestCase):
+
+    def setUp(self):
+        interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        self.app = create_app(AppType.objects.create(name="Test", func_name="monitoring"), interval, "App task")
+        device = Device.objects.create(name="Device", dev_ui="dev-1")
+        data_type = DataType.objects.create(name="Temp", agg_type=DataAggTypes.AVG, var_type=VariableTypes.CONTINUOUS)
+        self.dfs = []
+        for i in range(3):
+            # the restoration of the second datafeed fails, as its datastream has no 'time_change'
+            ds = Datastream.objects.create(
+                name=f"Temp {i}", data_type=data_type, parent=device, time_change=None if i == 1 else 600000
+            )
+            DsReading.objects.bulk_create(
+                DsReading(time=T0 + j * 30000, db_value=float(j), datastream=ds) for j in range(1, 101)
+            )
+            self.dfs.append(
+                Datafeed.objects.create(name=f"Temp {i}", parent=self.app, datastream=ds, data_type=data_type)
+            )
+
+    def test_failing_df_isolated(self):
+        with self.assertLogs("#app_func_executor", level="ERROR") as logs:
+            AppFuncExecutor(self.app, monitoring_1_0_0["function"], self.app.task).create_df_readings()
+
+        self.assertEqual(len(logs.records), 1)
+        num_df_readings = [DfReading.objects.filter(datafeed=df).count() for df in self.dfs]
+        self.assertEqual(num_df_readings[1], 0)
+        self.assertGreater(num_df_readings[0], 0)
+        self.assertEqual(num_df_readings[0], num_df_readings[2])
+
+    def test_thread_pool(self):
+        # SQLite doesn't support concurrent writes, so the jobs themselves are replaced here
+        thread_names = []
+
+        def run_resampling_job(executor, job):
+            ds_pk, nat_dfs = job
+            thread_names.append(threading.current_thread().name)
+            return {df.pk: df.pk == self.dfs[2].pk for df in nat_dfs}
+
+        with (
+            mock.patch("services.app_func_executor.connection", mock.Mock(vendor="postgresql")),
+            mock.patch("services.app_func_executor.connections") as connections,
+            mock.patch.object(AppFuncExecutor, "run_resampling_job", run_resampling_job),
+        ):
+            is_catching_up = AppFuncExecutor(self.app, monitoring_1_0_0["function"], self.app.task).create_df_readings()
+
+        self.assertTrue(is_catching_up)
+        self.assertEqual(len(thread_names), 3)
+        self.assertTrue(all(name.startswith("dfr_creator") for name in thread_names))
+        # every thread closes its db connection after its job
+        self.assertEqual(connections.close_all.call_count, 3)
+
+
+@override_settings(TRIGGER_APPS_ON_NEW_DATA=True, EXECUTE_DUE_APPS_IN_BATCHES=True, APP_TRIGGER_DELAY_MS=5000)
+class EnqueueAppEvalsTest(TestCase):
+
+    def setUp(self):
+        interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        app_type = AppType.objects.create(name="Test", func_name="monitoring")
+        device = Device.objects.create(name="Device", dev_ui="dev-1")
+        data_type = DataType.objects.create(name="Temp", agg_type=DataAggTypes.AVG, var_type=VariableTypes.CONTINUOUS)
+        self.dss = [Datastream.objects.create(name=f"Temp {i}", data_type=data_type, parent=device) for i in range(3)]
+        self.now_ts = create_now_ts_ms()
+        self.apps = [create_app(app_type, interval, f"App task {i}") for i in range(4)]
+        # the first application uses both datastreams with new data, the second one is due before the delay ends,
+        # the third one is disabled, the fourth one uses another datastream
+        for app, ds_idxs, next_eval_ts, is_enabled in (
+            (self.apps[0], (0, 1), self.now_ts + 60000, True),
+            (self.apps[1], (0,), self.now_ts + 1000, True),
+            (self.apps[2], (1,), self.now_ts + 60000, False),
+            (self.apps[3], (2,), self.now_ts + 60000, True),
+        ):
+            for ds_idx in ds_idxs:
+                Datafeed.objects.create(
+                    name=f"Temp {ds_idx}", parent=app, datastream=self.dss[ds_idx], data_type=data_type
+                )
+            Application.objects.filter(pk=app.pk).update(next_eval_ts=next_eval_ts, is_enabled=is_enabled)
+
+    def get_next_eval_tss(self) -> list[int]:
+        return list(Application.objects.order_by("pk").values_list("next_eval_ts", flat=True))
+
+    def test_coalescing(self):
+        ds_pks = [self.dss[0].pk, self.dss[1].pk]
+        with mock.patch.object(exec_due_apps, "apply_async") as apply_async:
+            num_triggered = enqueue_app_evals(ds_pks, self.now_ts)
+
+            self.assertEqual(num_triggered, 1)
+            apply_async.assert_called_once_with(countdown=5)
+            self.assertEqual(
+                self.get_next_eval_tss(),
+                [self.now_ts + 5000, self.now_ts + 1000, self.now_ts + 60000, self.now_ts + 60000],
+            )
+
+            # the data that comes within the delay is processed with the same execution
+            self.assertEqual(enqueue_app_evals(ds_pks, self.now_ts + 2000), 0)
+            self.assertEqual(apply_async.call_count, 1)
+            self.assertEqual(self.get_next_eval_tss()[0], self.now_ts + 5000)
+
+
+def windowed_app_func(app, native_df_map, derived_df_map, window: int = 5):
+    # the status is the number of ticks seen within the last 'window' ones, so the warm-up of 'window' ticks
+    # restores the state of a sequential execution
+    end_rts = min(app.cursor_ts + 10 * TIME_RESAMPLE, *(df.ts_to_start_with for df in native_df_map.values()))
+    grid = np.arange(app.cursor_ts + TIME_RESAMPLE, end_rts + 1, TIME_RESAMPLE, dtype=np.int64)
+    num_ticks = app.state.get("num_ticks", 0) + np.arange(1, len(grid) + 1)
+    status_df = derived_df_map[STATUS_FIELD_NAME]
+    derived_df_readings = {
+        STATUS_FIELD_NAME: {"df": status_df, "grid": grid, "values": np.minimum(num_ticks, window).astype(np.float64)}
+    }
+    return derived_df_readings, {"cursor_ts": end_rts, "state": {"num_ticks": min(int(num_ticks[-1]), window)}}
+
+
+@mock.patch("services.app_recomputer.discover_app_func", lambda app: windowed_app_func)
+class AppRecomputerTest(TestCase):
+
+    def setUp(self):
+        interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        self.app = create_app(AppType.objects.create(name="Test", func_name="monitoring"), interval, "App task")
+        Application.objects.filter(pk=self.app.pk).update(cursor_ts=T0 + 100 * TIME_RESAMPLE)
+        temp_type = DataType.objects.create(name="Temp", agg_type=DataAggTypes.AVG, var_type=VariableTypes.CONTINUOUS)
+        status_type = DataType.objects.create(
+            name=STATUS_FIELD_NAME, agg_type=DataAggTypes.LAST, var_type=VariableTypes.NOMINAL
+        )
+        ds = Datastream.objects.create(
+            name="Temp", data_type=temp_type, parent=Device.objects.create(name="Device", dev_ui="dev-1")
+        )
+        Datafeed.objects.create(name="Temp", parent=self.app, datastream=ds, data_type=temp_type)
+        self.status_df = Datafeed.objects.create(name=STATUS_FIELD_NAME, parent=self.app, data_type=status_type)
+
+    def recompute(self, num_partitions: int, warm_up_ticks: int, use_checkpoints: bool = False):
+        report = AppRecomputer(
+            self.app.pk, T0, num_partitions=num_partitions, warm_up_ticks=warm_up_ticks, use_checkpoints=use_checkpoints
+        ).execute()
+        df_readings = DfReading.objects.filter(datafeed=self.status_df).order_by("time")
+        return report, list(df_readings.values_list("time", "db_value"))
+
+    def test_same_as_sequential(self):
+        _, ref_df_readings = self.recompute(1, 5)
+        self.assertEqual(len(ref_df_readings), 100)
+
+        # the partitions are seeded by the warm-up
+        report, df_readings = self.recompute(4, 5)
+        self.assertEqual((report["num_partitions"], report["num_cold_started"]), (4, 0))
+        self.assertEqual(df_readings, ref_df_readings)
+
+    def test_seeded_from_checkpoints(self):
+        # the checkpoints are saved at the ends of the partitions
+        self.recompute(4, 5)
+        _, ref_df_readings = self.recompute(1, 0)
+
+        # the first partition has no checkpoint and starts from the same empty state as the sequential recomputation
+        report, df_readings = self.recompute(4, 0, use_checkpoints=True)
+        self.assertEqual((report["num_seeded_from_checkpoints"], report["num_cold_started"]), (3, 0))
+        self.assertEqual(df_readings, ref_df_readings)
+
+    def test_cold_started(self):
+        _, ref_df_readings = self.recompute(1, 0)
+        with self.assertLogs("#app_recomputer", level="WARNING"):
+            report, df_readings = self.recompute(4, 0)
+
+        self.assertEqual(report["num_cold_started"], 3)
+        self.assertNotEqual(df_readings, ref_df_readings)
+
+
+class SaveNewDfValuesTest(TestCase):
+
+    def setUp(self):
+        interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        self.app = create_app(AppType.objects.create(name="Test", func_name="monitoring"), interval, "App task")
+        self.grid = T0 + TIME_RESAMPLE * np.arange(1, 9, dtype=np.int64)
+        self.values = np.array([0.5, 1.5, np.nan, 2.4, -0.5, 2.6, 7.0, np.nan], dtype=np.float64)
+
+    def create_dfs(self, var_type: VariableTypes) -> tuple[Datafeed, Datafeed]:
+        data_type = DataType.objects.create(name=f"Type {var_type}", agg_type=DataAggTypes.LAST, var_type=var_type)
+        return tuple(
+            Datafeed.objects.create(name=f"Df {var_type} {i}", parent=self.app, data_type=data_type) for i in range(2)
+        )
+
+    def get_rows(self, df: Datafeed) -> list[tuple]:
+        return list(
+            DfReading.objects.filter(datafeed=df).order_by("time").values_list("time", "db_value", "restored")
+        )
+
+    def test_same_as_df_readings(self):
+        # the integer values are rounded the same way, NaN means no df reading
+        for var_type in (VariableTypes.NOMINAL, VariableTypes.CONTINUOUS):
+            with self.subTest(var_type=var_type):
+                values_df, readings_df = self.create_dfs(var_type)
+                executor = AppFuncExecutor(self.app, None, self.app.task)
+
+                latest = executor.save_new_df_values(values_df, self.grid, self.values)
+                new_df_readings = [
+                    DfReading(time=rts, datafeed=readings_df, value=value)
+                    for rts, value in zip(self.grid.tolist(), self.values.tolist())
+                    if not np.isnan(value)
+                ]
+                latest_dfr = executor.save_new_df_readings(new_df_readings)
+
+                self.assertEqual(len(self.get_rows(values_df)), 6)
+                self.assertEqual(self.get_rows(values_df), self.get_rows(readings_df))
+                self.assertEqual(latest, (latest_dfr.time, latest_dfr.value))
+                self.assertIs(type(latest[1]), type(latest_dfr.value))
+
+    def test_no_values(self):
+        values_df, _ = self.create_dfs(VariableTypes.NOMINAL)
+        executor = AppFuncExecutor(self.app, None, self.app.task)
+
+        self.assertIsNone(executor.save_new_df_values(values_df, self.grid, np.full(len(self.grid), np.nan)))
+        self.assertIsNone(executor.save_new_df_readings([]))
+        self.assertEqual(self.get_rows(values_df), [])
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DatafeedsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.datafeeds"
+
+    def ready(self):
+        from apps.datafeeds import signals  # noqa: F401
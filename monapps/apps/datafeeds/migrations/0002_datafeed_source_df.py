@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 05:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datafeeds', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datafeed',
+            name='source_df',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shared_dfs', related_query_name='shared_df', to='datafeeds.datafeed'),
+        ),
+    ]
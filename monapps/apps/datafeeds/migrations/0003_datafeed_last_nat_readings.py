@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 05:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datafeeds', '0002_datafeed_source_df'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datafeed',
+            name='last_nat_readings',
+            field=models.JSONField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -50,8 +50,22 @@ class Datafeed(PublishingOnSaveModel):
         default=AugmentationPolicy.TILL_LAST_DF_READING, choices=AugmentationPolicy.choices
     )
 
+    # if set, the df readings of this datafeed are not created, the ones of 'source_df'
+    # (a datafeed of another application with the same resampling settings) are used instead
+    source_df = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="shared_dfs",
+        related_query_name="shared_df",
+    )
+
     ts_to_start_with = models.BigIntegerField(default=0)
     last_reading_ts = models.BigIntegerField(default=None, null=True, blank=True)
+    # [[time, db_value], ...] of the last native (not restored) df readings, used as the restoration context,
+    # None - not collected yet
+    last_nat_readings = models.JSONField(default=None, null=True, blank=True)
 
     @property
     def is_value_interger(self) -> bool:
@@ -61,5 +75,10 @@ class Datafeed(PublishingOnSaveModel):
     def time_resample(self) -> int:
         return self.parent.time_resample
 
+    @property
+    def reading_df_id(self) -> int:
+        # the pk of the datafeed the df readings are stored under
+        return self.source_df_id if self.source_df_id is not None else self.pk
+
     def __str__(self):
         return f"Datafeed {self.pk} {self.name}"
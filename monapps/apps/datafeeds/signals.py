@@ -0,0 +1,10 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from apps.datafeeds.models import Datafeed
+from utils.df_sharing_utils import unlink_shared_dfs
+
+
+@receiver(pre_delete, sender=Datafeed)
+def unlink_shared_dfs_on_delete(sender, instance: Datafeed, **kwargs):
+    unlink_shared_dfs(instance)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datastreams', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datastream',
+            name='rollup_ts',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -63,6 +63,8 @@ class Datastream(PublishingOnSaveModel):
     min_plausible_value = models.FloatField(default=-1000000.0)  # TODO: should be < max_plausible_value
 
     ts_to_start_with = models.BigIntegerField(default=0)  # can be even bigger than 'last_valid_reading_ts'
+    # all the ds readings with 'time' <= 'rollup_ts' are already included into the rollups
+    rollup_ts = models.BigIntegerField(default=0)
 
     # the timestamp of the last valid reading
     last_valid_reading_ts = models.BigIntegerField(default=None, null=True, blank=True)  # only valid reading
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-19 05:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.conf import settings
+
+
+additional_operations = []
+if settings.DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    additional_operations = [
+        migrations.RunSQL(
+            """
+            SELECT create_hypertable('df_reading_spans', by_range('time', 2592000000));
+            """,
+            reverse_sql="""
+                DROP TABLE df_reading_spans;
+            """,
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datafeeds', '0001_initial'),
+        ('dfreadings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DfReadingSpan',
+            fields=[
+                ('pk', models.CompositePrimaryKey('datafeed_id', 'time', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('time', models.BigIntegerField()),
+                ('end_time', models.BigIntegerField()),
+                ('db_value', models.FloatField()),
+                ('restored', models.BooleanField(default=True)),
+                ('datafeed', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='datafeeds.datafeed')),
+            ],
+            options={
+                'db_table': 'df_reading_spans',
+            },
+        ),
+        *additional_operations,
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-19 05:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.conf import settings
+
+
+additional_operations = []
+if settings.DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    additional_operations = [
+        migrations.RunSQL(
+            """
+            SELECT create_hypertable('df_reading_stats', by_range('time', 2592000000));
+            """,
+            reverse_sql="""
+                DROP TABLE df_reading_stats;
+            """,
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datafeeds', '0003_datafeed_last_nat_readings'),
+        ('dfreadings', '0002_dfreadingspan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DfReadingStats',
+            fields=[
+                ('pk', models.CompositePrimaryKey('datafeed_id', 'time', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('time', models.BigIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('sum', models.FloatField(default=0.0)),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+                ('last', models.FloatField()),
+                ('datafeed', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='datafeeds.datafeed')),
+            ],
+            options={
+                'db_table': 'df_reading_stats',
+            },
+        ),
+        *additional_operations,
+    ]
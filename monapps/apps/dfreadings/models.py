@@ -19,6 +19,8 @@ class DfReading(models.Model):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.not_to_use: None | NotToUseDfrTypes = None
+        # statistics of the bin, only for native df readings created by resampling (see 'DfReadingStats')
+        self.stats: None | DfReadingStats = None
 
     @property
     def value(self) -> float | int:
@@ -40,3 +42,60 @@ class DfReading(models.Model):
             return f"DFR df:{self.datafeed.pk} ts:{dt_str} val: {self.value} {'R' if self.restored else ''}"
         else:
             return f"DFR df:{self.datafeed.pk} ts:{dt_str} val: {self.value:.3f} {'R' if self.restored else ''}"
+
+
+class DfReadingSpan(models.Model):
+    """
+    Represents df readings with the same value at every 'time_resample' of the datafeed
+    from 'time' to 'end_time' (both included). Long constant periods created by the augmentation
+    are stored this way instead of a df reading per bin.
+    """
+
+    class Meta:
+        db_table = "df_reading_spans"
+
+    pk = models.CompositePrimaryKey("datafeed_id", "time")
+    time = models.BigIntegerField()
+    end_time = models.BigIntegerField()
+    datafeed = models.ForeignKey(Datafeed, on_delete=models.PROTECT)
+    db_value = models.FloatField()
+    restored = models.BooleanField(default=True)
+
+    @property
+    def value(self) -> float | int:
+        if self.datafeed.is_value_interger:
+            return int(self.db_value)
+        else:
+            return self.db_value
+
+    def get_num_readings(self, time_resample: int) -> int:
+        return (self.end_time - self.time) // time_resample + 1
+
+    def __str__(self):
+        start_dt_str = create_dt_from_ts_ms(self.time).strftime("%Y/%m/%d %H:%M:%S")
+        end_dt_str = create_dt_from_ts_ms(self.end_time).strftime("%Y/%m/%d %H:%M:%S")
+        return f"DFR span df:{self.datafeed.pk} ts:{start_dt_str}-{end_dt_str} val: {self.value}"
+
+
+class DfReadingStats(models.Model):
+    """
+    Statistics of the ds readings within the bin of a native df reading, they are computed
+    in the same pass as the df reading itself, so the raw ds readings are not needed to get them.
+    The fields are the same as in 'DsReadingRollup'.
+    """
+
+    class Meta:
+        db_table = "df_reading_stats"
+
+    pk = models.CompositePrimaryKey("datafeed_id", "time")
+    time = models.BigIntegerField()
+    datafeed = models.ForeignKey(Datafeed, on_delete=models.PROTECT)
+    count = models.IntegerField(default=0)
+    sum = models.FloatField(default=0.0)
+    min = models.FloatField()
+    max = models.FloatField()
+    last = models.FloatField()
+
+    def __str__(self):
+        dt_str = create_dt_from_ts_ms(self.time).strftime("%Y/%m/%d %H:%M:%S")
+        return f"DFR stats df:{self.datafeed_id} ts:{dt_str} cnt: {self.count}"
@@ -1,3 +1,511 @@
-from django.test import TestCase
+import random
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django_celery_beat.models import IntervalSchedule
+
+from apps.applications.models import Application, AppType
+from apps.datafeeds.models import Datafeed
+from apps.datastreams.models import Datastream
+from apps.datatypes.models import DataType
+from apps.devices.models import Device
+from apps.dsreadings.models import DsReading, DsReadingRollup
+from apps.dfreadings.models import DfReading, DfReadingSpan, DfReadingStats
+from common.constants import DataAggTypes, VariableTypes, NotToUseDfrTypes
+from utils.ts_utils import ceil_timestamp
+from utils.dsr_utils import DsReadingCache
+from utils.dfr_utils import (
+    resample_ds_readings,
+    resample_ds_readings_in_db,
+    resample_ds_rollups,
+    delete_df_readings,
+    restore_totalizer,
+)
+from utils.rollup_utils import get_rollup_tier, combine_rollups, update_ds_rollups
+from utils.df_sharing_utils import link_to_source_df, unlink_from_source_df
+from utils.app_func_utils import get_df_value_map
+from services.dfr_creator import DfrCreator
+from services.ds_resampler import DsResampler
+
+T0 = 1_700_000_000_000 - 1_700_000_000_000 % 3600000
+TIME_RESAMPLE = 60000
+
+
+class ResampleInDbTest(TestCase):
+    # the python path is the reference implementation, the db path should give the same df readings
+
+    def setUp(self):
+        self.interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        self.device = Device.objects.create(name="Device", dev_ui="dev-1")
+        self.rnd = random.Random(1)
+
+    def create_df(self, name: str, agg_type: DataAggTypes, var_type: VariableTypes) -> Datafeed:
+        data_type = DataType.objects.create(name=name, agg_type=agg_type, var_type=var_type)
+        ds = Datastream.objects.create(name=name, data_type=data_type, parent=self.device)
+        app = Application.objects.create(
+            type=AppType.objects.create(name=name, func_name="monitoring"),
+            time_resample=TIME_RESAMPLE,
+            cursor_ts=T0,
+            invoc_interval=self.interval,
+            catch_up_interval=self.interval,
+        )
+        df = Datafeed.objects.create(name=name, parent=app, datastream=ds, data_type=data_type)
+
+        ts = T0
+        ds_readings = []
+        for i in range(500):
+            if self.rnd.random() < 0.05:
+                # some bins have no ds readings at all
+                ts += self.rnd.randint(2, 10) * TIME_RESAMPLE
+            # some ds readings are exactly at the bin boundaries
+            ts += self.rnd.choice((TIME_RESAMPLE // 2, TIME_RESAMPLE, self.rnd.randint(1000, 40000)))
+            value = self.rnd.uniform(-50, 50)
+            if var_type != VariableTypes.CONTINUOUS:
+                value = round(value, 0)
+            ds_readings.append(DsReading(time=ts, db_value=value, datastream=ds))
+        DsReading.objects.bulk_create(ds_readings)
+        return df
+
+    def assert_same_df_readings(self, df: Datafeed, agg_type: DataAggTypes, from_rts: int, to_rts: int):
+        sorted_ds_readings = list(
+            DsReading.objects.filter(datastream__id=df.datastream_id, time__gt=from_rts, time__lte=to_rts)
+            .select_related("datastream__data_type")
+            .order_by("time")
+        )
+        expected = resample_ds_readings(sorted_ds_readings, df, TIME_RESAMPLE, agg_type, with_stats=True)
+        actual = resample_ds_readings_in_db(
+            df.datastream_id, df, TIME_RESAMPLE, agg_type, from_rts, to_rts, with_stats=True
+        )
+
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(list(expected), list(actual))
+        for rts, dfr in expected.items():
+            # the summation order of the db can be different
+            self.assertAlmostEqual(dfr.db_value, actual[rts].db_value, places=9)
+            self.assertEqual(dfr.restored, actual[rts].restored)
+            self.assertEqual(dfr.not_to_use, actual[rts].not_to_use)
+            for field in ("count", "min", "max", "last"):
+                self.assertEqual(getattr(dfr.stats, field), getattr(actual[rts].stats, field))
+            self.assertAlmostEqual(dfr.stats.sum, actual[rts].stats.sum, places=9)
+
+    def test_same_as_python_resampling(self):
+        cases = [
+            ("avg", DataAggTypes.AVG, VariableTypes.CONTINUOUS),
+            ("sum", DataAggTypes.SUM, VariableTypes.CONTINUOUS),
+            ("sum_discrete", DataAggTypes.SUM, VariableTypes.DISCRETE),
+            ("last", DataAggTypes.LAST, VariableTypes.CONTINUOUS),
+            ("last_categorical", DataAggTypes.LAST, VariableTypes.NOMINAL),
+        ]
+        for name, agg_type, var_type in cases:
+            with self.subTest(name=name):
+                df = self.create_df(name, agg_type, var_type)
+                self.assert_same_df_readings(df, agg_type, T0, T0 + 1000 * TIME_RESAMPLE)
+                # a part of the period, the ds readings at 'from_rts' should not be included
+                self.assert_same_df_readings(df, agg_type, T0 + 30 * TIME_RESAMPLE, T0 + 200 * TIME_RESAMPLE)
+
+    def test_no_ds_readings(self):
+        df = self.create_df("empty", DataAggTypes.AVG, VariableTypes.CONTINUOUS)
+        df_reading_map = resample_ds_readings_in_db(
+            df.datastream_id, df, TIME_RESAMPLE, DataAggTypes.AVG, T0 - 10 * TIME_RESAMPLE, T0
+        )
+        self.assertEqual(df_reading_map, {})
+
+
+class DsRollupsTest(TestCase):
+    # resampling the raw ds readings is the reference, resampling the rollups should give the same df readings
+
+    def setUp(self):
+        interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        data_type = DataType.objects.create(name="Temp", agg_type=DataAggTypes.AVG, var_type=VariableTypes.CONTINUOUS)
+        self.ds = Datastream.objects.create(
+            name="Temp", data_type=data_type, parent=Device.objects.create(name="Device", dev_ui="dev-1")
+        )
+        self.ds.rollup_ts = T0
+        self.app = Application.objects.create(
+            type=AppType.objects.create(name="Temp", func_name="monitoring"),
+            time_resample=TIME_RESAMPLE,
+            cursor_ts=T0,
+            invoc_interval=interval,
+            catch_up_interval=interval,
+        )
+        self.df = Datafeed.objects.create(name="Temp", parent=self.app, datastream=self.ds, data_type=data_type)
+
+        rnd = random.Random(1)
+        ts = T0
+        ds_readings = []
+        for _ in range(2000):
+            # some ds readings are exactly at the bin boundaries
+            ts += rnd.choice((TIME_RESAMPLE // 2, TIME_RESAMPLE, rnd.randint(1000, 40000), rnd.randint(1, 30) * 60000))
+            ds_readings.append(DsReading(time=ts, db_value=rnd.uniform(-50, 50), datastream=self.ds))
+        self.ds_readings = DsReading.objects.bulk_create(ds_readings)
+
+    def test_rollup_tier(self):
+        with self.settings(DS_ROLLUP_TIERS_MS=[60000, 3600000, 86400000]):
+            self.assertEqual(get_rollup_tier(60000), 60000)
+            self.assertEqual(get_rollup_tier(300000), 60000)
+            self.assertEqual(get_rollup_tier(7200000), 3600000)
+            self.assertEqual(get_rollup_tier(86400000), 86400000)
+            self.assertIsNone(get_rollup_tier(90000))
+
+    def test_same_as_raw_resampling(self):
+        # the rollups are updated in several steps, so the bins at the step boundaries are merged
+        step_tss = [T0 + 7 * 3600000 + 12345, T0 + 20 * 3600000 + TIME_RESAMPLE, self.ds_readings[-1].time]
+        from_ts = T0
+        for to_ts in step_tss:
+            step_ds_readings = [r for r in self.ds_readings if from_ts < r.time <= to_ts]
+            self.assertTrue(update_ds_rollups(self.ds, step_ds_readings, from_ts, to_ts))
+            self.assertEqual(self.ds.rollup_ts, to_ts)
+            from_ts = to_ts
+
+        for time_resample in (60000, 300000, 3600000, 7200000):
+            self.app.time_resample = time_resample
+            tier = get_rollup_tier(time_resample)
+            rollups = list(DsReadingRollup.objects.filter(datastream=self.ds, tier=tier).order_by("time"))
+            if tier != time_resample:
+                rollups = combine_rollups(rollups, time_resample)
+            for agg_type in (DataAggTypes.AVG, DataAggTypes.SUM, DataAggTypes.LAST):
+                expected = resample_ds_readings(self.ds_readings, self.df, time_resample, agg_type, with_stats=True)
+                actual = resample_ds_rollups(rollups, self.df, agg_type, with_stats=True)
+
+                self.assertGreater(len(expected), 0)
+                self.assertEqual(list(expected), list(actual))
+                for rts, dfr in expected.items():
+                    # the summation order is different
+                    self.assertAlmostEqual(dfr.db_value, actual[rts].db_value, places=9)
+                    self.assertEqual(dfr.restored, actual[rts].restored)
+                    self.assertEqual(dfr.not_to_use, actual[rts].not_to_use)
+                    for field in ("count", "min", "max", "last"):
+                        self.assertEqual(getattr(dfr.stats, field), getattr(actual[rts].stats, field))
+                    self.assertAlmostEqual(dfr.stats.sum, actual[rts].stats.sum, places=9)
+
+    def test_rollup_ts_gating(self):
+        to_ts = T0 + 3600000
+        # there is a gap between 'rollup_ts' and 'from_ts', the rollups would miss some ds readings
+        self.assertFalse(update_ds_rollups(self.ds, self.ds_readings, T0 + 1000, to_ts))
+        self.assertEqual(self.ds.rollup_ts, T0)
+        self.assertFalse(DsReadingRollup.objects.filter(datastream=self.ds).exists())
+
+        self.assertTrue(update_ds_rollups(self.ds, self.ds_readings, T0, to_ts))
+        num_rollups = DsReadingRollup.objects.filter(datastream=self.ds).count()
+        # the ds readings are already included
+        self.assertFalse(update_ds_rollups(self.ds, self.ds_readings, T0, to_ts))
+        self.assertEqual(DsReadingRollup.objects.filter(datastream=self.ds).count(), num_rollups)
+        # the ds readings later than 'to_ts' are ignored
+        rollup = DsReadingRollup.objects.get(datastream=self.ds, tier=3600000, time=to_ts)
+        self.assertEqual(rollup.count, len([r for r in self.ds_readings if T0 < r.time <= to_ts]))
+
+
+class DeleteDfReadingsTest(TestCase):
+
+    def setUp(self):
+        interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        data_type = DataType.objects.create(name="Temp", agg_type=DataAggTypes.AVG, var_type=VariableTypes.CONTINUOUS)
+        app = Application.objects.create(
+            type=AppType.objects.create(name="Temp", func_name="monitoring"),
+            time_resample=TIME_RESAMPLE,
+            cursor_ts=T0,
+            invoc_interval=interval,
+            catch_up_interval=interval,
+        )
+        self.df = Datafeed.objects.create(name="Temp", parent=app, data_type=data_type, last_nat_readings=[[T0, 1.0]])
+        times = [T0 + i * TIME_RESAMPLE for i in range(21, 41)]
+        DfReading.objects.bulk_create(DfReading(time=t, datafeed=self.df, db_value=1.0) for t in times)
+        DfReadingStats.objects.bulk_create(
+            DfReadingStats(time=t, datafeed=self.df, count=1, sum=1.0, min=1.0, max=1.0, last=1.0) for t in times
+        )
+        DfReadingSpan.objects.create(
+            time=T0 + 1 * TIME_RESAMPLE, end_time=T0 + 20 * TIME_RESAMPLE, datafeed=self.df, db_value=1.0
+        )
+        DfReadingSpan.objects.create(
+            time=T0 + 41 * TIME_RESAMPLE, end_time=T0 + 60 * TIME_RESAMPLE, datafeed=self.df, db_value=2.0
+        )
+        DfReadingSpan.objects.create(
+            time=T0 + 61 * TIME_RESAMPLE, end_time=T0 + 80 * TIME_RESAMPLE, datafeed=self.df, db_value=3.0
+        )
+
+    def get_spans(self) -> list[tuple[int, int, float]]:
+        spans = DfReadingSpan.objects.filter(datafeed=self.df).order_by("time")
+        return [(span.time, span.end_time, span.db_value) for span in spans]
+
+    def test_delete_range(self):
+        num_deleted = delete_df_readings(self.df, T0 + 10 * TIME_RESAMPLE, T0 + 45 * TIME_RESAMPLE)
+
+        self.assertEqual(num_deleted, 20)
+        self.assertFalse(DfReading.objects.filter(datafeed=self.df).exists())
+        self.assertFalse(DfReadingStats.objects.filter(datafeed=self.df).exists())
+        # the spans overlapping the range are cut at its ends, the df readings outside the range are kept
+        self.assertEqual(
+            self.get_spans(),
+            [
+                (T0 + TIME_RESAMPLE, T0 + 10 * TIME_RESAMPLE, 1.0),
+                (T0 + 46 * TIME_RESAMPLE, T0 + 60 * TIME_RESAMPLE, 2.0),
+                (T0 + 61 * TIME_RESAMPLE, T0 + 80 * TIME_RESAMPLE, 3.0),
+            ],
+        )
+
+        self.df.refresh_from_db()
+        self.assertIsNone(self.df.last_nat_readings)
+
+    def test_delete_range_within_span(self):
+        num_deleted = delete_df_readings(self.df, T0 + 65 * TIME_RESAMPLE, T0 + 70 * TIME_RESAMPLE)
+
+        self.assertEqual(num_deleted, 0)
+        # the span covering the whole range is split into two
+        self.assertEqual(
+            self.get_spans(),
+            [
+                (T0 + TIME_RESAMPLE, T0 + 20 * TIME_RESAMPLE, 1.0),
+                (T0 + 41 * TIME_RESAMPLE, T0 + 60 * TIME_RESAMPLE, 2.0),
+                (T0 + 61 * TIME_RESAMPLE, T0 + 65 * TIME_RESAMPLE, 3.0),
+                (T0 + 71 * TIME_RESAMPLE, T0 + 80 * TIME_RESAMPLE, 3.0),
+            ],
+        )
+
+
+class DfSharingTest(TestCase):
+
+    def setUp(self):
+        interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        data_type = DataType.objects.create(name="Temp", agg_type=DataAggTypes.AVG, var_type=VariableTypes.CONTINUOUS)
+        ds = Datastream.objects.create(
+            name="Temp", data_type=data_type, parent=Device.objects.create(name="Device", dev_ui="dev-1")
+        )
+        dfs = []
+        for i, cursor_ts in enumerate((T0 + 20 * TIME_RESAMPLE, T0 + 5 * TIME_RESAMPLE)):
+            app = Application.objects.create(
+                type=AppType.objects.create(name=f"Temp {i}", func_name="monitoring"),
+                time_resample=TIME_RESAMPLE,
+                cursor_ts=cursor_ts,
+                invoc_interval=interval,
+                catch_up_interval=interval,
+            )
+            dfs.append(Datafeed.objects.create(name="Temp", parent=app, datastream=ds, data_type=data_type))
+        self.source_df, self.df = dfs
+
+        DfReading.objects.bulk_create(
+            DfReading(time=T0 + i * TIME_RESAMPLE, datafeed=self.source_df, db_value=float(i)) for i in range(1, 31)
+        )
+        self.source_df.ts_to_start_with = T0 + 30 * TIME_RESAMPLE
+        self.source_df.last_reading_ts = T0 + 30 * TIME_RESAMPLE
+        self.source_df.save()
+
+    def test_link(self):
+        self.assertTrue(link_to_source_df(self.df))
+
+        self.df.refresh_from_db()
+        self.assertEqual(self.df.source_df_id, self.source_df.pk)
+        self.assertEqual(self.df.reading_df_id, self.source_df.pk)
+        self.assertEqual(self.df.ts_to_start_with, T0 + 30 * TIME_RESAMPLE)
+        self.assertEqual(self.df.last_reading_ts, T0 + 30 * TIME_RESAMPLE)
+        # the application reads the df readings of the source datafeed
+        df_value_map = get_df_value_map([self.df], T0 + 5 * TIME_RESAMPLE, T0 + 30 * TIME_RESAMPLE)
+        self.assertEqual(list(df_value_map), [T0 + i * TIME_RESAMPLE for i in range(6, 31)])
+        self.assertEqual(df_value_map[T0 + 6 * TIME_RESAMPLE], {"Temp": 6.0})
+        # a datafeed that is linked already or has df readings of its own isn't linked
+        self.assertFalse(link_to_source_df(self.df))
+        self.assertFalse(link_to_source_df(self.source_df))
+
+    def test_unlink(self):
+        link_to_source_df(self.df)
+        unlink_from_source_df(self.df)
+
+        # the datafeed is resampled from the cursor of its application, so no period is skipped
+        self.df.refresh_from_db()
+        self.assertIsNone(self.df.source_df_id)
+        self.assertEqual(self.df.reading_df_id, self.df.pk)
+        self.assertEqual(self.df.ts_to_start_with, T0 + 5 * TIME_RESAMPLE)
+        self.assertIsNone(self.df.last_reading_ts)
+        self.assertEqual(get_df_value_map([self.df], T0 + 5 * TIME_RESAMPLE, T0 + 30 * TIME_RESAMPLE), {})
+
+    def test_source_df_deleted(self):
+        link_to_source_df(self.df)
+        DfReading.objects.filter(datafeed=self.source_df).delete()
+        self.source_df.delete()
+
+        self.df.refresh_from_db()
+        self.assertIsNone(self.df.source_df_id)
+        self.assertEqual(self.df.ts_to_start_with, T0 + 5 * TIME_RESAMPLE)
+        self.assertIsNone(self.df.last_reading_ts)
+
+
+# the ds readings are fetched once and shared only by the datafeeds resampled from them directly
+@override_settings(USE_DS_ROLLUPS_FOR_RESAMPLING=False, RESAMPLE_DS_READINGS_IN_DB=False, DFR_STREAM_CHUNK_SIZE=None)
+class DsResamplerTest(TestCase):
+
+    def setUp(self):
+        interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        data_type = DataType.objects.create(name="Temp", agg_type=DataAggTypes.LAST, var_type=VariableTypes.CONTINUOUS)
+        self.ds = Datastream.objects.create(
+            name="Temp", data_type=data_type, parent=Device.objects.create(name="Device", dev_ui="dev-1")
+        )
+        self.dfs = []
+        for i, time_resample in enumerate((TIME_RESAMPLE, 3600000)):
+            app = Application.objects.create(
+                type=AppType.objects.create(name=f"Temp {i}", func_name="monitoring"),
+                time_resample=time_resample,
+                cursor_ts=T0,
+                invoc_interval=interval,
+                catch_up_interval=interval,
+            )
+            self.dfs.append(Datafeed.objects.create(name="Temp", parent=app, datastream=self.ds, data_type=data_type))
+
+        rnd = random.Random(1)
+        self.ds_readings = DsReading.objects.bulk_create(
+            DsReading(time=T0 + i * 45000 + rnd.randint(0, 1000), db_value=rnd.uniform(-50, 50), datastream=self.ds)
+            for i in range(1, 301)
+        )
+
+    def test_shared_datastream(self):
+        nat_dfs = list(Datafeed.objects.filter(datastream=self.ds).select_related("parent", "data_type"))
+        catching_up_map = DsResampler(self.ds.pk, nat_dfs).execute()
+
+        self.assertEqual(catching_up_map, {df.pk: False for df in self.dfs})
+        last_ts = self.ds_readings[-1].time
+        for df, time_resample in zip(self.dfs, (TIME_RESAMPLE, 3600000)):
+            # the last bin isn't closed, it is created next time
+            df.refresh_from_db()
+            self.assertEqual(df.ts_to_start_with, ceil_timestamp(last_ts, time_resample) - time_resample)
+            expected = resample_ds_readings(self.ds_readings, df, time_resample, DataAggTypes.LAST)
+            expected = [(rts, dfr.db_value) for rts, dfr in expected.items() if rts <= df.ts_to_start_with]
+            df_readings = DfReading.objects.filter(datafeed=df).order_by("time")
+            self.assertEqual([(dfr.time, dfr.db_value) for dfr in df_readings], expected)
+        # the datafeed with the later 'ts_to_start_with' is processed first, the progress doesn't go backwards
+        self.ds.refresh_from_db()
+        self.assertEqual(self.ds.ts_to_start_with, ceil_timestamp(last_ts, TIME_RESAMPLE) - TIME_RESAMPLE)
+
+    @override_settings(RESAMPLE_DS_READINGS_IN_DB=True)
+    def test_db_resampling_delegated(self):
+        nat_dfs = list(Datafeed.objects.filter(datastream=self.ds).select_related("parent", "data_type"))
+        DsResampler(self.ds.pk, nat_dfs).execute()
+        db_resampled = list(
+            DfReading.objects.order_by("datafeed_id", "time").values_list("datafeed_id", "time", "db_value")
+        )
+
+        DfReading.objects.all().delete()
+        DfReadingStats.objects.all().delete()
+        Datafeed.objects.update(ts_to_start_with=0, last_reading_ts=None)
+        Datastream.objects.update(ts_to_start_with=0)
+        with override_settings(RESAMPLE_DS_READINGS_IN_DB=False):
+            nat_dfs = list(Datafeed.objects.filter(datastream=self.ds).select_related("parent", "data_type"))
+            DsResampler(self.ds.pk, nat_dfs).execute()
+        resampled = list(
+            DfReading.objects.order_by("datafeed_id", "time").values_list("datafeed_id", "time", "db_value")
+        )
+
+        self.assertGreater(len(db_resampled), 0)
+        self.assertEqual(db_resampled, resampled)
+
+    def test_cache_capped(self):
+        dsr_cache = DsReadingCache(self.ds.pk)
+        last_ts = self.ds_readings[-1].time
+        dsr_cache.load(T0, last_ts, [TIME_RESAMPLE], max_num=100)
+
+        self.assertEqual(len(dsr_cache.ds_readings), 100)
+        self.assertEqual(dsr_cache.to_ts, self.ds_readings[99].time)
+        self.assertTrue(dsr_cache.covers(T0, self.ds_readings[99].time))
+        self.assertFalse(dsr_cache.covers(T0, last_ts))
+        # the requests beyond the cached interval go to the db
+        self.assertEqual([r.time for r in dsr_cache.get_ds_readings(T0, last_ts)], [r.time for r in self.ds_readings])
+        self.assertIsNone(dsr_cache.get_bins(TIME_RESAMPLE, T0, ceil_timestamp(last_ts, TIME_RESAMPLE)))
+
+
+@override_settings(USE_DS_ROLLUPS_FOR_RESAMPLING=False, RESAMPLE_DS_READINGS_IN_DB=False)
+class DfrStreamingTest(TestCase):
+    # the backlog is longer than a chunk, the streamed df readings should be the same as the ones of a single batch
+
+    def setUp(self):
+        self.interval = IntervalSchedule.objects.create(every=1, period="minutes")
+        self.device = Device.objects.create(name="Device", dev_ui="dev-1")
+        self.rnd = random.Random(1)
+
+    def create_df(self, name: str, agg_type: DataAggTypes, is_totalizer: bool = False) -> Datafeed:
+        data_type = DataType.objects.create(
+            name=name, agg_type=agg_type, var_type=VariableTypes.CONTINUOUS, is_totalizer=is_totalizer
+        )
+        ds = Datastream.objects.create(
+            name=name, data_type=data_type, parent=self.device, time_change=10 * TIME_RESAMPLE
+        )
+        app = Application.objects.create(
+            type=AppType.objects.create(name=name, func_name="monitoring"),
+            time_resample=TIME_RESAMPLE,
+            cursor_ts=T0,
+            invoc_interval=self.interval,
+            catch_up_interval=self.interval,
+        )
+        df = Datafeed.objects.create(name=name, parent=app, datastream=ds, data_type=data_type)
+
+        ts = T0
+        value = 0
+        ds_readings = []
+        for i in range(400):
+            if self.rnd.random() < 0.1:
+                # the gaps shorter than 'time_change' are restored, the longer ones are not
+                ts += self.rnd.choice((self.rnd.randint(2, 5), self.rnd.randint(12, 20))) * TIME_RESAMPLE
+            ts += self.rnd.randint(20000, 70000)
+            value = value + self.rnd.uniform(0, 10) if is_totalizer else self.rnd.uniform(-50, 50)
+            ds_readings.append(DsReading(time=ts, db_value=value, datastream=ds))
+        DsReading.objects.bulk_create(ds_readings)
+        return df
+
+    def get_df_readings(self, df: Datafeed) -> list[tuple]:
+        df_readings = DfReading.objects.filter(datafeed=df).order_by("time")
+        return [(dfr.time, dfr.db_value, dfr.restored) for dfr in df_readings]
+
+    def resample(self, df: Datafeed, chunk_size: int | None) -> tuple[list[tuple], int]:
+        DfReading.objects.filter(datafeed=df).delete()
+        DfReadingStats.objects.filter(datafeed=df).delete()
+        Datafeed.objects.filter(pk=df.pk).update(ts_to_start_with=0, last_reading_ts=None, last_nat_readings=None)
+        with override_settings(DFR_STREAM_CHUNK_SIZE=chunk_size):
+            df = Datafeed.objects.select_related("parent", "data_type").get(pk=df.pk)
+            creator = DfrCreator(df.parent, df)
+            creator.execute()
+            self.assertEqual(creator.use_streaming, chunk_size is not None)
+        df.refresh_from_db()
+        return self.get_df_readings(df), df.ts_to_start_with
+
+    def test_same_as_single_batch(self):
+        for name, agg_type, is_totalizer in (
+            ("Temp", DataAggTypes.AVG, False),
+            ("Energy", DataAggTypes.SUM, True),
+            ("Level", DataAggTypes.LAST, False),
+        ):
+            with self.subTest(name=name):
+                df = self.create_df(name, agg_type, is_totalizer)
+                df_readings, ts_to_start_with = self.resample(df, None)
+                self.assertGreater(len(df_readings), 100)
+                self.assertTrue(any(dfr[2] for dfr in df_readings) or agg_type == DataAggTypes.LAST)
+                self.assertEqual(self.resample(df, 20), (df_readings, ts_to_start_with))
+
+
+class RestoreTotalizerTest(TestCase):
+
+    def setUp(self):
+        data_type = DataType(
+            name="Energy", agg_type=DataAggTypes.SUM, var_type=VariableTypes.DISCRETE, is_totalizer=True
+        )
+        self.df = Datafeed(pk=1, name="Energy", data_type=data_type)
+
+    def restore(self, points: list[tuple[int, float]], time_change: int = 10 * TIME_RESAMPLE):
+        df_reading_map = {
+            T0 + i * TIME_RESAMPLE: DfReading(time=T0 + i * TIME_RESAMPLE, db_value=value, datafeed=self.df)
+            for i, value in points
+        }
+        return restore_totalizer(df_reading_map, self.df, TIME_RESAMPLE, time_change, T0, None)
+
+    def test_gaps_filled(self):
+        df_reading_map, fill_rtss, fill_values = self.restore([(1, 100), (5, 111), (6, 112), (20, 130), (21, 131)])
+
+        # the gap longer than 'time_change' is not filled, the values are rounded for the integer datafeed
+        self.assertEqual(fill_rtss.tolist(), [T0 + i * TIME_RESAMPLE for i in (2, 3, 4)])
+        self.assertEqual(fill_values.tolist(), [103.0, 106.0, 108.0])
+        self.assertEqual(sorted(df_reading_map), [T0 + i * TIME_RESAMPLE for i in (1, 5, 6, 20, 21)])
+        self.assertEqual(df_reading_map[T0 + 21 * TIME_RESAMPLE].not_to_use, NotToUseDfrTypes.UNCLOSED)
+
+    def test_reset_across_gap(self):
+        with self.assertLogs("#dfr_utils", level="WARNING") as logs:
+            _, fill_rtss, fill_values = self.restore([(1, 100), (2, 104), (5, 3), (8, 9), (9, 10), (10, 2), (11, 3)])
+
+        # the gap with the reset is not filled, the next one is
+        self.assertEqual(fill_rtss.tolist(), [T0 + i * TIME_RESAMPLE for i in (6, 7)])
+        self.assertEqual(fill_values.tolist(), [5.0, 7.0])
+        # the reset in the neighbouring bins is detected too
+        self.assertIn(str([T0 + 5 * TIME_RESAMPLE, T0 + 10 * TIME_RESAMPLE]), logs.output[0])
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.datastreams.models import Datastream
+from apps.dsreadings.models import DsReading, DsReadingRollup
+from utils.rollup_utils import update_ds_rollups
+
+
+class Command(BaseCommand):
+    """Django command that rebuilds the rollups of the datastreams from their ds readings"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ds", type=int, nargs="*", help="pks of the datastreams, all by default")
+        parser.add_argument("--chunk-size", type=int, default=10000, help="number of ds readings per query")
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        ds_pks = options["ds"]
+        if not ds_pks:
+            ds_pks = list(Datastream.objects.order_by("pk").values_list("pk", flat=True))
+
+        for ds_pk in ds_pks:
+            num_ds_readings = self.rebuild_ds_rollups(ds_pk, options["chunk_size"])
+            self.stdout.write(f"Datastream {ds_pk}: {num_ds_readings} ds readings were rolled up")
+
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt!"))
+
+    @transaction.atomic
+    def rebuild_ds_rollups(self, ds_pk: int, chunk_size: int) -> int:
+        # the datastream is locked, so no new ds readings can be added in the meantime
+        ds = Datastream.objects.select_for_update().get(pk=ds_pk)
+        DsReadingRollup.objects.filter(datastream__id=ds.pk).delete()
+        ds.rollup_ts = 0
+        ds.update_fields.add("rollup_ts")
+
+        num_ds_readings = 0
+        while ds.rollup_ts < ds.ts_to_start_with:
+            ds_readings = list(
+                DsReading.objects.filter(
+                    datastream__id=ds.pk, time__gt=ds.rollup_ts, time__lte=ds.ts_to_start_with
+                ).order_by("time")[:chunk_size]
+            )
+            # if the chunk is full, there can be more ds readings after the last one
+            to_ts = ds_readings[-1].time if len(ds_readings) == chunk_size else ds.ts_to_start_with
+            update_ds_rollups(ds, ds_readings, ds.rollup_ts, to_ts)
+            num_ds_readings += len(ds_readings)
+
+        ds.save(update_fields=ds.update_fields)
+        return num_ds_readings
@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-19 05:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.conf import settings
+
+
+additional_operations = []
+if settings.DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    additional_operations = [
+        migrations.RunSQL(
+            """
+            SELECT create_hypertable('ds_reading_rollups', by_range('time', 2592000000));
+            """,
+            reverse_sql="""
+                DROP TABLE ds_reading_rollups;
+            """,
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datastreams', '0002_datastream_rollup_ts'),
+        ('dsreadings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DsReadingRollup',
+            fields=[
+                ('pk', models.CompositePrimaryKey('datastream_id', 'tier', 'time', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('tier', models.BigIntegerField()),
+                ('time', models.BigIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('sum', models.FloatField(default=0.0)),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+                ('last', models.FloatField()),
+                ('datastream', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='datastreams.datastream')),
+            ],
+            options={
+                'db_table': 'ds_reading_rollups',
+            },
+        ),
+        *additional_operations,
+    ]
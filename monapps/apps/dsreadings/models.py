@@ -1,4 +1,7 @@
+from django.db import models
+
 from common.abstract_classes import AnyDsReading, AnyNoDataMarker
+from utils.ts_utils import create_dt_from_ts_ms
 
 
 class DsReading(AnyDsReading):
@@ -46,3 +49,27 @@ class UnusedNoDataMarker(AnyNoDataMarker):
         db_table = "unused_nd_markers"
 
     short_name = "Unus NDM"
+
+
+class DsReadingRollup(models.Model):
+    """
+    Aggregates of the ds readings of a datastream within bins of a certain duration ('tier').
+    Like df readings, the bins are closed on the right, i.e. 'time' is the end of the bin.
+    """
+
+    class Meta:
+        db_table = "ds_reading_rollups"
+
+    pk = models.CompositePrimaryKey("datastream_id", "tier", "time")
+    datastream = models.ForeignKey("datastreams.Datastream", on_delete=models.PROTECT)
+    tier = models.BigIntegerField()
+    time = models.BigIntegerField()
+    count = models.IntegerField(default=0)
+    sum = models.FloatField(default=0.0)
+    min = models.FloatField()
+    max = models.FloatField()
+    last = models.FloatField()
+
+    def __str__(self):
+        dt_str = create_dt_from_ts_ms(self.time).strftime("%Y/%m/%d %H:%M:%S")
+        return f"Rollup ds:{self.datastream_id} tier:{self.tier} ts:{dt_str} cnt: {self.count}"
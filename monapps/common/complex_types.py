@@ -1,6 +1,7 @@
-from typing import TypedDict, Literal, Any, Callable
+from typing import TypedDict, Literal, Any, Callable, NotRequired
+import numpy as np
 from apps.applications.models import Application
-from apps.dfreadings.models import DfReading
+from apps.dfreadings.models import DfReading, DfReadingStats
 from apps.datafeeds.models import Datafeed
 from common.constants import HealthGrades
 
@@ -8,6 +9,7 @@ from common.constants import HealthGrades
 type DfReadingMap = dict[int, dict[int, DfReading]]
 type DfValueMap = dict[int, dict[str, int | float]]
 type IndDfReadingMap = dict[int, DfReading]
+type DfStatsMap = dict[int, dict[str, DfReadingStats]]
 
 type AlarmPayloadDictForTs = dict[str, Any]  # {"CPU Error": {"st": "in"}} or {"CPU Error": {}}
 type ReevalFields = Literal["status", "curr_state", "health"]
@@ -31,14 +33,34 @@ class UpdateMap(TypedDict, total=False):
     health: HealthGrades
     alarm_payload: dict
     state: dict
+    state_size: int  # set by 'AppFuncExecutor' when the state is serialized
+
+
+class DfFrame(TypedDict):
+    grid: np.ndarray  # int64 timestamps of the grid
+    columns: dict[str, np.ndarray]  # {df name: float64 values aligned with 'grid'}, NaN - no df reading
 
 
 class DerivedDfReadingRow(TypedDict):
     df: Datafeed
-    new_df_readings: list[DfReading]
+    # either df reading instances or arrays - the timestamps and the values for them (NaN - no df reading)
+    new_df_readings: NotRequired[list[DfReading]]
+    grid: NotRequired[np.ndarray]
+    values: NotRequired[np.ndarray]
 
 
 type DerivedDfReadingMap = dict[str, DerivedDfReadingRow]
 type AppFuncReturn = tuple[DerivedDfReadingMap, UpdateMap]
 
 type AppFunction = Callable[[Application, dict[str, Datafeed], dict[str, Datafeed]], AppFuncReturn]
+type AppFleetFunction = Callable[
+    [list[Application], list[dict[str, Datafeed]], list[dict[str, Datafeed]]], list[AppFuncReturn]
+]
+
+
+class RecomputedPartition(TypedDict):
+    start_rts: int
+    end_rts: int
+    df_values: dict[str, tuple[np.ndarray, np.ndarray]]  # {derived df name: (timestamps, values)}, no NaN values
+    state: dict  # the state at 'end_rts'
+    num_ticks: int  # including the warm-up ones
@@ -1,8 +1,82 @@
 # Monitoring Application settings
+# the alternative resampling and execution paths below are off by default (the original behavior),
+# they can be turned on one by one
 NUM_MAX_DFREADINGS_TO_PROCESS = 50000
 NUM_MAX_DSREADINGS_TO_PROCESS = 100000
 MIN_TIME_RESOL_MS = 1000
 MIN_TIME_APP_FUNC_INVOC_MS = 60000
+# max number of native datafeeds of one application that are resampled concurrently, 1 - sequential processing
+MAX_DFR_CREATOR_WORKERS = 1
+# if True, all the datafeeds (of all enabled applications) that use the same datastream are resampled together,
+# so the ds readings are fetched from the db only once for those of them that don't use the rollups,
+# the db resampling or the streaming
+RESAMPLE_DS_DEPENDENTS_TOGETHER = False
+# if True, a new native datafeed uses the df readings of a datafeed of another application
+# with the same datastream and resampling settings instead of creating the same df readings again
+SHARE_RESAMPLED_DATAFEEDS = False
+# durations of the bins (1 min, 1 hour, 1 day) the ds readings are aggregated into (see 'DsReadingRollup')
+DS_ROLLUP_TIERS_MS = [60000, 3600000, 86400000]
+# if True, df readings for non-augmented datafeeds are created from rollups when 'time_resample' allows it,
+# the rollups are maintained anyway, so the setting can be turned on at any time
+USE_DS_ROLLUPS_FOR_RESAMPLING = False
+# if True, df readings for non-augmented datafeeds without restoration are created from the bins
+# aggregated by the db, so only one row per bin is fetched instead of all the ds readings
+RESAMPLE_DS_READINGS_IN_DB = False
+# if True, the count/sum/min/max/last of the ds readings of every bin are stored with the native df readings
+# of non-augmented datafeeds (see 'DfReadingStats')
+STORE_DF_READING_STATS = True
+# non-augmented datafeeds are resampled in chunks of this number of df readings (ds readings are read
+# with a server-side cursor), it bounds the memory needed for long backlogs, None - the whole batch at once
+DFR_STREAM_CHUNK_SIZE = None
+# runs of at least this number of equal restored df readings of augmented datafeeds are stored
+# as a single 'DfReadingSpan', None - always store separate df readings
+DF_READING_SPAN_MIN_LEN = 30
+# number of the last native df readings kept in a datafeed as the restoration context, should be >= 3
+NUM_LAST_NAT_DFRS_TO_KEEP = 3
+# the largest JSON-encoded application state (in bytes) that can be saved, if an app function returns a larger one,
+# an empty state is saved instead (its results are saved and the cursor moves on), the application gets
+# the error "App state is too large" and the ERROR health, None - no limit
+MAX_APP_STATE_SIZE = 1_000_000
+# if True, the application states are stored in a separate table ('AppState') in a compressed form
+# and written only when they change, otherwise in 'Application.state'
+STORE_APP_STATE_IN_SIDE_TABLE = False
+# if True, the applications whose app function has a 'fleet_function' are executed in fleets - when the task
+# of an application is run, all the enabled applications of the same type, version, 'time_resample' and task interval
+# that haven't been executed within the current interval are executed together
+EXECUTE_APPS_AS_FLEETS = False
+MAX_APPS_IN_FLEET = 200
+# if True, the applications are executed by the 'evaluate.due_apps' task, which claims the applications
+# due for execution ('next_eval_ts') in batches, the periodic tasks of the applications only keep their intervals
+# then and can be disabled, otherwise every application is executed by its own periodic task.
+# An enabled periodic task 'evaluate.due_apps' is required ("Execute due apps" in 'fixtures.json', every 10 seconds),
+# without it the applications are still executed by their own tasks
+EXECUTE_DUE_APPS_IN_BATCHES = False
+MAX_APPS_TO_EXEC = 100
+# if True, an application executed by its own task that is catching up is executed by 'CatchUpExecutor' -
+# window after window within one run of the task, the cursor and the state are saved every
+# CATCH_UP_CHECKPOINT_INTERVAL_MS, the run ends after CATCH_UP_MAX_RUN_TIME_MS and the next run of the task continues
+USE_CATCH_UP_EXECUTOR = False
+CATCH_UP_CHECKPOINT_INTERVAL_MS = 30000
+CATCH_UP_MAX_RUN_TIME_MS = 600000
+# if True (works with EXECUTE_DUE_APPS_IN_BATCHES), an application is made due for execution when new ds readings
+# of its native datafeeds are saved - APP_TRIGGER_DELAY_MS later, so the readings of its other datastreams that come
+# in the meantime are processed in the same execution, and 'evaluate.due_apps' is enqueued for that moment.
+# The intervals of the tasks become a safety net then - an application without new data is claimed by the periodic
+# 'evaluate.due_apps' task every APP_SAFETY_NET_INTERVAL_MS or its task interval, whichever is longer
+# (but not while catching up), so its staleness and health are still updated
+TRIGGER_APPS_ON_NEW_DATA = False
+APP_TRIGGER_DELAY_MS = 5000
+APP_SAFETY_NET_INTERVAL_MS = 900000
+# if True, the time and the number of rows of every phase of an application execution are measured, the last
+# APP_PROFILE_NUM_SAMPLES values of every phase are kept in 'Application.exec_profile' (one more query per execution)
+PROFILE_APP_EXECUTION = False
+APP_PROFILE_NUM_SAMPLES = 100
+# the app functions are imported on first use, these ones are imported when a celery worker starts,
+# "<func_name>" (all the versions), "<func_name>/<func_version>" or "*" (all the app functions)
+PRELOAD_APP_FUNCTIONS = []
+# other packages add app functions with entry points of this group named "<func_name>/<func_version>"
+# and pointing to the app function dict ("<module>:<attribute>")
+APP_FUNCTION_ENTRY_POINT_GROUP = "monapps.app_functions"
 
 # DS health monitoring settings
 MAX_DS_TO_HEALTH_PROC = 100
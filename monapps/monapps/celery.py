@@ -1,7 +1,22 @@
 import os
 from celery import Celery
+from celery.signals import worker_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "monapps.settings")
 app = Celery("monapps")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+@worker_init.connect
+def preload_app_funcs_on_worker_init(**kwargs):
+    # imported before the pool processes are forked, so they share the modules
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    from django.conf import settings
+    from utils.app_func_map_utils import preload_app_funcs
+
+    preload_app_funcs(settings.PRELOAD_APP_FUNCTIONS)
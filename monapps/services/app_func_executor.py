@@ -1,24 +1,35 @@
 import logging
 import traceback
 from collections.abc import Iterable
-from typing import Literal
-from django.db import transaction, IntegrityError
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from typing import Literal, Callable
+from django.conf import settings
+from django.db import transaction, connection, connections, IntegrityError
 from django_celery_beat.models import PeriodicTask
 
-from apps.applications.models import Application
+from apps.applications.models import Application, AppState
+from apps.datafeeds.models import Datafeed
 from apps.dfreadings.models import DfReading
 from services.dfr_creator import DfrCreator
+from services.ds_resampler import DsResampler
+from utils.dfr_utils import bulk_insert_df_values
+from utils.df_sharing_utils import get_resampling_key, link_to_source_df, unlink_from_source_df
 from common.constants import HealthGrades, STATUS_FIELD_NAME, CURR_STATE_FIELD_NAME, reeval_fields
-from common.complex_types import AppFunction
-from utils.ts_utils import create_now_ts_ms
+from common.complex_types import AppFunction, DerivedDfReadingMap, UpdateMap
+from utils.ts_utils import create_now_ts_ms, get_interval_ms
 from utils.sequnce_utils import find_instance_with_max_attr
 from utils.alarm_utils import update_alarm_map
 from utils.update_utils import enqueue_update, update_reeval_fields, set_attr_if_cond
+from utils.app_state_utils import serialize_app_state, get_app_state_size, encode_app_state, decode_app_state
+from utils.exec_profile_utils import ExecProfiler
 from services.alarm_log import add_to_alarm_log
 from services.app_log import add_to_app_log
 
 logger = logging.getLogger("#app_func_executor")
 
+STATE_TOO_LARGE_ALARM_NAME = "App state is too large"
+
 
 class AppFuncExecutor:
     def __init__(self, app: Application, app_func: AppFunction, task: PeriodicTask):
@@ -29,111 +40,236 @@ class AppFuncExecutor:
         self.excep_health = HealthGrades.UNDEFINED
         self.health_from_app = HealthGrades.UNDEFINED
         self.cs_health = HealthGrades.UNDEFINED  # health based on the cursor timestamp
+        self.state_record = None
+        self.native_dfs: list[Datafeed] | None = None  # can be prefetched for several applications at once
+        self.profiler = ExecProfiler(settings.PROFILE_APP_EXECUTION)
 
     def execute(self):
+        if self.prepare():
+            self.evaluate()
+
+    def prepare(self) -> bool:
         # At first, all df readings are to be prepared
         # If there are too many df readings, the function 'prepare_df_readings'
         # will prepare them in batches
         if self.app.is_enabled:
-            is_at_least_one_df_catching_up = self.create_df_readings()
+            with self.profiler.phase("resampling"):
+                is_at_least_one_df_catching_up = self.create_df_readings()
             if is_at_least_one_df_catching_up:
                 self.update_map["is_catching_up"] = True
                 self.update_catching_up()
+                self.schedule_next_eval()
                 self.app.save(update_fields=self.app.update_fields)
+                self.save_exec_profile()
                 logger.debug("App is catching up with df readings")
                 logger.debug("---END---")
-                return
+                return False
         # when all df readings are prepared it is possible to execute the app function
-        self.evaluate()
+        return True
 
     def create_df_readings(self):
-        is_at_least_one_df_catching_up = False
-        native_df_qs = self.app.get_native_df_qs()
-
-        for nat_df in native_df_qs:
-            try:
-                logger.debug(f"Create readings for df {nat_df.pk} {nat_df.name}")
-                creator = DfrCreator(self.app, nat_df)
-                creator.execute()
-                if creator.check_catching_up():
-                    is_at_least_one_df_catching_up = True
-            except Exception:
-                logger.error(f"Error while creating dfrs for {nat_df.pk} {nat_df.name}, {traceback.format_exc(-1)}")
-
-        return is_at_least_one_df_catching_up
+        native_dfs = self.native_dfs
+        if native_dfs is None:
+            native_dfs = list(self.app.get_native_df_qs().select_related("source_df__parent", "source_df__data_type"))
+        dfs_to_resample = self.get_dfs_to_resample(native_dfs)
+        jobs = self.create_resampling_jobs(dfs_to_resample)
+        self.profiler.add_rows("resampling", sum(len(nat_dfs) for _, nat_dfs in jobs))
+
+        # jobs are independent from each other (each one is processed in its own transaction),
+        # so they can be executed concurrently, SQLite doesn't support concurrent writes though
+        num_workers = min(settings.MAX_DFR_CREATOR_WORKERS, len(jobs))
+        if num_workers <= 1 or connection.vendor == "sqlite":
+            catching_up_maps = [self.run_resampling_job(job) for job in jobs]
+        else:
+            with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="dfr_creator") as pool:
+                catching_up_maps = list(pool.map(self.run_resampling_job_in_thread, jobs))
+
+        catching_up_map = {}
+        for m in catching_up_maps:
+            catching_up_map.update(m)
+        # datafeeds of other applications may be processed too, but only the own ones are taken into account
+        return any(catching_up_map.get(df.pk, False) for df in dfs_to_resample)
+
+    def get_dfs_to_resample(self, native_dfs: list[Datafeed]) -> list[Datafeed]:
+        # the datafeeds that use the df readings of another application's datafeed ('source_df')
+        # are not resampled, the source datafeed is resampled instead
+        dfs_to_resample = {}
+        for nat_df in native_dfs:
+            nat_df.parent = self.app
+            if settings.SHARE_RESAMPLED_DATAFEEDS and nat_df.source_df_id is None:
+                link_to_source_df(nat_df)
+            if nat_df.source_df_id is not None and get_resampling_key(nat_df) != get_resampling_key(nat_df.source_df):
+                # the settings of one of the datafeeds were changed
+                unlink_from_source_df(nat_df)
+
+            df = nat_df.source_df if nat_df.source_df_id is not None else nat_df
+            dfs_to_resample[df.pk] = df
+        return list(dfs_to_resample.values())
+
+    def create_resampling_jobs(self, dfs: list[Datafeed]) -> list[tuple[int, list[Datafeed]]]:
+        # a job is a datastream pk and the datafeeds to be resampled from this datastream
+        if not settings.RESAMPLE_DS_DEPENDENTS_TOGETHER:
+            return [(df.datastream_id, [df]) for df in dfs]
+
+        df_map = {}
+        for df in dfs:
+            df_map.setdefault(df.datastream_id, []).append(df)
+
+        # datafeeds of other enabled applications that use the same datastreams
+        other_df_qs = (
+            Datafeed.objects.filter(
+                datastream_id__in=df_map.keys(), parent__is_enabled=True, source_df__isnull=True
+            )
+            .exclude(pk__in=[df.pk for df in dfs])
+            .select_related("parent", "data_type")
+        )
+        for df in other_df_qs:
+            df_map[df.datastream_id].append(df)
+
+        return list(df_map.items())
+
+    def run_resampling_job(self, job: tuple[int, list[Datafeed]]) -> dict[int, bool]:
+        ds_pk, nat_dfs = job
+        if len(nat_dfs) == 1:
+            nat_df = nat_dfs[0]
+            return {nat_df.pk: self.create_df_readings_for_df(nat_df)}
+        try:
+            logger.debug(f"Create readings for {len(nat_dfs)} dfs of ds {ds_pk}")
+            return DsResampler(ds_pk, nat_dfs).execute()
+        except Exception:
+            logger.error(f"Error while creating dfrs for ds {ds_pk}, {traceback.format_exc(-1)}")
+            return {}
+
+    def run_resampling_job_in_thread(self, job: tuple[int, list[Datafeed]]) -> dict[int, bool]:
+        try:
+            return self.run_resampling_job(job)
+        finally:
+            # Django opens a separate db connection for every thread, it should be closed
+            # when the thread finishes its job, otherwise the connection will leak
+            connections.close_all()
+
+    def create_df_readings_for_df(self, nat_df: Datafeed) -> bool:
+        try:
+            logger.debug(f"Create readings for df {nat_df.pk} {nat_df.name}")
+            creator = DfrCreator(nat_df.parent, nat_df)
+            creator.execute()
+            return creator.check_catching_up()
+        except Exception:
+            logger.error(f"Error while creating dfrs for {nat_df.pk} {nat_df.name}, {traceback.format_exc(-1)}")
+            return False
 
     @transaction.atomic
     def evaluate(self):
-        self.app = Application.objects.select_for_update().get(pk=self.app.pk)
-        self.task = PeriodicTask.objects.select_for_update().get(pk=self.task.pk)
+        with self.profiler.phase("lock"):
+            self.app = Application.objects.select_for_update().get(pk=self.app.pk)
+            self.task = PeriodicTask.objects.select_for_update().get(pk=self.task.pk)
+            self.load_state()
         if self.app.is_enabled:
-            try:
-                logger.debug("Starting app function")
-                self.run_exec_routine()
-                logger.debug("App function was executed")
-            except IntegrityError:
-                logger.error("An attempt to rewrite existing df readings detected")
-                self.excep_health = HealthGrades.ERROR
-            except Exception:
-                self.excep_health = HealthGrades.ERROR
-                logger.error(f"Error happened while executing app function, {traceback.format_exc(-1)}")
+            self.run_safely(self.run_exec_routine)
 
         logger.debug("Update other parameters")
         self.run_post_exec_routine()
         logger.debug("---END---")
 
+    def run_safely(self, routine: Callable, *args):
+        # the results are saved in a savepoint, so an error doesn't leave a part of them in the db
+        # and the rest of the transaction (health, other applications of a fleet) can go on
+        try:
+            logger.debug("Starting app function")
+            with transaction.atomic():
+                routine(*args)
+            logger.debug("App function was executed")
+        except IntegrityError:
+            logger.error("An attempt to rewrite existing df readings detected")
+            self.excep_health = HealthGrades.ERROR
+        except Exception:
+            self.excep_health = HealthGrades.ERROR
+            logger.error(f"Error happened while executing app function, {traceback.format_exc(-1)}")
+
     def run_exec_routine(self):
         native_df_qs = self.app.get_native_df_qs().select_for_update()
         native_df_map = {df.name: df for df in native_df_qs}
         derived_df_qs = self.app.get_derived_df_qs().select_for_update()
         derived_df_map = {df.name: df for df in derived_df_qs}
 
-        derived_df_readings, self.update_map = self.app_func(self.app, native_df_map, derived_df_map)
+        self.run_app_func(native_df_map, derived_df_map)
+
+    def run_app_func(self, native_df_map: dict[str, Datafeed], derived_df_map: dict[str, Datafeed]):
+        with self.profiler.phase("app_func"):
+            results = self.app_func(self.app, native_df_map, derived_df_map)
+        self.save_results(*results)
+
+    def save_results(self, derived_df_readings: DerivedDfReadingMap, update_map: UpdateMap):
+        self.update_map = update_map
+        # the state is checked before anything is saved, as an alarm is added if it is too large
+        with self.profiler.phase("state"):
+            self.prepare_state()
 
         self.update_catching_up()
 
-        for df_row in derived_df_readings.values():
-            df = df_row["df"]
-            new_df_readings = df_row["new_df_readings"]
-            latest_dfr = self.save_new_df_readings(new_df_readings)
-            if latest_dfr is not None:
-                self.update_datafeed(df, latest_dfr)
-                if df.name == STATUS_FIELD_NAME:
-                    self.assign_new_cs_st_value(latest_dfr, "status")
-                if df.name == CURR_STATE_FIELD_NAME:
-                    self.assign_new_cs_st_value(latest_dfr, "curr_state")
+        with self.profiler.phase("df_readings"):
+            for df_row in derived_df_readings.values():
+                df = df_row["df"]
+                if "values" in df_row:
+                    latest = self.save_new_df_values(df, df_row["grid"], df_row["values"])
+                else:
+                    latest_dfr = self.save_new_df_readings(df_row["new_df_readings"])
+                    latest = (latest_dfr.time, latest_dfr.value) if latest_dfr is not None else None
+                if latest is not None:
+                    last_rts, last_value = latest
+                    self.update_datafeed(df, last_rts)
+                    if df.name == STATUS_FIELD_NAME:
+                        self.assign_new_cs_st_value(last_rts, last_value, "status")
+                    if df.name == CURR_STATE_FIELD_NAME:
+                        self.assign_new_cs_st_value(last_rts, last_value, "curr_state")
 
         self.update_cursor_pos()
-        self.update_alarms()
-        self.update_state()
+        with self.profiler.phase("alarms"):
+            self.update_alarms()
+        with self.profiler.phase("state"):
+            self.update_state()
 
     def save_new_df_readings(self, new_df_readings):
         latest_dfr = find_instance_with_max_attr(new_df_readings)
         if latest_dfr is not None:  # the same as 'if len(new_df_readings) > 0'
             DfReading.objects.bulk_create(new_df_readings)
+            self.profiler.add_rows("df_readings", len(new_df_readings))
             logger.debug("New df readings were saved")
         return latest_dfr
 
-    def update_datafeed(self, df, latest_dfr):
-        max_rts = latest_dfr.time
+    def save_new_df_values(self, df: Datafeed, grid: np.ndarray, values: np.ndarray) -> tuple[int, float | int] | None:
+        # the same as 'save_new_df_readings' for the results returned as arrays, returns the latest (rts, value)
+        is_set = ~np.isnan(values)
+        rtss = grid[is_set]
+        db_values = np.round(values[is_set]) if df.is_value_interger else values[is_set]
+        if len(rtss) == 0:
+            return None
+        bulk_insert_df_values(df.pk, rtss, db_values)
+        self.profiler.add_rows("df_readings", len(rtss))
+        logger.debug("New df readings were saved")
+        latest_idx = int(np.argmax(rtss))
+        latest_value = db_values[latest_idx].item()
+        return rtss[latest_idx].item(), int(latest_value) if df.is_value_interger else latest_value
+
+    def update_datafeed(self, df, max_rts):
         if set_attr_if_cond(max_rts, ">", df, "last_reading_ts"):
             df.save(update_fields=df.update_fields)
             # logger.debug(f"Datafeed '{df.name}' was updated")
 
-    def assign_new_cs_st_value(self, latest_dfr, name: Literal["status", "curr_state"]):
+    def assign_new_cs_st_value(self, last_rts: int, last_value: float | int, name: Literal["status", "curr_state"]):
 
         # when catching up, do not update status or curr_state, leave them frozen
         # it will help to avoid hitting parent assets too often
         if self.app.is_catching_up:
             return
 
-        if not set_attr_if_cond(latest_dfr.time, ">", self.app, f"last_{name}_update_ts"):
+        if not set_attr_if_cond(last_rts, ">", self.app, f"last_{name}_update_ts"):
             return
-        if not set_attr_if_cond(latest_dfr.value, "!=", self.app, name):
+        if not set_attr_if_cond(last_value, "!=", self.app, name):
             return
         full_name = CURR_STATE_FIELD_NAME if name == "curr_state" else STATUS_FIELD_NAME
         add_to_alarm_log("INFO", f"{full_name} changed", instance=self.app)
-        logger.debug(f"{full_name} changed -> : {latest_dfr.value}")
+        logger.debug(f"{full_name} changed -> : {last_value}")
 
     def update_catching_up(self):
         if (is_catching_up := self.update_map.get("is_catching_up")) is None:
@@ -163,6 +299,7 @@ class AppFuncExecutor:
     def update_alarms(self):
         if (alarm_payload := self.update_map.get("alarm_payload")) is None:
             return
+        self.profiler.add_rows("alarms", len(alarm_payload))
         for ts, row in alarm_payload.items():
             error_dict = row.get("e")
             upd_error_map, _ = update_alarm_map(self.app, error_dict, ts, "errors", add_to_log=add_to_app_log)
@@ -177,18 +314,106 @@ class AppFuncExecutor:
                 for info_str in app_infos_for_ts:
                     add_to_app_log("INFO", info_str, ts=ts, instance=self.app)
 
+    def prepare_state(self):
+        if (state := self.update_map.get("state")) is None:
+            return
+        state = serialize_app_state(state)
+        state_size = get_app_state_size(state)
+        logger.debug(f"App state size: {state_size} bytes")
+        if settings.MAX_APP_STATE_SIZE is not None and state_size > settings.MAX_APP_STATE_SIZE:
+            # the results are saved and the cursor moves on anyway, otherwise every next execution would compute
+            # the same window and exceed the limit again, the app function starts from an empty state instead
+            logger.error(
+                f"App state size {state_size} exceeds the limit of {settings.MAX_APP_STATE_SIZE} bytes, "
+                "the state is reset"
+            )
+            self.add_state_too_large_alarm()
+            self.excep_health = HealthGrades.ERROR
+            state = {}
+            state_size = get_app_state_size(state)
+        self.update_map["state"] = state
+        self.update_map["state_size"] = state_size
+
+    def add_state_too_large_alarm(self):
+        ts = self.update_map.get("cursor_ts") or self.app.cursor_ts
+        if self.update_map.get("alarm_payload") is None:
+            self.update_map["alarm_payload"] = {}
+        self.update_map["alarm_payload"].setdefault(ts, {}).setdefault("e", {})[STATE_TOO_LARGE_ALARM_NAME] = {}
+
+    def load_state(self):
+        # the state record is read after the application row is locked, and it is written
+        # in the same transaction as the cursor, so they can't get out of sync
+        self.set_state_record(AppState.objects.filter(application_id=self.app.pk).first())
+
+    def set_state_record(self, state_record: AppState | None):
+        self.state_record = state_record
+        if self.state_record is not None:
+            self.app.state = decode_app_state(self.state_record.data)
+
     def update_state(self):
         if (state := self.update_map.get("state")) is None:
             return
+        set_attr_if_cond(self.update_map["state_size"], "!=", self.app, "state_size")
+        if settings.STORE_APP_STATE_IN_SIDE_TABLE:
+            self.save_state_record(state)
+            return
+
+        if self.state_record is not None:
+            # the state is moved back to the application row
+            self.state_record.delete()
+            self.state_record = None
+            self.app.state = state
+            self.app.update_fields.add("state")
+            return
         set_attr_if_cond(state, "!=", self.app, "state")
 
+    def save_state_record(self, state: dict):
+        if self.state_record is None:
+            # the state is still in the application row (or there is no state yet), it is moved to the side table
+            self.state_record = AppState.objects.create(application=self.app, version=1, data=encode_app_state(state))
+            Application.objects.filter(pk=self.app.pk).exclude(state={}).update(state={})
+            self.app.state = state
+            logger.debug("App state was moved to the side table")
+            return
+
+        if state == self.app.state:
+            return
+        self.state_record.version += 1
+        self.state_record.data = encode_app_state(state)
+        self.state_record.save()
+        self.app.state = state
+        logger.debug(f"App state was saved, version {self.state_record.version}")
+
     def run_post_exec_routine(self):
-        self.update_staleness("status")
-        self.update_staleness("curr_state")
-        self.update_health()
-        app_update_fields = self.app.update_fields.copy()  # copy, as after 'app.save' its 'update_fields' will be reset
-        self.app.save(update_fields=self.app.update_fields)
-        self.update_parent(app_update_fields)
+        with self.profiler.phase("post_exec"):
+            self.update_staleness("status")
+            self.update_staleness("curr_state")
+            self.update_health()
+            set_attr_if_cond(create_now_ts_ms(), ">", self.app, "last_eval_ts")
+            self.schedule_next_eval()
+            # copy, as after 'app.save' its 'update_fields' will be reset
+            app_update_fields = self.app.update_fields.copy()
+            self.app.save(update_fields=self.app.update_fields)
+        with self.profiler.phase("parent"):
+            self.update_parent(app_update_fields)
+        self.save_exec_profile()
+
+    def save_exec_profile(self):
+        if not self.profiler.is_enabled:
+            return
+        # saved apart from the other fields, as the time of saving them is a part of the profile
+        self.app.exec_profile = self.profiler.add_to_profile(self.app.exec_profile, settings.APP_PROFILE_NUM_SAMPLES)
+        Application.objects.filter(pk=self.app.pk).update(exec_profile=self.app.exec_profile)
+        self.profiler = ExecProfiler(settings.PROFILE_APP_EXECUTION)
+
+    def schedule_next_eval(self):
+        # the interval of the task is the catch-up one while the application is catching up
+        interval_ms = get_interval_ms(self.task.interval)
+        if settings.TRIGGER_APPS_ON_NEW_DATA and not self.app.is_catching_up:
+            # the application is triggered by new data, the interval is only a safety net
+            interval_ms = max(interval_ms, settings.APP_SAFETY_NET_INTERVAL_MS)
+        next_eval_ts = create_now_ts_ms() + interval_ms
+        set_attr_if_cond(next_eval_ts, "!=", self.app, "next_eval_ts")
 
     def update_staleness(self, name: Literal["status", "curr_state"]):
 
@@ -0,0 +1,236 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import numpy as np
+from django.db import transaction, connection, connections
+from django.db.models import Max
+
+from apps.applications.models import Application, AppStateCheckpoint
+from apps.dfreadings.models import DfReading
+from common.complex_types import RecomputedPartition
+from common.constants import STATUS_FIELD_NAME, CURR_STATE_FIELD_NAME
+from services.app_func_executor import AppFuncExecutor
+from utils.app_func_map_utils import discover_app_func
+from utils.app_state_utils import serialize_app_state, encode_app_state, decode_app_state, get_app_settings_hash
+from utils.dfr_utils import delete_df_readings
+from utils.ts_utils import create_now_ts_ms, floor_timestamp
+from utils.update_utils import set_attr_if_cond
+
+logger = logging.getLogger("#app_recomputer")
+
+
+def init_worker():
+    # the worker processes can be spawned instead of forked, then Django is to be set up in them
+    django.setup()
+
+
+def recompute_partition(
+    app_pk: int, start_rts: int, end_rts: int, warm_up_start_rts: int, seed_state: dict
+) -> RecomputedPartition:
+    """
+    Executes the app function of the application over (warm_up_start_rts, end_rts] in memory starting with
+    'seed_state' and returns the derived df values within (start_rts, end_rts] and the state at 'end_rts'.
+    Nothing is saved, so the partitions can be recomputed concurrently.
+    """
+    app = Application.objects.select_related("type").get(pk=app_pk)
+    if (app_func := discover_app_func(app)) is None:
+        raise ValueError(f"No app function for app {app_pk}")
+    app.cursor_ts = warm_up_start_rts
+    app.state = seed_state
+
+    native_df_map = {}
+    for df in app.get_native_df_qs().select_related("data_type"):
+        df.parent = app
+        df.ts_to_start_with = end_rts  # so the app function doesn't go beyond the partition
+        native_df_map[df.name] = df
+    derived_df_map = {}
+    for df in app.get_derived_df_qs().select_related("data_type"):
+        df.parent = app
+        derived_df_map[df.name] = df
+
+    rts_chunks, value_chunks = {}, {}
+    while app.cursor_ts < end_rts:
+        derived_df_readings, update_map = app_func(app, native_df_map, derived_df_map)
+        if update_map.get("cursor_ts", app.cursor_ts) <= app.cursor_ts:
+            raise ValueError(f"App function of app {app_pk} doesn't move the cursor from {app.cursor_ts}")
+        for name, df_row in derived_df_readings.items():
+            if "values" in df_row:
+                rtss, values = df_row["grid"], df_row["values"]
+            else:
+                rtss = np.array([dfr.time for dfr in df_row["new_df_readings"]], dtype=np.int64)
+                values = np.array([dfr.db_value for dfr in df_row["new_df_readings"]], dtype=np.float64)
+            # the df values of the warm-up are only needed to get the state
+            is_taken = (rtss > start_rts) & ~np.isnan(values)
+            rts_chunks.setdefault(name, []).append(rtss[is_taken])
+            value_chunks.setdefault(name, []).append(values[is_taken])
+        app.cursor_ts = update_map["cursor_ts"]
+        if "state" in update_map:
+            app.state = serialize_app_state(update_map["state"])
+
+    return {
+        "start_rts": start_rts,
+        "end_rts": end_rts,
+        "df_values": {
+            name: (np.concatenate(rts_chunks[name]), np.concatenate(value_chunks[name])) for name in rts_chunks
+        },
+        "state": app.state,
+        "num_ticks": (end_rts - warm_up_start_rts) // app.time_resample,
+    }
+
+
+class AppRecomputer:
+    """
+    Recomputes the derived df readings of an application within (start_rts, end_rts], for example,
+    after its settings were changed. The range is split into partitions that are recomputed in parallel processes,
+    the state of every partition is seeded either from the checkpoint saved at its start by a previous
+    recomputation with the same settings or by the warm-up - the app function is executed from
+    'warm_up_ticks' before the partition with an empty state. A partition (except the first one) with neither
+    of them starts cold, from an empty state, so its outputs can differ from the ones of a sequential recomputation,
+    such partitions are logged and reported. Then the derived df readings of the range are replaced
+    in one transaction, and the states at the ends of the partitions are saved as checkpoints.
+    """
+
+    def __init__(
+        self,
+        app_pk: int,
+        start_rts: int,
+        end_rts: int | None = None,
+        num_partitions: int = 1,
+        num_workers: int = 1,
+        warm_up_ticks: int = 0,
+        use_checkpoints: bool = True,
+    ):
+        self.app = Application.objects.select_related("type", "task").get(pk=app_pk)
+        tr = self.app.time_resample
+        self.start_rts = floor_timestamp(start_rts, tr)
+        # only the df readings the application has already been executed for are recomputed
+        self.end_rts = floor_timestamp(min(end_rts or self.app.cursor_ts, self.app.cursor_ts), tr)
+        self.num_partitions = max(1, min(num_partitions, (self.end_rts - self.start_rts) // tr))
+        self.num_workers = num_workers
+        self.warm_up_ticks = warm_up_ticks
+        self.use_checkpoints = use_checkpoints
+        self.settings_hash = get_app_settings_hash(self.app)
+        self.report = {}
+        self.num_seeded_from_checkpoints = 0
+        self.num_cold_started = 0
+
+    def execute(self) -> dict:
+        if self.end_rts <= self.start_rts:
+            raise ValueError(f"Nothing to recompute, the cursor of app {self.app.pk} is at {self.app.cursor_ts}")
+        started_ts = create_now_ts_ms()
+        jobs = self.create_jobs()
+        results = self.run_jobs(jobs)
+        computed_ts = create_now_ts_ms()
+        self.replace_df_readings(results)
+        finished_ts = create_now_ts_ms()
+
+        num_ticks = sum(result["num_ticks"] for result in results)
+        self.report.update(
+            {
+                "num_partitions": len(jobs),
+                "num_seeded_from_checkpoints": self.num_seeded_from_checkpoints,
+                "num_cold_started": self.num_cold_started,
+                "num_ticks": num_ticks,
+                "compute_time_ms": computed_ts - started_ts,
+                "replace_time_ms": finished_ts - computed_ts,
+                "ticks_per_sec": round(num_ticks * 1000 / max(computed_ts - started_ts, 1), 2),
+            }
+        )
+        logger.info(f"App {self.app.pk} was recomputed: {self.report}")
+        return self.report
+
+    def create_jobs(self) -> list[tuple[int, int, int, int, dict]]:
+        tr = self.app.time_resample
+        num_ticks = (self.end_rts - self.start_rts) // tr
+        bounds = [self.start_rts + tr * (num_ticks * i // self.num_partitions) for i in range(self.num_partitions + 1)]
+
+        checkpoint_map = {}
+        if self.use_checkpoints:
+            checkpoint_map = {
+                cp.time: cp
+                for cp in AppStateCheckpoint.objects.filter(
+                    application_id=self.app.pk, settings_hash=self.settings_hash, time__in=bounds[:-1]
+                )
+            }
+
+        jobs = []
+        for start_rts, end_rts in zip(bounds[:-1], bounds[1:]):
+            if (checkpoint := checkpoint_map.get(start_rts)) is not None:
+                jobs.append((self.app.pk, start_rts, end_rts, start_rts, decode_app_state(checkpoint.data)))
+                self.num_seeded_from_checkpoints += 1
+            else:
+                jobs.append((self.app.pk, start_rts, end_rts, start_rts - self.warm_up_ticks * tr, {}))
+                # the first partition starts from the same empty state as a sequential recomputation does
+                if self.warm_up_ticks <= 0 and start_rts != self.start_rts:
+                    self.num_cold_started += 1
+        if self.num_cold_started > 0:
+            logger.warning(
+                f"{self.num_cold_started} partitions of app {self.app.pk} have neither a checkpoint nor a warm-up, "
+                "they start from an empty state"
+            )
+        return jobs
+
+    def run_jobs(self, jobs: list[tuple[int, int, int, int, dict]]) -> list[RecomputedPartition]:
+        num_workers = min(self.num_workers, len(jobs))
+        if num_workers <= 1 or connection.vendor == "sqlite":
+            return [recompute_partition(*job) for job in jobs]
+        # the worker processes open their own db connections, the ones of this process must not be inherited
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker) as pool:
+            return list(pool.map(recompute_partition, *zip(*jobs)))
+
+    @transaction.atomic
+    def replace_df_readings(self, results: list[RecomputedPartition]):
+        self.app = Application.objects.select_for_update().select_related("type", "task").get(pk=self.app.pk)
+        executor = AppFuncExecutor(self.app, None, self.app.task)
+        derived_dfs = list(self.app.get_derived_df_qs().select_for_update().select_related("data_type"))
+
+        num_deleted = num_created = 0
+        last_value_map = {}
+        for df in derived_dfs:
+            df.parent = self.app
+            num_deleted += delete_df_readings(df, self.start_rts, self.end_rts)
+            for result in results:
+                if (df_values := result["df_values"].get(df.name)) is None:
+                    continue
+                latest = executor.save_new_df_values(df, *df_values)
+                if latest is not None:
+                    last_value_map[df.name] = latest[1]
+                num_created += len(df_values[0])
+            last_rts = DfReading.objects.filter(datafeed_id=df.pk).aggregate(Max("time"))["time__max"]
+            if set_attr_if_cond(last_rts, "!=", df, "last_reading_ts"):
+                df.save(update_fields=df.update_fields)
+
+        AppStateCheckpoint.objects.filter(
+            application_id=self.app.pk, time__in=[result["end_rts"] for result in results]
+        ).delete()
+        AppStateCheckpoint.objects.bulk_create(
+            AppStateCheckpoint(
+                application_id=self.app.pk,
+                time=result["end_rts"],
+                settings_hash=self.settings_hash,
+                data=encode_app_state(result["state"]),
+            )
+            for result in results
+        )
+
+        # if the application was executed in the meantime, its state and outputs are newer than the recomputed ones
+        is_state_replaced = self.app.cursor_ts == self.end_rts
+        if is_state_replaced:
+            self.replace_state(executor, results[-1]["state"], last_value_map)
+        self.report.update(
+            {"num_deleted": num_deleted, "num_created": num_created, "is_state_replaced": is_state_replaced}
+        )
+
+    def replace_state(self, executor: AppFuncExecutor, state: dict, last_value_map: dict[str, float | int]):
+        executor.load_state()
+        executor.update_map = {"state": state}
+        executor.prepare_state()
+        executor.update_state()
+        for df_name, name in ((STATUS_FIELD_NAME, "status"), (CURR_STATE_FIELD_NAME, "curr_state")):
+            if (last_value := last_value_map.get(df_name)) is not None:
+                set_attr_if_cond(last_value, "!=", self.app, name)
+        app_update_fields = self.app.update_fields.copy()
+        self.app.save(update_fields=self.app.update_fields)
+        executor.update_parent(app_update_fields)
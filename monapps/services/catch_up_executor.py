@@ -0,0 +1,154 @@
+import logging
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django_celery_beat.models import PeriodicTask
+
+from apps.applications.models import Application
+from common.complex_types import AppFunction, UpdateMap
+from common.constants import HealthGrades
+from services.app_func_executor import AppFuncExecutor
+from utils.ts_utils import create_now_ts_ms
+from utils.update_utils import set_attr_if_cond
+
+logger = logging.getLogger("#catch_up_executor")
+
+
+class CatchUpExecutor(AppFuncExecutor):
+    """
+    Executes the app function of an application that is far behind real time window after window in one long run
+    instead of one window per task invocation. The results of the windows are saved in one transaction
+    (a checkpoint) every CATCH_UP_CHECKPOINT_INTERVAL_MS, the state is saved only at the checkpoints.
+    Status, current state and health stay frozen while the application is catching up, so nothing is propagated
+    to the parent until real time is reached. The progress of the run is stored in 'Application.catch_up_progress'.
+    """
+
+    def __init__(self, app: Application, app_func: AppFunction, task: PeriodicTask):
+        super().__init__(app, app_func, task)
+        self.are_dfs_catching_up = False
+        self.loaded_state = {}
+        self.state_map: UpdateMap | None = None  # the latest state returned by the app function, saved at a checkpoint
+        self.run_start_ts = create_now_ts_ms()
+        self.run_start_cursor_ts = app.cursor_ts
+
+    def execute(self):
+        if not self.acquire_lease():
+            logger.debug("App is already being caught up by another worker")
+            return
+        try:
+            run_end_ts = self.run_start_ts + settings.CATCH_UP_MAX_RUN_TIME_MS
+            while True:
+                with self.profiler.phase("resampling"):
+                    self.are_dfs_catching_up = self.create_df_readings()
+                is_catching_up = self.run_checkpoint()
+                if not is_catching_up or create_now_ts_ms() > run_end_ts:
+                    break
+        finally:
+            self.release_lease()
+
+    @transaction.atomic
+    def acquire_lease(self) -> bool:
+        # only one worker catches up an application, the other task invocations return at once
+        self.app = Application.objects.select_for_update().get(pk=self.app.pk)
+        if self.app.catch_up_progress.get("leaseUntilTs", 0) > self.run_start_ts:
+            return False
+        lease_until_ts = self.run_start_ts + settings.CATCH_UP_MAX_RUN_TIME_MS + settings.CATCH_UP_CHECKPOINT_INTERVAL_MS
+        self.run_start_cursor_ts = self.app.cursor_ts
+        set_attr_if_cond(
+            {**self.app.catch_up_progress, "leaseUntilTs": lease_until_ts}, "!=", self.app, "catch_up_progress"
+        )
+        self.app.save(update_fields=self.app.update_fields)
+        return True
+
+    @transaction.atomic
+    def release_lease(self):
+        self.app = Application.objects.select_for_update().get(pk=self.app.pk)
+        if self.app.is_catching_up:
+            progress = {k: v for k, v in self.app.catch_up_progress.items() if k != "leaseUntilTs"}
+        else:
+            progress = {}
+        set_attr_if_cond(progress, "!=", self.app, "catch_up_progress")
+        self.app.save(update_fields=self.app.update_fields)
+
+    @transaction.atomic
+    def run_checkpoint(self) -> bool:
+        with self.profiler.phase("lock"):
+            self.app = Application.objects.select_for_update().get(pk=self.app.pk)
+            self.task = PeriodicTask.objects.select_for_update().get(pk=self.task.pk)
+            self.load_state()
+        is_catching_up = False
+        if self.app.is_enabled:
+            self.loaded_state = self.app.state
+            self.state_map = None
+            try:
+                with transaction.atomic():
+                    is_catching_up = self.run_windows()
+            except Exception:
+                logger.error(f"Error happened while catching up, {traceback.format_exc(-1)}")
+                self.excep_health = HealthGrades.ERROR
+                # the windows of this checkpoint were rolled back, so the application is restored too
+                self.app.refresh_from_db()
+                self.app.update_fields.clear()
+                self.task.refresh_from_db()
+                self.load_state()
+                is_catching_up = False
+            self.update_progress()
+
+        logger.debug("Update other parameters")
+        self.run_post_exec_routine()
+        logger.debug("---END---")
+        return is_catching_up
+
+    def run_windows(self) -> bool:
+        native_df_map = {df.name: df for df in self.app.get_native_df_qs().select_for_update()}
+        derived_df_map = {df.name: df for df in self.app.get_derived_df_qs().select_for_update()}
+
+        checkpoint_ts = create_now_ts_ms() + settings.CATCH_UP_CHECKPOINT_INTERVAL_MS
+        num_windows = 0
+        while True:
+            with self.profiler.phase("app_func"):
+                derived_df_readings, update_map = self.app_func(self.app, native_df_map, derived_df_map)
+            num_windows += 1
+            are_more_windows_ready = update_map.get("is_catching_up", False)
+            # the application is behind real time until its df readings are caught up too
+            update_map["is_catching_up"] = are_more_windows_ready or self.are_dfs_catching_up
+            self.save_results(derived_df_readings, update_map)
+            if not are_more_windows_ready or "cursor_ts" not in update_map or create_now_ts_ms() > checkpoint_ts:
+                break
+
+        with self.profiler.phase("state"):
+            self.save_state()
+        logger.debug(f"{num_windows} windows were processed, cursor -> {self.app.cursor_ts}")
+        return self.app.is_catching_up
+
+    def update_state(self):
+        # the state is passed to the next window in memory and saved at the checkpoint
+        if (state := self.update_map.get("state")) is None:
+            return
+        self.state_map = {"state": state, "state_size": self.update_map["state_size"]}
+        self.app.state = state
+
+    def save_state(self):
+        if self.state_map is None:
+            return
+        self.app.state = self.loaded_state
+        self.update_map = self.state_map
+        super().update_state()
+
+    def update_progress(self):
+        # one tick is one 'time_resample' step of the cursor
+        now_ts = create_now_ts_ms()
+        ticks = (self.app.cursor_ts - self.run_start_cursor_ts) // self.app.time_resample
+        ticks_per_sec = ticks * 1000 / max(now_ts - self.run_start_ts, 1)
+        ticks_left = max(now_ts - self.app.cursor_ts, 0) // self.app.time_resample
+        progress = {
+            **self.app.catch_up_progress,
+            "runStartTs": self.run_start_ts,
+            "cursorTs": self.app.cursor_ts,
+            "ticks": ticks,
+            "ticksPerSec": round(ticks_per_sec, 2),
+            "etaMs": int(ticks_left / ticks_per_sec * 1000) if ticks_per_sec > 0 else None,
+        }
+        set_attr_if_cond(progress, "!=", self.app, "catch_up_progress")
+        logger.info(f"Catching up: {ticks} ticks, {progress['ticksPerSec']} ticks/s, ETA {progress['etaMs']} ms")
@@ -1,21 +1,31 @@
 import logging
 import traceback
+from collections.abc import Iterator
+import numpy as np
 from django.db import transaction
 from django.conf import settings
 
 from apps.applications.models import Application
 from apps.datafeeds.models import Datafeed
 from apps.datastreams.models import Datastream
-from apps.dsreadings.models import DsReading, NoDataMarker
-from apps.dfreadings.models import DfReading
+from apps.dsreadings.models import DsReading, NoDataMarker, DsReadingRollup
+from apps.dfreadings.models import DfReading, DfReadingStats
 from common.constants import AugmentationPolicy, DataAggTypes, VariableTypes, NotToUseDfrTypes
 from utils.ts_utils import ceil_timestamp, create_now_ts_ms
+from utils.dsr_utils import DsReadingCache
+from utils.rollup_utils import get_rollup_tier, combine_rollups, update_ds_rollups
+from utils.dfr_span_utils import save_compacted_df_readings, get_df_reading_at
+from utils.df_sharing_utils import get_min_shared_cursor_ts, sync_shared_dfs
 
 from utils.dfr_utils import (
     resample_ds_readings,
+    resample_ds_readings_in_db,
+    resample_ds_rollups,
+    iter_resampled_ds_readings,
     restore_continuous_avg,
     restore_totalizer,
     resample_and_augment_ds_readings,
+    bulk_insert_df_values,
 )
 from utils.update_utils import set_attr_if_cond
 
@@ -23,40 +33,88 @@ logger = logging.getLogger("#dfr_creator")
 
 
 class DfrCreator:
-    def __init__(self, app: Application, nat_df: Datafeed) -> None:
+    def __init__(
+        self,
+        app: Application,
+        nat_df: Datafeed,
+        dsr_cache: DsReadingCache | None = None,
+        ds: Datastream | None = None,
+    ) -> None:
         self.app = app
         self.df = nat_df
+        # if a cache is provided, ds readings are taken from it instead of the db,
+        # it is used when several datafeeds of the same datastream are processed together
+        self.dsr_cache = dsr_cache
+        # the datastream already locked by the caller, the creators of all the datafeeds of the datastream
+        # share the instance, so every one of them sees 'ts_to_start_with' and 'rollup_ts' saved by the others
+        self.locked_ds = ds
         self.is_catching_up = False
+        # the last native df readings, used as the restoration context, None - not loaded yet
+        self.nat_dfr_buffer: list[DfReading] | None = None
+        # the df readings restored as arrays (timestamps, db values), they are inserted without creating instances
+        self.restored_df_values: tuple[np.ndarray, np.ndarray] | None = None
 
     @transaction.atomic
     def execute(self) -> None:
+        if not self.prepare():
+            self.is_catching_up = False
+            return
+        self.process()
 
-        self.df = Datafeed.objects.select_for_update().get(pk=self.df.pk)
-        if self.df.datastream is None:
+    def prepare(self) -> bool:
+        # the datastream is locked before the datafeed, the same order is used
+        # when all the datafeeds of a datastream are processed together
+        if self.df.datastream_id is None:
             raise Exception(f"Datafeed {self.df.id} has no datastream")
-        self.ds = Datastream.objects.select_for_update().get(pk=self.df.datastream.pk)
+        if self.locked_ds is not None and self.locked_ds.pk == self.df.datastream_id:
+            self.ds = self.locked_ds
+        else:
+            self.ds = Datastream.objects.select_for_update().get(pk=self.df.datastream_id)
+        self.df = Datafeed.objects.select_for_update().get(pk=self.df.pk)
+        if self.df.datastream_id != self.ds.pk:
+            raise Exception(f"Datastream of datafeed {self.df.id} was changed")
 
         is_calculated = self.calc_start_rts()
         if not is_calculated:
-            self.is_catching_up = False
-            return
+            return False
 
         is_calculated = self.calc_end_rts()
         if not is_calculated:
-            self.is_catching_up = False
-            return
+            return False
 
         if self.start_rts >= self.end_rts:
             # it may happen because of 'till_now_margin'
             # substraction in the 'get_end_rts' function
-            self.is_catching_up = False
-            return
+            return False
 
-        is_created = self.create_ds_reading_batch(settings.NUM_MAX_DSREADINGS_TO_PROCESS)
-        if not is_created:
-            self.is_catching_up = False
-            return
+        is_calculated = self.calc_batch_end_rts(settings.NUM_MAX_DSREADINGS_TO_PROCESS)
+        if not is_calculated:
+            return False
 
+        self.choose_resampling_path()
+        return True
+
+    def choose_resampling_path(self) -> None:
+        # the paths that don't need the ds readings in memory are preferred, they are chosen
+        # the same way when the datafeed is resampled together with the other datafeeds of the datastream
+        self.use_ds_rollups = self.check_ds_rollups_usable()
+        self.use_db_resampling = not self.use_ds_rollups and self.check_db_resampling_usable()
+        self.use_streaming = not self.use_ds_rollups and not self.use_db_resampling and self.check_streaming_usable()
+
+    def uses_ds_readings(self) -> bool:
+        # True if the ds readings of the batch are fetched into memory (from the cache, if there is one)
+        return not (self.use_ds_rollups or self.use_db_resampling or self.use_streaming)
+
+    def process(self) -> None:
+        if self.use_streaming:
+            # df readings are created and saved chunk by chunk
+            self.stream_df_readings()
+            return
+        if self.use_ds_rollups or self.use_db_resampling:
+            # raw ds readings are not needed, the bins are taken from the rollups or aggregated by the db
+            self.ds_readings = []
+        else:
+            self.ds_readings = self.fetch_ds_readings(self.start_rts, self.batch_end_rts)
         self.create_df_readings()
         self.save_df_readings()
 
@@ -64,7 +122,13 @@ class DfrCreator:
         # for 'conventional' datafeeds we just use previously saved 'ts_to_start_with'
         # or 'cursor_ts' - whichever is greater
         # df readings older than 'app.cursor_ts' are not created
-        self.start_rts = max(self.app.cursor_ts, self.df.ts_to_start_with)
+        cursor_ts = self.app.cursor_ts
+        if self.df.ts_to_start_with < cursor_ts:
+            # the df readings of a shared datafeed should cover the cursors of all the applications using them
+            min_shared_cursor_ts = get_min_shared_cursor_ts(self.df)
+            if min_shared_cursor_ts is not None:
+                cursor_ts = min(cursor_ts, min_shared_cursor_ts)
+        self.start_rts = max(cursor_ts, self.df.ts_to_start_with)
 
         if self.ds.is_rbe and self.df.is_aug_on:
 
@@ -125,7 +189,7 @@ class DfrCreator:
                 self.end_rts = ceil_timestamp(last_dsr.time, self.df.time_resample)
         return True
 
-    def create_ds_reading_batch(self, batch_size: int) -> bool:
+    def calc_batch_end_rts(self, batch_size: int) -> bool:
 
         # get the last ds reading in the batch
         last_dsr_in_batch = (
@@ -142,78 +206,149 @@ class DfrCreator:
                 potential_batch_end_rts = self.start_rts + batch_size * self.df.time_resample
                 # in certain cases, 'potential_batch_end_rts' can be greater than 'self.end_rts', so crop
                 self.batch_end_rts = min(potential_batch_end_rts, self.end_rts)
-            self.ds_readings = list(
-                DsReading.objects.filter(
-                    datastream__id=self.ds.pk,
-                    time__gt=self.start_rts,
-                    time__lte=self.batch_end_rts,
-                ).order_by("time")
-            )
             return True
         else:
             if self.ds.is_rbe and self.df.is_aug_on and self.df.aug_policy == AugmentationPolicy.TILL_NOW:
                 potential_batch_end_rts = self.start_rts + batch_size * self.df.time_resample
                 # in certain cases, 'potential_batch_end_rts' can be greater than 'self.end_rts', so crop
                 self.batch_end_rts = min(potential_batch_end_rts, self.end_rts)
-                self.ds_readings = []
                 return True
             else:
                 return False
 
+    def fetch_ds_readings(self, from_rts: int, to_rts: int) -> list[DsReading]:
+        # returns the ds readings with 'from_rts' < time <= 'to_rts' sorted by time
+        if self.dsr_cache is not None:
+            return self.dsr_cache.get_ds_readings(from_rts, to_rts)
+        return list(
+            DsReading.objects.filter(
+                datastream__id=self.ds.pk,
+                time__gt=from_rts,
+                time__lte=to_rts,
+            ).order_by("time")
+        )
+
+    def check_ds_rollups_usable(self) -> bool:
+        if not settings.USE_DS_ROLLUPS_FOR_RESAMPLING:
+            return False
+        # the augmentation algorithm needs the ds readings themselves
+        if self.ds.is_rbe and self.df.is_aug_on:
+            return False
+        # the batch cannot be extended when the rollups are used
+        if self.batch_end_rts < self.end_rts:
+            return False
+        if get_rollup_tier(self.df.time_resample) is None:
+            return False
+        # all the ds readings of the batch should be already included into the rollups
+        return self.ds.rollup_ts >= min(self.batch_end_rts, self.ds.ts_to_start_with)
+
+    def fetch_ds_rollups(self, from_rts: int, to_rts: int) -> list[DsReadingRollup]:
+        # returns the rollups with 'from_rts' < time <= 'to_rts' combined to the time resample of the datafeed
+        tier = get_rollup_tier(self.df.time_resample)
+        rollups = list(
+            DsReadingRollup.objects.filter(
+                datastream__id=self.ds.pk,
+                tier=tier,
+                time__gt=from_rts,
+                time__lte=to_rts,
+            ).order_by("time")
+        )
+        if tier != self.df.time_resample:
+            rollups = combine_rollups(rollups, self.df.time_resample)
+        return rollups
+
+    def check_db_resampling_usable(self) -> bool:
+        if not settings.RESAMPLE_DS_READINGS_IN_DB:
+            return False
+        # the augmentation algorithm needs the ds readings themselves
+        if self.ds.is_rbe and self.df.is_aug_on:
+            return False
+        # the restoration may extend the batch, so it works with the ds readings as well
+        data_type = self.df.data_type
+        return not (self.df.is_rest_on and (data_type.agg_type == DataAggTypes.AVG or data_type.is_totalizer))
+
+    def resample_ds_readings(self, sorted_ds_readings: list[DsReading], from_rts: int, to_rts: int, agg_type):
+        with_stats = settings.STORE_DF_READING_STATS
+        if self.use_ds_rollups:
+            return resample_ds_rollups(self.fetch_ds_rollups(from_rts, to_rts), self.df, agg_type, with_stats)
+        if self.use_db_resampling:
+            return resample_ds_readings_in_db(
+                self.ds.pk, self.df, self.df.time_resample, agg_type, from_rts, to_rts, with_stats
+            )
+        # ds readings already grouped into bins by the cache are reused
+        bins = None
+        if self.dsr_cache is not None:
+            bins = self.dsr_cache.get_bins(self.df.time_resample, from_rts, to_rts)
+        return resample_ds_readings(sorted_ds_readings, self.df, self.df.time_resample, agg_type, bins, with_stats)
+
+    def extend_ds_reading_batch(self, num_bins_to_add: int) -> tuple[list[DsReading], int]:
+        # only the ds readings beyond the current 'batch_end_rts' are fetched,
+        # 'batch_end_rts' is always a bin boundary, so the new bins don't overlap with the existing ones
+        prev_batch_end_rts = self.batch_end_rts
+        self.batch_end_rts = min(self.batch_end_rts + num_bins_to_add * self.df.time_resample, self.end_rts)
+        new_ds_readings = self.fetch_ds_readings(prev_batch_end_rts, self.batch_end_rts)
+        self.ds_readings.extend(new_ds_readings)
+        return new_ds_readings, prev_batch_end_rts
+
     def create_df_readings(self):
         var_type = self.df.data_type.var_type
         agg_type = self.df.data_type.agg_type
         is_totalizer = self.df.data_type.is_totalizer
 
         if var_type == VariableTypes.CONTINUOUS and agg_type == DataAggTypes.AVG:
-            if len(self.ds_readings) == 0:
+            # temperature, pressure etc
+            # native df readings are created only once, the batch extension below
+            # adds new bins to this map instead of resampling the whole batch again
+            nat_df_reading_map = self.resample_ds_readings(
+                self.ds_readings, self.start_rts, self.batch_end_rts, DataAggTypes.AVG
+            )
+            if len(nat_df_reading_map) == 0:
                 logger.debug("No ds readings to process")
                 return
-            # temperature, pressure etc
+
             if self.df.is_rest_on:
                 if self.ds.time_change is None:
                     raise ValueError("time_change cannot be None for CONTINUOUS/AVG if restoration is on")
 
                 # get some native df readings 'from the past' to have enough readings for spline building
-                last_nat_dfrs_from_prev_period = DfReading.objects.filter(
-                    datafeed__id=self.df.pk, time__lte=self.start_rts, restored=False
-                ).order_by("-time")[:3]
-                # Django doesn't allow negative indexes in slicing
-                # that's why we use '-time' and then 'reversed'
-                last_nat_dfrs_from_prev_period = list(reversed(last_nat_dfrs_from_prev_period))
+                last_nat_dfrs_from_prev_period = self.get_last_nat_dfrs(self.start_rts)[-3:]
             k = 1  # this number limits the number of iterations in the cylce below to avoid an infinite loop
             while True:
-                self.df_reading_map = resample_ds_readings(
-                    self.ds_readings, self.df, self.df.time_resample, DataAggTypes.AVG
+                if not self.df.is_rest_on:
+                    self.df_reading_map = nat_df_reading_map
+                    break
+
+                self.df_reading_map = restore_continuous_avg(
+                    nat_df_reading_map,
+                    self.df,
+                    self.df.time_resample,
+                    self.ds.time_change,
+                    self.start_rts,
+                    last_nat_dfrs_from_prev_period,
                 )
-                if self.df.is_rest_on:
-                    self.df_reading_map = restore_continuous_avg(
-                        self.df_reading_map,
-                        self.df,
-                        self.df.time_resample,
-                        self.ds.time_change,
-                        self.start_rts,
-                        last_nat_dfrs_from_prev_period,
+                df_reading_rtss = sorted(self.df_reading_map)
+                num_spline_unclosed = 0
+
+                for rts in df_reading_rtss:
+                    if self.df_reading_map[rts].not_to_use == NotToUseDfrTypes.SPLINE_NOT_TO_USE:
+                        num_spline_unclosed += 1
+
+                if num_spline_unclosed == len(df_reading_rtss) and self.batch_end_rts < self.end_rts:
+                    # if there are only SPLINE_NOT_TO_USE readings,
+                    # and we still haven't reached the end of all the ds readings,
+                    # then we can extend the batch of ds readings.
+                    # In this case all the native df readings belong to the last (unclosed) cluster,
+                    # so it is enough to add the bins from the extension to the map
+                    # and restore this cluster once again
+                    k *= 2
+                    if k > 512:
+                        raise RuntimeError("DsReading batch extension limit reached")
+                    new_ds_readings, prev_batch_end_rts = self.extend_ds_reading_batch(k)
+                    nat_df_reading_map.update(
+                        self.resample_ds_readings(
+                            new_ds_readings, prev_batch_end_rts, self.batch_end_rts, DataAggTypes.AVG
+                        )
                     )
-                    df_reading_rtss = sorted(self.df_reading_map)
-                    num_spline_unclosed = 0
-
-                    for rts in df_reading_rtss:
-                        if self.df_reading_map[rts].not_to_use == NotToUseDfrTypes.SPLINE_NOT_TO_USE:
-                            num_spline_unclosed += 1
-
-                    if num_spline_unclosed == len(df_reading_rtss) and self.batch_end_rts < self.end_rts:
-                        # if there are only SPLINE_NOT_TO_USE readings,
-                        # and we still haven't reached the end of all the ds readings,
-                        # then we can extend the batch of ds readings
-                        num_dsrs_to_process = len(self.ds_readings)
-                        k *= 2
-                        if k > 512:
-                            raise RuntimeError("DsReading batch extension limit reached")
-                        num_dsrs_to_process += k
-                        _ = self.create_ds_reading_batch(num_dsrs_to_process)
-                    else:
-                        break
                 else:
                     break
 
@@ -233,10 +368,10 @@ class DfrCreator:
                         self.is_nd_period_open,
                     )
                 else:
-                    self.df_reading_map = resample_ds_readings(
+                    self.df_reading_map = self.resample_ds_readings(
                         self.ds_readings,
-                        self.df,
-                        self.df.time_resample,
+                        self.start_rts,
+                        self.batch_end_rts,
                         DataAggTypes.SUM,
                     )
             else:
@@ -254,10 +389,10 @@ class DfrCreator:
                         dfr_at_start_ts,
                     )
                 else:
-                    self.df_reading_map = resample_ds_readings(
+                    self.df_reading_map = self.resample_ds_readings(
                         self.ds_readings,
-                        self.df,
-                        self.df.time_resample,
+                        self.start_rts,
+                        self.batch_end_rts,
                         DataAggTypes.LAST,
                     )
                     if self.df.is_rest_on:
@@ -265,16 +400,9 @@ class DfrCreator:
                             raise ValueError(
                                 "time_change cannot be None for CONTINUOUS/SUM+TOTALIZER if restoration is on"
                             )
-                        last_nat_dfr_from_prev_period = (
-                            DfReading.objects.filter(
-                                datafeed__id=self.df.pk,
-                                time__lte=self.start_rts,
-                                restored=False,
-                            )
-                            .order_by("time")
-                            .last()
-                        )
-                        self.df_reading_map = restore_totalizer(
+                        last_nat_dfrs = self.get_last_nat_dfrs(self.start_rts)
+                        last_nat_dfr_from_prev_period = last_nat_dfrs[-1] if len(last_nat_dfrs) > 0 else None
+                        self.df_reading_map, fill_rtss, fill_values = restore_totalizer(
                             self.df_reading_map,
                             self.df,
                             self.df.time_resample,
@@ -282,6 +410,7 @@ class DfrCreator:
                             self.start_rts,
                             last_nat_dfr_from_prev_period,
                         )
+                        self.restored_df_values = (fill_rtss, fill_values)
 
         elif agg_type == DataAggTypes.LAST:  # for all var_types
             if self.ds.is_rbe and self.df.is_aug_on:
@@ -298,10 +427,10 @@ class DfrCreator:
                     dfr_at_start_ts,
                 )
             else:
-                self.df_reading_map = resample_ds_readings(
+                self.df_reading_map = self.resample_ds_readings(
                     self.ds_readings,
-                    self.df,
-                    self.df.time_resample,
+                    self.start_rts,
+                    self.batch_end_rts,
                     DataAggTypes.LAST,
                 )
 
@@ -313,38 +442,237 @@ class DfrCreator:
 
         self.is_catching_up = self.batch_end_rts < self.end_rts
 
+    def check_streaming_usable(self) -> bool:
+        if settings.DFR_STREAM_CHUNK_SIZE is None:
+            return False
+        # the augmentation algorithm needs the whole batch
+        return not (self.ds.is_rbe and self.df.is_aug_on)
+
+    def iter_ds_readings(self, chunk_size: int) -> Iterator[DsReading]:
+        qs = DsReading.objects.filter(
+            datastream__id=self.ds.pk,
+            time__gt=self.start_rts,
+            time__lte=self.batch_end_rts,
+        ).order_by("time")
+        for r in qs.iterator(chunk_size=chunk_size):
+            # the datastream is attached to avoid fetching it for every ds reading when 'value' is used
+            r.datastream = self.ds
+            yield r
+
+    def stream_df_readings(self) -> None:
+        # Does the same as 'create_df_readings' + 'save_df_readings' for non-augmented datafeeds,
+        # but keeps only a chunk of native df readings in memory.
+        # Each chunk is processed as a separate batch would be: the df readings before the first
+        # 'not_to_use' one are saved, the native df readings after it are carried to the next chunk.
+        chunk_size = settings.DFR_STREAM_CHUNK_SIZE
+        var_type = self.df.data_type.var_type
+        agg_type = self.df.data_type.agg_type
+        is_totalizer = self.df.data_type.is_totalizer
+
+        if var_type == VariableTypes.CONTINUOUS and agg_type == DataAggTypes.AVG:
+            resampling_agg_type = DataAggTypes.AVG
+            self.is_restoring = self.df.is_rest_on
+        elif (
+            var_type == VariableTypes.CONTINUOUS or var_type == VariableTypes.DISCRETE
+        ) and agg_type == DataAggTypes.SUM:
+            resampling_agg_type = DataAggTypes.LAST if is_totalizer else DataAggTypes.SUM
+            self.is_restoring = is_totalizer and self.df.is_rest_on
+        elif agg_type == DataAggTypes.LAST:
+            resampling_agg_type = DataAggTypes.LAST
+            self.is_restoring = False
+        else:
+            raise ValueError(
+                f"""No proper resampling procedure for var type {var_type}
+                            with agg type {agg_type}"""
+            )
+        if self.is_restoring and self.ds.time_change is None:
+            raise ValueError(f"time_change cannot be None for {var_type}/{agg_type} if restoration is on")
+
+        self.rts_to_start_with_next_time = self.start_rts
+        self.last_saved_dfr_rts = None
+        nat_df_reading_map = {}
+        num_carried = 0
+
+        nat_df_readings = iter_resampled_ds_readings(
+            self.iter_ds_readings(chunk_size),
+            self.df,
+            self.df.time_resample,
+            resampling_agg_type,
+            settings.STORE_DF_READING_STATS,
+        )
+        for nat_dfr in nat_df_readings:
+            nat_df_reading_map[nat_dfr.time] = nat_dfr
+            # the last (unclosed) df reading is always processed with the final chunk
+            if len(nat_df_reading_map) - num_carried >= chunk_size and nat_dfr.not_to_use is None:
+                nat_df_reading_map = self.save_df_reading_chunk(nat_df_reading_map)
+                num_carried = len(nat_df_reading_map)
+                # the carried readings are the ones that can't be saved yet (the unclosed cluster of the restoration),
+                # normally there are a few of them, a whole chunk of them means the memory isn't bounded anymore
+                if num_carried >= chunk_size:
+                    raise RuntimeError(f"{num_carried} native df readings were carried to the next chunk")
+
+        if len(nat_df_reading_map) > 0:
+            self.save_df_reading_chunk(nat_df_reading_map)
+
+        self.update_tss_after_saving(self.last_saved_dfr_rts)
+        self.is_catching_up = self.batch_end_rts < self.end_rts
+
+    def save_df_reading_chunk(self, nat_df_reading_map: dict[int, DfReading]) -> dict[int, DfReading]:
+        chunk_start_rts = self.rts_to_start_with_next_time
+        if self.is_restoring:
+            df_reading_map = self.restore_df_reading_chunk(nat_df_reading_map, chunk_start_rts)
+        else:
+            df_reading_map = nat_df_reading_map
+
+        df_readings, self.rts_to_start_with_next_time = self.split_df_reading_map(df_reading_map, chunk_start_rts)
+        if len(df_readings) > 0:
+            DfReading.objects.bulk_create(df_readings)
+            self.save_df_reading_stats(df_readings)
+            logger.debug(f"New {len(df_readings)} df readings were saved")
+            self.last_saved_dfr_rts = df_readings[-1].time
+            self.add_to_nat_dfr_buffer(df_readings)
+        self.last_saved_dfr_rts = self.save_restored_df_values(self.last_saved_dfr_rts)
+
+        # native df readings that were not saved are processed again with the next chunk
+        carried_nat_df_reading_map = {}
+        for rts, nat_dfr in nat_df_reading_map.items():
+            if rts > self.rts_to_start_with_next_time:
+                nat_dfr.not_to_use = None
+                carried_nat_df_reading_map[rts] = nat_dfr
+        return carried_nat_df_reading_map
+
+    def restore_df_reading_chunk(self, nat_df_reading_map: dict[int, DfReading], start_rts: int):
+        # the native df readings 'from the past' are taken like in a separate batch,
+        # the buffer already contains the native readings of the previous chunks
+        last_nat_dfrs = self.get_last_nat_dfrs(start_rts)
+        if self.df.data_type.agg_type == DataAggTypes.AVG:
+            return restore_continuous_avg(
+                nat_df_reading_map,
+                self.df,
+                self.df.time_resample,
+                self.ds.time_change,
+                start_rts,
+                last_nat_dfrs[-3:],
+            )
+        else:
+            last_nat_dfr_from_prev_period = last_nat_dfrs[-1] if len(last_nat_dfrs) > 0 else None
+            df_reading_map, fill_rtss, fill_values = restore_totalizer(
+                nat_df_reading_map,
+                self.df,
+                self.df.time_resample,
+                self.ds.time_change,
+                start_rts,
+                last_nat_dfr_from_prev_period,
+            )
+            self.restored_df_values = (fill_rtss, fill_values)
+            return df_reading_map
+
     def save_df_readings(self):
 
+        df_readings, self.rts_to_start_with_next_time = self.split_df_reading_map(self.df_reading_map, self.start_rts)
+
+        last_saved_dfr_rts = None
+        if len(df_readings) > 0:
+            if settings.DF_READING_SPAN_MIN_LEN is not None and self.ds.is_rbe and self.df.is_aug_on:
+                # long constant periods created by the augmentation are saved as spans
+                save_compacted_df_readings(self.df, df_readings, settings.DF_READING_SPAN_MIN_LEN)
+            else:
+                DfReading.objects.bulk_create(df_readings)
+            self.save_df_reading_stats(df_readings)
+            logger.debug(f"New {len(df_readings)} df readings were saved")
+            last_saved_dfr_rts = df_readings[-1].time
+            self.add_to_nat_dfr_buffer(df_readings)
+        last_saved_dfr_rts = self.save_restored_df_values(last_saved_dfr_rts)
+
+        self.update_tss_after_saving(last_saved_dfr_rts)
+
+    def save_restored_df_values(self, last_saved_dfr_rts: int | None) -> int | None:
+        # the restored df readings are saved up to the same timestamp as the native ones,
+        # returns the timestamp of the last saved df reading
+        if self.restored_df_values is None:
+            return last_saved_dfr_rts
+        rtss, db_values = self.restored_df_values
+        self.restored_df_values = None
+        is_to_save = rtss <= self.rts_to_start_with_next_time
+        if not is_to_save.any():
+            return last_saved_dfr_rts
+        bulk_insert_df_values(self.df.pk, rtss[is_to_save], db_values[is_to_save], restored=True)
+        logger.debug(f"New {np.count_nonzero(is_to_save)} restored df readings were saved")
+        last_restored_rts = rtss[is_to_save].max().item()
+        return last_restored_rts if last_saved_dfr_rts is None else max(last_saved_dfr_rts, last_restored_rts)
+
+    def save_df_reading_stats(self, df_readings: list[DfReading]):
+        # only the native df readings created by resampling have stats
+        stats = [dfr.stats for dfr in df_readings if dfr.stats is not None]
+        if len(stats) > 0:
+            DfReadingStats.objects.bulk_create(stats)
+
+    def get_last_nat_dfrs(self, start_rts: int) -> list[DfReading]:
+        # returns the last native df readings with 'time' <= 'start_rts' sorted by time,
+        # they are kept in the datafeed, so the db is queried only if they haven't been collected yet
+        if self.nat_dfr_buffer is None:
+            if self.df.last_nat_readings is not None:
+                self.nat_dfr_buffer = [
+                    DfReading(time=ts, db_value=db_value, datafeed=self.df, restored=False)
+                    for ts, db_value in self.df.last_nat_readings
+                ]
+            else:
+                # Django doesn't allow negative indexes in slicing
+                # that's why we use '-time' and then 'reversed'
+                last_nat_dfrs = DfReading.objects.filter(
+                    datafeed__id=self.df.pk, time__lte=start_rts, restored=False
+                ).order_by("-time")[: settings.NUM_LAST_NAT_DFRS_TO_KEEP]
+                self.nat_dfr_buffer = list(reversed(last_nat_dfrs))
+        # all the saved df readings are not newer than 'ts_to_start_with', so the filter is just a precaution
+        return [dfr for dfr in self.nat_dfr_buffer if dfr.time <= start_rts]
+
+    def add_to_nat_dfr_buffer(self, sorted_df_readings: list[DfReading]):
+        # the buffer is maintained only for the datafeeds that use it
+        if self.nat_dfr_buffer is None:
+            return
+        new_nat_dfrs = [dfr for dfr in sorted_df_readings if not dfr.restored]
+        self.nat_dfr_buffer = (self.nat_dfr_buffer + new_nat_dfrs)[-settings.NUM_LAST_NAT_DFRS_TO_KEEP :]
+
+    def split_df_reading_map(self, df_reading_map: dict[int, DfReading], start_rts: int) -> tuple[list[DfReading], int]:
+        # returns the df readings that can be saved (all the readings before the first 'not_to_use' one)
+        # and the timestamp to start with next time
         df_readings = []
-        df_reading_rtss = sorted(self.df_reading_map)
+        df_reading_rtss = sorted(df_reading_map)
 
-        self.rts_to_start_with_next_time = self.start_rts
+        rts_to_start_with_next_time = start_rts
         for idx, rts in enumerate(df_reading_rtss):
-            if self.df_reading_map[rts].not_to_use is not None:
-                if self.df_reading_map[rts].not_to_use == NotToUseDfrTypes.SPLINE_UNCLOSED:
+            if df_reading_map[rts].not_to_use is not None:
+                if df_reading_map[rts].not_to_use == NotToUseDfrTypes.SPLINE_UNCLOSED:
                     if len(df_reading_rtss) == 1:
                         # 'df_reading_rtss[idx - 1]' below can give bizarre results if len == 1
                         pass
                     else:
-                        self.rts_to_start_with_next_time = df_reading_rtss[idx - 1]
+                        rts_to_start_with_next_time = df_reading_rtss[idx - 1]
                 else:
-                    self.rts_to_start_with_next_time = rts - self.df.time_resample
+                    rts_to_start_with_next_time = rts - self.df.time_resample
                 break
-            df_readings.append(self.df_reading_map[rts])
-            self.rts_to_start_with_next_time = rts
+            df_readings.append(df_reading_map[rts])
+            rts_to_start_with_next_time = rts
 
-        last_saved_dfr_rts = None
-        if len(df_readings) > 0:
-            DfReading.objects.bulk_create(df_readings)
-            logger.debug(f"New {len(df_readings)} df readings were saved")
-            last_saved_dfr_rts = df_readings[-1].time
+        return df_readings, rts_to_start_with_next_time
 
+    def update_tss_after_saving(self, last_saved_dfr_rts: int | None):
         set_attr_if_cond(self.rts_to_start_with_next_time, ">", self.df, "ts_to_start_with")
         if last_saved_dfr_rts is not None:
             set_attr_if_cond(last_saved_dfr_rts, ">", self.df, "last_reading_ts")
+        is_progress_changed = len(self.df.update_fields) > 0
+        if self.nat_dfr_buffer is not None:
+            last_nat_readings = [[dfr.time, dfr.db_value] for dfr in self.nat_dfr_buffer]
+            set_attr_if_cond(last_nat_readings, "!=", self.df, "last_nat_readings")
         self.df.save(update_fields=self.df.update_fields)
-
-        set_attr_if_cond(self.rts_to_start_with_next_time, ">", self.ds, "ts_to_start_with")
+        if is_progress_changed:
+            sync_shared_dfs(self.df)
+
+        # there are no ds readings between the old and the new 'ts_to_start_with',
+        # so the rollups can be moved forward without adding anything
+        prev_ts_to_start_with = self.ds.ts_to_start_with
+        if set_attr_if_cond(self.rts_to_start_with_next_time, ">", self.ds, "ts_to_start_with"):
+            update_ds_rollups(self.ds, [], prev_ts_to_start_with, self.ds.ts_to_start_with)
         self.ds.save(update_fields=self.ds.update_fields)
 
     def check_catching_up(self):
@@ -366,4 +694,5 @@ class DfrCreator:
         return sorted_dsrs_and_ndms
 
     def get_dfr_at_start_ts(self):
-        return DfReading.objects.filter(datafeed__id=self.df.pk, time=self.start_rts).first()
+        # the df reading can be a part of a span
+        return get_df_reading_at(self.df, self.start_rts)
@@ -0,0 +1,74 @@
+import logging
+import traceback
+from django.conf import settings
+from django.db import transaction
+
+from apps.datafeeds.models import Datafeed
+from apps.datastreams.models import Datastream
+from services.dfr_creator import DfrCreator
+from utils.dsr_utils import DsReadingCache
+
+logger = logging.getLogger("#ds_resampler")
+
+
+class DsResampler:
+    """
+    Creates df readings for several datafeeds (possibly of different applications) that use the same datastream.
+    The ds readings for the union of the batches of the datafeeds that need them in memory are fetched from the db
+    and distributed into bins only once, for every 'time_resample' in use, the other datafeeds are resampled
+    from rollups, in the db or in chunks as usual. Every datafeed keeps its own 'ts_to_start_with'.
+    """
+
+    def __init__(self, ds_pk: int, nat_dfs: list[Datafeed]) -> None:
+        self.ds_pk = ds_pk
+        # 'df.parent' is used as the app, so it should be already fetched for the datafeeds
+        self.nat_dfs = sorted(nat_dfs, key=lambda df: df.pk)
+        self.catching_up_map: dict[int, bool] = {df.pk: False for df in self.nat_dfs}
+
+    @transaction.atomic
+    def execute(self) -> dict[int, bool]:
+        # the datastream is locked first, then the datafeeds, the same order is used in 'DfrCreator'
+        # the locked instance is shared by all the creators, so the progress saved by one of them is seen by the others
+        self.ds = Datastream.objects.select_for_update().get(pk=self.ds_pk)
+        dsr_cache = DsReadingCache(self.ds_pk)
+
+        creators = []
+        for nat_df in self.nat_dfs:
+            creator = DfrCreator(nat_df.parent, nat_df, dsr_cache, self.ds)
+            try:
+                with transaction.atomic():
+                    if creator.prepare():
+                        creators.append(creator)
+            except Exception:
+                logger.error(f"Error while preparing df {nat_df.pk} {nat_df.name}, {traceback.format_exc(-1)}")
+
+        if len(creators) == 0:
+            return self.catching_up_map
+
+        # the creators using rollups, db resampling or streaming don't need the ds readings in memory
+        cache_users = [creator for creator in creators if creator.uses_ds_readings()]
+        if len(cache_users) > 0:
+            # the batches of the datafeeds can be far apart, so the union is capped like a single batch,
+            # the creators whose batches go beyond the cached interval fetch their ds readings themselves
+            dsr_cache.load(
+                min(creator.start_rts for creator in cache_users),
+                max(creator.batch_end_rts for creator in cache_users),
+                {creator.df.time_resample for creator in cache_users},
+                settings.NUM_MAX_DSREADINGS_TO_PROCESS,
+            )
+
+        for creator in creators:
+            try:
+                logger.debug(f"Create readings for df {creator.df.pk} {creator.df.name}")
+                with transaction.atomic():
+                    creator.process()
+                self.catching_up_map[creator.df.pk] = creator.check_catching_up()
+            except Exception:
+                logger.error(
+                    f"Error while creating dfrs for {creator.df.pk} {creator.df.name}, {traceback.format_exc(-1)}"
+                )
+                # the changes of the shared datastream were rolled back with the savepoint
+                self.ds.refresh_from_db()
+                self.ds.update_fields.clear()
+
+        return self.catching_up_map
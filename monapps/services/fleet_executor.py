@@ -0,0 +1,113 @@
+import logging
+import time
+import traceback
+
+from django.db import transaction
+from django_celery_beat.models import PeriodicTask
+
+from apps.applications.models import Application, AppState
+from apps.datafeeds.models import Datafeed
+from common.complex_types import AppFunction, AppFleetFunction
+from services.app_func_executor import AppFuncExecutor
+
+logger = logging.getLogger("#fleet_executor")
+
+
+class FleetExecutor:
+    """
+    Executes the app function of several applications of the same type and version at once ('fleet_function'
+    of the app function), so they are evaluated with array operations over all of them. Df readings are prepared
+    and the results are saved for every application separately, the same way 'AppFuncExecutor' does it.
+    """
+
+    def __init__(self, apps: list[Application], app_func: AppFunction, fleet_func: AppFleetFunction):
+        self.fleet_func = fleet_func
+        self.executors = [AppFuncExecutor(app, app_func, app.task) for app in apps]
+
+    def execute(self):
+        # the applications that are still catching up with df readings are not evaluated this time
+        executors = [executor for executor in self.executors if executor.prepare()]
+        if len(executors) > 0:
+            self.evaluate(executors)
+
+    @transaction.atomic
+    def evaluate(self, executors: list[AppFuncExecutor]):
+        # the rows are locked in the same order by all the workers
+        start = time.perf_counter()
+        app_map = (
+            Application.objects.select_for_update(of=("self",))
+            .select_related("type", "parent")
+            .order_by("pk")
+            .in_bulk([e.app.pk for e in executors])
+        )
+        task_map = (
+            PeriodicTask.objects.select_for_update(of=("self",))
+            .select_related("interval")
+            .order_by("pk")
+            .in_bulk([e.task.pk for e in executors])
+        )
+        state_record_map = AppState.objects.in_bulk([e.app.pk for e in executors])
+
+        locked_executors = []
+        for executor in executors:
+            app = app_map.get(executor.app.pk)
+            if app is None or app.last_eval_ts != executor.app.last_eval_ts:
+                # deleted or executed by another worker in the meantime
+                continue
+            executor.app = app
+            executor.task = task_map[executor.task.pk]
+            executor.set_state_record(state_record_map.get(app.pk))
+            locked_executors.append(executor)
+        # the time of locking is shared equally by the applications
+        lock_ms = (time.perf_counter() - start) * 1000 / max(len(locked_executors), 1)
+        for executor in locked_executors:
+            executor.profiler.add_time("lock", lock_ms)
+
+        enabled_executors = [executor for executor in locked_executors if executor.app.is_enabled]
+        if len(enabled_executors) > 0:
+            self.run_app_funcs(enabled_executors)
+
+        logger.debug("Update other parameters")
+        for executor in locked_executors:
+            executor.run_post_exec_routine()
+        logger.debug("---END---")
+
+    def run_app_funcs(self, executors: list[AppFuncExecutor]):
+        native_df_maps, derived_df_maps = self.get_df_maps([executor.app for executor in executors])
+        self.run_fleet_func(self.fleet_func, executors, native_df_maps, derived_df_maps)
+
+    def run_fleet_func(
+        self,
+        fleet_func: AppFleetFunction,
+        executors: list[AppFuncExecutor],
+        native_df_maps: list[dict[str, Datafeed]],
+        derived_df_maps: list[dict[str, Datafeed]],
+    ):
+        logger.debug(f"Starting fleet function for {len(executors)} apps")
+        apps = [executor.app for executor in executors]
+        start = time.perf_counter()
+        try:
+            results = fleet_func(apps, native_df_maps, derived_df_maps)
+        except Exception:
+            logger.error(f"Error happened while executing fleet function, {traceback.format_exc(-1)}")
+            # every application is evaluated on its own then, so the error affects only the one that causes it
+            for executor in executors:
+                executor.run_safely(executor.run_exec_routine)
+            return
+
+        # the time of the fleet function is shared equally by the applications
+        app_func_ms = (time.perf_counter() - start) * 1000 / len(executors)
+        for executor, app_results in zip(executors, results):
+            executor.profiler.add_time("app_func", app_func_ms)
+            executor.run_safely(executor.save_results, *app_results)
+
+    def get_df_maps(self, apps: list[Application]) -> tuple[list[dict[str, Datafeed]], list[dict[str, Datafeed]]]:
+        app_idxs = {app.pk: idx for idx, app in enumerate(apps)}
+        native_df_maps = [{} for _ in apps]
+        derived_df_maps = [{} for _ in apps]
+        for df in Datafeed.objects.filter(parent_id__in=app_idxs).select_for_update():
+            app = apps[app_idxs[df.parent_id]]
+            df.parent = app
+            df_maps = derived_df_maps if df.datastream_id is None else native_df_maps
+            df_maps[app_idxs[app.pk]][df.name] = df
+        return native_df_maps, derived_df_maps
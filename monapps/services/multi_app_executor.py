@@ -0,0 +1,98 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+
+from apps.applications.models import Application
+from apps.datafeeds.models import Datafeed
+from common.complex_types import AppFleetFunction
+from services.app_func_executor import AppFuncExecutor
+from services.fleet_executor import FleetExecutor
+from utils.app_func_map_utils import discover_app_func, discover_fleet_func
+from utils.ts_utils import create_now_ts_ms, get_interval_ms
+
+logger = logging.getLogger("#multi_app_executor")
+
+
+class MultiAppExecutor(FleetExecutor):
+    """
+    Executes the applications (of any types) that are due for execution ('next_eval_ts'), so the lookups
+    and the locks that 'AppFuncExecutor' makes for every application are made once for all of them. The applications
+    are claimed with 'SKIP LOCKED', so several workers can run this executor at the same time. The results
+    of all the applications are committed in one transaction.
+    """
+
+    def __init__(self):
+        self.executors = []
+        self.fleet_func_map: dict[tuple[str, str], AppFleetFunction] = {}
+
+    def execute(self) -> int:
+        # returns the number of the claimed applications
+        apps = self.claim_due_apps()
+        if len(apps) == 0:
+            return 0
+        logger.info(f"Executing {len(apps)} due apps")
+        self.executors = self.create_executors(apps)
+        self.prefetch_native_dfs()
+        super().execute()
+        return len(apps)
+
+    @transaction.atomic
+    def claim_due_apps(self) -> list[Application]:
+        now_ts = create_now_ts_ms()
+        apps = list(
+            Application.objects.filter(Q(next_eval_ts__isnull=True) | Q(next_eval_ts__lte=now_ts), task__isnull=False)
+            .select_related("type", "task__interval", "parent")
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by(F("next_eval_ts").asc(nulls_first=True), "pk")[: settings.MAX_APPS_TO_EXEC]
+        )
+        # the applications are rescheduled at once, so the other workers don't claim them
+        # while they are executed, the time is corrected when the execution finishes
+        for app in apps:
+            app.next_eval_ts = now_ts + get_interval_ms(app.task.interval)
+        Application.objects.bulk_update(apps, ["next_eval_ts"])
+        return apps
+
+    def create_executors(self, apps: list[Application]) -> list[AppFuncExecutor]:
+        executors = []
+        for app in apps:
+            if (app_func := discover_app_func(app)) is None:
+                continue
+            key = (app.type.func_name, app.func_version)
+            if settings.EXECUTE_APPS_AS_FLEETS and key not in self.fleet_func_map:
+                if (fleet_func := discover_fleet_func(app)) is not None:
+                    self.fleet_func_map[key] = fleet_func
+            executors.append(AppFuncExecutor(app, app_func, app.task))
+        return executors
+
+    def prefetch_native_dfs(self):
+        executor_map = {executor.app.pk: executor for executor in self.executors}
+        for executor in self.executors:
+            executor.native_dfs = []
+        native_df_qs = Datafeed.objects.filter(parent_id__in=executor_map, datastream__isnull=False).select_related(
+            "source_df__parent", "source_df__data_type"
+        )
+        for df in native_df_qs:
+            executor_map[df.parent_id].native_dfs.append(df)
+
+    def run_app_funcs(self, executors: list[AppFuncExecutor]):
+        native_df_maps, derived_df_maps = self.get_df_maps([executor.app for executor in executors])
+
+        group_map = {}
+        for idx, executor in enumerate(executors):
+            group_map.setdefault((executor.app.type.func_name, executor.app.func_version), []).append(idx)
+
+        for key, idxs in group_map.items():
+            fleet_func = self.fleet_func_map.get(key)
+            if fleet_func is not None and len(idxs) > 1:
+                self.run_fleet_func(
+                    fleet_func,
+                    [executors[idx] for idx in idxs],
+                    [native_df_maps[idx] for idx in idxs],
+                    [derived_df_maps[idx] for idx in idxs],
+                )
+                continue
+            for idx in idxs:
+                executor = executors[idx]
+                executor.run_safely(executor.run_app_func, native_df_maps[idx], derived_df_maps[idx])
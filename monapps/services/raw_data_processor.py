@@ -21,6 +21,8 @@ from utils.ts_utils import create_now_ts_ms
 from utils.update_utils import set_attr_if_cond, enqueue_update
 from utils.alarm_utils import update_alarm_map, at_least_one_alarm_in
 from utils.sequnce_utils import find_max_ts
+from utils.rollup_utils import update_ds_rollups
+from utils.app_trigger_utils import enqueue_app_evals
 from services.device_log import add_to_device_log
 from common.constants import HealthGrades, VariableTypes, DataAggTypes
 
@@ -32,6 +34,7 @@ class RawDataProcessor:
         self.dev_ui = dev_ui
         self.payload = payload
         self.int_key_payload = {}
+        self.advanced_ds_pks: list[int] = []  # the datastreams with new ds readings or nodata markers
 
     def execute(self):
 
@@ -50,6 +53,9 @@ class RawDataProcessor:
         except Exception:
             # add_to_alarm_log("ERROR", "Error while processing a message", instance="MQTT Sub")
             logger.error(f"Error while processing a message: {traceback.format_exc(-1)}")
+            return
+        # the applications are triggered after the commit, so they see the new ds readings
+        enqueue_app_evals(self.advanced_ds_pks, create_now_ts_ms())
 
     def discover_device(self):
         try:
@@ -206,8 +212,16 @@ class RawDataProcessor:
         )
 
         # update 'ts_to_start_with' and 'last_valid_reading_ts'
+        prev_ts_to_start_with = ds.ts_to_start_with
         ts_to_start_with = max(find_max_ts(ds_readings), find_max_ts(nd_markers))
-        set_attr_if_cond(ts_to_start_with, ">", ds, "ts_to_start_with")
+        if set_attr_if_cond(ts_to_start_with, ">", ds, "ts_to_start_with"):
+            self.advanced_ds_pks.append(ds.pk)
+
+        # all the new valid ds readings are newer than the previous 'ts_to_start_with',
+        # so the rollups can be extended right away if they are up to date
+        update_ds_rollups(
+            ds, sorted(ds_readings, key=lambda r: r.time), prev_ts_to_start_with, ds.ts_to_start_with
+        )
 
         last_valid_reading_ts = find_max_ts(ds_readings)  # ds_readings - only valid readings
         set_attr_if_cond(last_valid_reading_ts, ">", ds, "last_valid_reading_ts")
@@ -1,4 +1,5 @@
 from .exec_app_func import exec_app_func
+from .exec_due_apps import exec_due_apps
 from .update_assets import update_assets
 from .update_devices import update_devices
 from .update_periodic_ds_health import update_periodic_ds_health
\ No newline at end of file
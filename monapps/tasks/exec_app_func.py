@@ -2,12 +2,17 @@ import logging
 from typing import Optional
 
 from celery import shared_task
+from django.conf import settings
+from django.db.models import Q
 from django_celery_beat.models import PeriodicTask
 
 from apps.applications.models import Application
-from common.complex_types import AppFunction
+from common.complex_types import AppFunction, AppFleetFunction
 from services.app_func_executor import AppFuncExecutor
-from app_functions.app_functions import app_function_map
+from services.catch_up_executor import CatchUpExecutor
+from services.fleet_executor import FleetExecutor
+from utils.ts_utils import create_now_ts_ms, get_interval_ms
+from utils.app_func_map_utils import discover_app_func, discover_fleet_func
 
 
 logger = logging.getLogger("#exec_app_func")
@@ -15,16 +20,59 @@ logger = logging.getLogger("#exec_app_func")
 
 @shared_task(bind=True, name="evaluate.app_func")
 def exec_app_func(self) -> None:
+    if settings.EXECUTE_DUE_APPS_IN_BATCHES:
+        if is_due_apps_task_enabled():
+            logger.debug("The applications are executed by the 'evaluate.due_apps' task")
+            return
+        logger.warning("No enabled periodic task 'evaluate.due_apps', the application is executed by its own task")
     if (task := discover_task(self)) is None:
         return
     if (app := discover_app(task)) is None:
         return
     if (app_func := discover_app_func(app)) is None:
         return
+    if settings.USE_CATCH_UP_EXECUTOR and app.is_enabled and app.is_catching_up:
+        logger.info(f"Catching up app {app.name} with app function {app.type.func_name} {app.func_version}")
+        CatchUpExecutor(app, app_func, task).execute()
+        return
+    if settings.EXECUTE_APPS_AS_FLEETS and (fleet_func := discover_fleet_func(app)) is not None:
+        exec_app_fleet(app, task, app_func, fleet_func)
+        return
     logger.info(f"Executing app function {app.type.func_name} {app.func_version} for app {app.name}")
     AppFuncExecutor(app, app_func, task).execute()
 
 
+def exec_app_fleet(app: Application, task: PeriodicTask, app_func: AppFunction, fleet_func: AppFleetFunction) -> None:
+    # the applications executed less than half an interval ago were executed with a fleet in this round
+    min_last_eval_ts = create_now_ts_ms() - get_interval_ms(task.interval) // 2
+    if app.last_eval_ts is not None and app.last_eval_ts > min_last_eval_ts:
+        logger.debug(f"App {app.pk} was already executed with its fleet")
+        return
+
+    other_apps = list(
+        Application.objects.filter(
+            type_id=app.type_id,
+            func_version=app.func_version,
+            time_resample=app.time_resample,
+            is_enabled=True,
+            task__interval_id=task.interval_id,
+        )
+        .filter(Q(last_eval_ts__isnull=True) | Q(last_eval_ts__lte=min_last_eval_ts))
+        .exclude(pk=app.pk)
+        .select_related("type", "task")
+        .order_by("pk")[: settings.MAX_APPS_IN_FLEET - 1]
+    )
+    app.task = task
+    logger.info(
+        f"Executing app function {app.type.func_name} {app.func_version} for a fleet of {len(other_apps) + 1} apps"
+    )
+    FleetExecutor([app, *other_apps], app_func, fleet_func).execute()
+
+
+def is_due_apps_task_enabled() -> bool:
+    return PeriodicTask.objects.filter(task="evaluate.due_apps", enabled=True).exists()
+
+
 def discover_task(ctx) -> Optional[PeriodicTask]:
     task_name = ctx.request.periodic_task_name
     try:
@@ -40,20 +88,3 @@ def discover_app(task: PeriodicTask) -> Optional[Application]:
         logger.error(f"No application for the task '{task.name}'")
         return
     return app
-
-
-def discover_app_func(app: Application) -> Optional[AppFunction]:
-
-    app_func_cluster = app_function_map.get(app.type.func_name)
-    if app_func_cluster is None:
-        logger.error(f"No '{app.type.func_name}' in the app function map")
-        return
-    app_func_dict = app_func_cluster.get(app.func_version)
-    if app_func_dict is None:
-        logger.error(f"No version '{app.func_version}' for '{app.type.func_name}'")
-        return
-    app_func = app_func_dict.get("function")
-    if app_func is None:
-        logger.error(f"No app function for '{app.type.func_name}' and '{app.func_version}'")
-        return
-    return app_func
@@ -0,0 +1,19 @@
+import logging
+from celery import shared_task
+from django.conf import settings
+
+from services.multi_app_executor import MultiAppExecutor
+
+logger = logging.getLogger("#exec_due_apps_task")
+
+
+@shared_task(bind=True, name="evaluate.due_apps")
+def exec_due_apps(self):
+    if not settings.EXECUTE_DUE_APPS_IN_BATCHES:
+        logger.debug("The applications are executed by their own tasks")
+        return
+    if MultiAppExecutor().execute() >= settings.MAX_APPS_TO_EXEC:
+        # there can be more due applications (for example, after a burst of triggers), they are not left
+        # till the next run of the periodic task
+        logger.debug("A full batch of apps was executed, the task is enqueued again")
+        exec_due_apps.apply_async()
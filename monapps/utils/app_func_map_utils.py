@@ -0,0 +1,98 @@
+import importlib
+import logging
+import traceback
+from collections.abc import Iterable
+from functools import cache
+from importlib.metadata import entry_points
+from typing import Optional
+
+from django.conf import settings
+
+from apps.applications.models import Application
+from common.complex_types import AppFunction, AppFleetFunction
+from app_functions.app_functions import app_function_paths
+
+logger = logging.getLogger("#app_func_map_utils")
+
+# {(func_name, func_version): app function dict}, the app functions imported so far
+app_func_dict_cache: dict[tuple[str, str], dict] = {}
+
+
+def discover_app_func(app: Application) -> Optional[AppFunction]:
+    if (app_func_dict := discover_app_func_dict(app)) is None:
+        return
+    app_func = app_func_dict.get("function")
+    if app_func is None:
+        logger.error(f"No app function for '{app.type.func_name}' and '{app.func_version}'")
+        return
+    return app_func
+
+
+def discover_fleet_func(app: Application) -> Optional[AppFleetFunction]:
+    if (app_func_dict := discover_app_func_dict(app)) is None:
+        return
+    return app_func_dict.get("fleet_function")
+
+
+def discover_app_func_dict(app: Application) -> Optional[dict]:
+
+    app_func_cluster = get_app_func_paths().get(app.type.func_name)
+    if app_func_cluster is None:
+        logger.error(f"No '{app.type.func_name}' in the app function map")
+        return
+    if app.func_version not in app_func_cluster:
+        logger.error(f"No version '{app.func_version}' for '{app.type.func_name}'")
+        return
+    return load_app_func_dict(app.type.func_name, app.func_version)
+
+
+@cache
+def get_app_func_paths() -> dict[str, dict[str, str]]:
+    # the app functions of this repo and the ones registered by other packages as entry points
+    # named "<func_name>/<func_version>", nothing is imported here
+    paths = {func_name: dict(version_map) for func_name, version_map in app_function_paths.items()}
+    for entry_point in entry_points(group=settings.APP_FUNCTION_ENTRY_POINT_GROUP):
+        func_name, _, func_version = entry_point.name.partition("/")
+        if not func_version:
+            logger.error(f"Wrong name of the app function entry point '{entry_point.name}'")
+            continue
+        paths.setdefault(func_name, {})[func_version] = entry_point.value
+    return paths
+
+
+def load_app_func_dict(func_name: str, func_version: str) -> Optional[dict]:
+    # the module of an app function version is imported on first use, then the app function is taken from the cache
+    if (app_func_dict := app_func_dict_cache.get((func_name, func_version))) is not None:
+        return app_func_dict
+    path = get_app_func_paths().get(func_name, {}).get(func_version)
+    if path is None:
+        logger.error(f"No version '{func_version}' for '{func_name}'")
+        return
+    module_name, _, attr_name = path.partition(":")
+    try:
+        app_func_dict = getattr(importlib.import_module(module_name), attr_name)
+    except Exception:
+        logger.error(f"Cannot import app function '{path}', {traceback.format_exc(-1)}")
+        return
+    app_func_dict_cache[(func_name, func_version)] = app_func_dict
+    logger.debug(f"App function '{func_name}' '{func_version}' was imported")
+    return app_func_dict
+
+
+def preload_app_funcs(names: Iterable[str]) -> int:
+    # names are "<func_name>" (all the versions) or "<func_name>/<func_version>", "*" - all the app functions
+    num_loaded = 0
+    paths = get_app_func_paths()
+    for name in names:
+        if name == "*":
+            keys = [(func_name, version) for func_name, version_map in paths.items() for version in version_map]
+        elif "/" in name:
+            keys = [tuple(name.split("/", 1))]
+        else:
+            keys = [(name, version) for version in paths.get(name, {})]
+            if len(keys) == 0:
+                logger.error(f"No '{name}' in the app function map")
+        for func_name, func_version in keys:
+            if load_app_func_dict(func_name, func_version) is not None:
+                num_loaded += 1
+    return num_loaded
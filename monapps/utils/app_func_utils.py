@@ -1,10 +1,16 @@
 from collections.abc import Iterable
+from heapq import merge
+
+import numpy as np
 
 from django.conf import settings
 
+from apps.applications.models import Application
 from apps.datafeeds.models import Datafeed
-from apps.dfreadings.models import DfReading
-from common.complex_types import DfValueMap
+from apps.dfreadings.models import DfReading, DfReadingSpan, DfReadingStats
+from common.complex_types import DfValueMap, DfStatsMap, DfFrame
+from utils.dfr_span_utils import get_df_reading_spans, expand_df_reading_spans
+from utils.dfr_store_utils import mem_dfr_store
 
 
 def get_end_rts(
@@ -39,13 +45,28 @@ def get_end_rts(
 def get_df_value_map(datafeeds: Iterable[Datafeed], start_rts: int, end_rts: int) -> DfValueMap:
 
     df_value_map: DfValueMap = {}
+    store = mem_dfr_store.get()
 
     for df in datafeeds:
+        if store is not None:
+            rtss, values = store.get_df_values(df.reading_df_id, start_rts, end_rts)
+            for rts, value in zip(rtss.tolist(), values.tolist()):
+                df_value_map.setdefault(rts, {})[df.name] = DfReading(time=rts, db_value=value, datafeed=df).value
+            continue
+
+        # the df readings of a shared datafeed are stored under its source datafeed
         df_readings = list(
-            DfReading.objects.filter(datafeed__id=df.pk, time__gt=start_rts, time__lte=end_rts).order_by("time")
+            DfReading.objects.filter(datafeed__id=df.reading_df_id, time__gt=start_rts, time__lte=end_rts).order_by(
+                "time"
+            )
         )
-
-        if len(df_readings) == 0:
+        spans = get_df_reading_spans(df.reading_df_id, start_rts, end_rts)
+        if len(spans) > 0:
+            # the df readings represented by spans are expanded in the chronological order with the others
+            df_readings = merge(
+                df_readings, expand_df_reading_spans(spans, df, start_rts, end_rts), key=lambda dfr: dfr.time
+            )
+        elif len(df_readings) == 0:
             continue
 
         for dfr in df_readings:
@@ -54,3 +75,134 @@ def get_df_value_map(datafeeds: Iterable[Datafeed], start_rts: int, end_rts: int
             df_value_map[dfr.time][df.name] = dfr.value
 
     return df_value_map
+
+
+def get_df_stats_map(datafeeds: Iterable[Datafeed], start_rts: int, end_rts: int) -> DfStatsMap:
+    # the statistics of the bins of the native df readings, {rts: {df name: stats}},
+    # restored and augmented df readings have no stats
+    df_names_by_reading_df_id = {}
+    for df in datafeeds:
+        df_names_by_reading_df_id.setdefault(df.reading_df_id, []).append(df.name)
+
+    df_stats_map: DfStatsMap = {}
+    if mem_dfr_store.get() is not None:
+        return df_stats_map
+    stats_qs = DfReadingStats.objects.filter(
+        datafeed__id__in=df_names_by_reading_df_id, time__gt=start_rts, time__lte=end_rts
+    ).order_by("time")
+    for stats in stats_qs:
+        if stats.time not in df_stats_map:
+            df_stats_map[stats.time] = {}
+        for df_name in df_names_by_reading_df_id[stats.datafeed_id]:
+            df_stats_map[stats.time][df_name] = stats
+
+    return df_stats_map
+
+
+def get_df_frame(datafeeds: Iterable[Datafeed], start_rts: int, end_rts: int, time_resample: int) -> DfFrame:
+    """
+    An alternative to 'get_df_value_map': the values of all the datafeeds with 'start_rts' < time <= 'end_rts'
+    are fetched with one query and put into float64 arrays aligned with the grid, NaN means no df reading.
+    The application function can then evaluate its conditions with array operations.
+    """
+
+    grid = np.arange(start_rts + time_resample, end_rts + 1, time_resample, dtype=np.int64)
+
+    # the df readings of a shared datafeed are stored under its source datafeed
+    df_names_by_reading_df_id = {}
+    for df in datafeeds:
+        df_names_by_reading_df_id.setdefault(df.reading_df_id, []).append(df.name)
+
+    columns_by_reading_df_id = get_columns_by_reading_df_id(
+        df_names_by_reading_df_id.keys(), start_rts, end_rts, time_resample, len(grid)
+    )
+
+    columns = {}
+    for reading_df_id, df_names in df_names_by_reading_df_id.items():
+        for i, df_name in enumerate(df_names):
+            column = columns_by_reading_df_id[reading_df_id]
+            # several datafeeds can use the same df readings, each of them gets its own array
+            columns[df_name] = column if i == 0 else column.copy()
+
+    return {"grid": grid, "columns": columns}
+
+
+def get_fleet_df_frame(
+    df_maps: list[dict[str, Datafeed]], start_rts: int, end_rts: int, time_resample: int
+) -> DfFrame:
+    """
+    The same as 'get_df_frame' for several applications of the same type ('df_maps' - their native datafeeds
+    by names), the values of all the datafeeds are fetched with one query. Every column is a 2D array,
+    a row for every application in the order of 'df_maps'.
+    """
+
+    grid = np.arange(start_rts + time_resample, end_rts + 1, time_resample, dtype=np.int64)
+
+    reading_df_ids = {df.reading_df_id for df_map in df_maps for df in df_map.values()}
+    columns_by_reading_df_id = get_columns_by_reading_df_id(
+        reading_df_ids, start_rts, end_rts, time_resample, len(grid)
+    )
+
+    df_names = df_maps[0].keys() if len(df_maps) > 0 else []
+    columns = {
+        df_name: np.stack([columns_by_reading_df_id[df_map[df_name].reading_df_id] for df_map in df_maps])
+        for df_name in df_names
+    }
+    return {"grid": grid, "columns": columns}
+
+
+def get_columns_by_reading_df_id(
+    reading_df_ids: Iterable[int], start_rts: int, end_rts: int, time_resample: int, grid_len: int
+) -> dict[int, np.ndarray]:
+    columns_by_reading_df_id = {
+        reading_df_id: np.full(grid_len, np.nan, dtype=np.float64) for reading_df_id in reading_df_ids
+    }
+
+    if (store := mem_dfr_store.get()) is not None:
+        for reading_df_id, column in columns_by_reading_df_id.items():
+            rtss, values = store.get_df_values(reading_df_id, start_rts, end_rts)
+            column[(rtss - start_rts) // time_resample - 1] = values
+        return columns_by_reading_df_id
+
+    rows = list(
+        DfReading.objects.filter(
+            datafeed__id__in=columns_by_reading_df_id, time__gt=start_rts, time__lte=end_rts
+        ).values_list("datafeed_id", "time", "db_value")
+    )
+    if len(rows) > 0 and grid_len > 0:
+        df_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        tss = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        values = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+        # df readings are always on the grid, the check is just a precaution
+        is_on_grid = (tss - start_rts) % time_resample == 0
+        idxs = (tss - start_rts) // time_resample - 1
+        for reading_df_id, column in columns_by_reading_df_id.items():
+            mask = (df_ids == reading_df_id) & is_on_grid
+            column[idxs[mask]] = values[mask]
+
+    span_qs = DfReadingSpan.objects.filter(
+        datafeed__id__in=columns_by_reading_df_id, time__lte=end_rts, end_time__gt=start_rts
+    )
+    for span in span_qs:
+        first_idx = max((span.time - start_rts) // time_resample - 1, 0)
+        last_idx = min((span.end_time - start_rts) // time_resample - 1, grid_len - 1)
+        columns_by_reading_df_id[span.datafeed_id][first_idx : last_idx + 1] = span.db_value
+
+    return columns_by_reading_df_id
+
+
+def get_fleet_periods(
+    apps: list[Application], native_df_maps: list[dict[str, Datafeed]], num_df_to_process: int
+) -> dict[tuple[int, int, int], list[tuple[int, bool]]]:
+    """
+    Groups the applications of a fleet by the period they have to process now - (start_rts, end_rts, time_resample),
+    a group is a list of (index of the application, is catching up). The applications that have nothing
+    to process are not included.
+    """
+    fleet_periods = {}
+    for idx, (app, native_df_map) in enumerate(zip(apps, native_df_maps)):
+        start_rts = app.cursor_ts
+        end_rts, is_catching_up = get_end_rts(native_df_map.values(), app.time_resample, start_rts, num_df_to_process)
+        if end_rts > start_rts:
+            fleet_periods.setdefault((start_rts, end_rts, app.time_resample), []).append((idx, is_catching_up))
+    return fleet_periods
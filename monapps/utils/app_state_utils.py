@@ -0,0 +1,32 @@
+import hashlib
+import json
+import zlib
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from apps.applications.models import Application
+
+
+def serialize_app_state(state: dict[str, Any]) -> dict[str, Any]:
+    # the objects that keep a part of the state themselves (for example, 'RollingOccurrenceCounter')
+    # are replaced with what they return from 'to_state', this is where they compact their data
+    return {key: value.to_state() if hasattr(value, "to_state") else value for key, value in state.items()}
+
+
+def get_app_state_size(state: dict[str, Any]) -> int:
+    # the number of bytes of the state encoded to JSON, as it is stored in the db
+    return len(json.dumps(state).encode())
+
+
+def encode_app_state(state: dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(state, separators=(",", ":")).encode())
+
+
+def decode_app_state(data: bytes) -> dict[str, Any]:
+    return json.loads(zlib.decompress(data))
+
+
+def get_app_settings_hash(app: "Application") -> str:
+    # the states computed with the same app function version and settings are interchangeable
+    payload = json.dumps([app.type.func_name, app.func_version, app.time_resample, app.settings], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
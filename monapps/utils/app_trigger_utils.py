@@ -0,0 +1,41 @@
+import logging
+from collections.abc import Iterable
+
+from django.conf import settings
+
+from apps.applications.models import Application
+from apps.datafeeds.models import Datafeed
+from tasks.exec_due_apps import exec_due_apps
+
+logger = logging.getLogger("#app_trigger_utils")
+
+
+def enqueue_app_evals(ds_pks: Iterable[int], now_ts: int) -> int:
+    """
+    Makes the enabled applications with native datafeeds of the datastreams due for execution
+    APP_TRIGGER_DELAY_MS after 'now_ts' and enqueues the 'evaluate.due_apps' task for that moment.
+    The applications that are already due earlier are not changed, so all the triggers that come
+    within the delay are coalesced into one execution. Returns the number of the triggered applications.
+    """
+    ds_pks = list(ds_pks)
+    if not settings.TRIGGER_APPS_ON_NEW_DATA or not settings.EXECUTE_DUE_APPS_IN_BATCHES or len(ds_pks) == 0:
+        return 0
+
+    next_eval_ts = now_ts + settings.APP_TRIGGER_DELAY_MS
+    # an application with several datafeeds of the datastreams is matched once
+    app_pk_qs = Datafeed.objects.filter(datastream_id__in=ds_pks).values("parent_id")
+    num_triggered = (
+        Application.objects.filter(pk__in=app_pk_qs, is_enabled=True, task__isnull=False)
+        .filter(next_eval_ts__gt=next_eval_ts)
+        .update(next_eval_ts=next_eval_ts)
+    )
+    if num_triggered == 0:
+        return 0
+
+    logger.debug(f"{num_triggered} apps are triggered for {next_eval_ts}")
+    try:
+        exec_due_apps.apply_async(countdown=settings.APP_TRIGGER_DELAY_MS / 1000)
+    except Exception as e:
+        # the applications stay due, so they are claimed by the next run of the periodic 'evaluate.due_apps' task
+        logger.error(f"Cannot enqueue the execution of the triggered apps, {e}")
+    return num_triggered
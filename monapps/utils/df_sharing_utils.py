@@ -0,0 +1,109 @@
+import logging
+
+from django.db.models import Min
+
+from apps.applications.models import Application
+from apps.datafeeds.models import Datafeed
+from apps.dfreadings.models import DfReading, DfReadingSpan
+from utils.update_utils import set_attr_if_cond
+
+logger = logging.getLogger("#df_sharing_utils")
+
+
+def get_resampling_key(df: Datafeed) -> tuple:
+    # datafeeds with the same key get the same df readings
+    return (df.datastream_id, df.time_resample, df.data_type_id, df.is_rest_on, df.is_aug_on, df.aug_policy)
+
+
+def get_first_df_reading_ts(df_pk: int) -> int | None:
+    first_tss = [
+        ts
+        for ts in (
+            DfReading.objects.filter(datafeed__id=df_pk).order_by("time").values_list("time", flat=True).first(),
+            DfReadingSpan.objects.filter(datafeed__id=df_pk).order_by("time").values_list("time", flat=True).first(),
+        )
+        if ts is not None
+    ]
+    return min(first_tss) if len(first_tss) > 0 else None
+
+
+def find_source_df(df: Datafeed) -> Datafeed | None:
+    """
+    Looks for a native datafeed of another application that resamples the same datastream
+    with the same settings and whose df readings cover the period needed by the application of 'df'.
+    """
+
+    candidate_qs = (
+        Datafeed.objects.filter(
+            datastream_id=df.datastream_id,
+            parent__time_resample=df.time_resample,
+            data_type_id=df.data_type_id,
+            is_rest_on=df.is_rest_on,
+            is_aug_on=df.is_aug_on,
+            aug_policy=df.aug_policy,
+            source_df__isnull=True,
+        )
+        .exclude(parent_id=df.parent_id)
+        .select_related("parent", "data_type")
+        .order_by("pk")
+    )
+    for candidate in candidate_qs:
+        first_dfr_ts = get_first_df_reading_ts(candidate.pk)
+        if first_dfr_ts is None or first_dfr_ts <= df.parent.cursor_ts + df.time_resample:
+            return candidate
+    return None
+
+
+def link_to_source_df(df: Datafeed) -> bool:
+    # only the datafeeds that have no df readings of their own can be linked
+    if df.source_df_id is not None or df.ts_to_start_with != 0 or df.last_reading_ts is not None:
+        return False
+
+    source_df = find_source_df(df)
+    if source_df is None:
+        return False
+
+    df.source_df = source_df
+    df.update_fields.add("source_df")
+    set_attr_if_cond(source_df.ts_to_start_with, ">", df, "ts_to_start_with")
+    if source_df.last_reading_ts is not None:
+        set_attr_if_cond(source_df.last_reading_ts, ">", df, "last_reading_ts")
+    df.save(update_fields=df.update_fields)
+    logger.debug(f"Datafeed {df.pk} uses the df readings of datafeed {source_df.pk}")
+    return True
+
+
+def unlink_from_source_df(df: Datafeed) -> None:
+    # the datafeed has no df readings of its own, so the progress taken from the source datafeed is reset
+    # and the datafeed is resampled from the cursor of its application, the period the application
+    # hasn't been executed for yet isn't skipped then
+    logger.debug(f"Datafeed {df.pk} doesn't use the df readings of datafeed {df.source_df_id} anymore")
+    df.source_df = None
+    df.update_fields.add("source_df")
+    set_attr_if_cond(df.parent.cursor_ts, "!=", df, "ts_to_start_with")
+    set_attr_if_cond(None, "!=", df, "last_reading_ts")
+    set_attr_if_cond(None, "!=", df, "last_nat_readings")
+    df.save(update_fields=df.update_fields)
+
+
+def unlink_shared_dfs(df: Datafeed) -> None:
+    # called before 'df' is deleted, 'on_delete=SET_NULL' of 'source_df' would keep the progress of the shared ones
+    for shared_df in Datafeed.objects.filter(source_df__id=df.pk).select_related("parent"):
+        unlink_from_source_df(shared_df)
+
+
+def get_min_shared_cursor_ts(df: Datafeed) -> int | None:
+    # the smallest cursor of the applications that use the df readings of 'df'
+    return Application.objects.filter(datafeed__source_df__id=df.pk).aggregate(min_cursor_ts=Min("cursor_ts"))[
+        "min_cursor_ts"
+    ]
+
+
+def sync_shared_dfs(df: Datafeed) -> None:
+    # the datafeeds that use the df readings of 'df' get its progress,
+    # so the application functions can use them as usual
+    for shared_df in Datafeed.objects.filter(source_df__id=df.pk):
+        set_attr_if_cond(df.ts_to_start_with, ">", shared_df, "ts_to_start_with")
+        if df.last_reading_ts is not None:
+            set_attr_if_cond(df.last_reading_ts, ">", shared_df, "last_reading_ts")
+        shared_df.save(update_fields=shared_df.update_fields)
@@ -0,0 +1,162 @@
+import logging
+from collections.abc import Iterable, Iterator
+
+from apps.datafeeds.models import Datafeed
+from apps.dfreadings.models import DfReading, DfReadingSpan
+from utils.dfr_store_utils import mem_dfr_store
+
+logger = logging.getLogger("#dfr_span_utils")
+
+
+def compact_df_readings(
+    sorted_df_readings: list[DfReading],
+    time_resample: int,
+    min_span_len: int,
+    prev_span: DfReadingSpan | None = None,
+) -> tuple[list[DfReading], list[DfReadingSpan], bool]:
+    """
+    Replaces runs of consecutive restored df readings with the same value by spans.
+    Runs shorter than 'min_span_len' are left as df readings, except the run that continues 'prev_span',
+    in this case 'prev_span' is extended.
+    Returns (df readings to save, new spans, True if 'prev_span' was extended).
+    """
+
+    df_readings = []
+    spans = []
+    is_prev_span_extended = False
+
+    i = 0
+    length = len(sorted_df_readings)
+    while i < length:
+        first_dfr = sorted_df_readings[i]
+        j = i + 1
+        if first_dfr.restored:
+            while (
+                j < length
+                and sorted_df_readings[j].restored
+                and sorted_df_readings[j].time == sorted_df_readings[j - 1].time + time_resample
+                and sorted_df_readings[j].db_value == first_dfr.db_value
+            ):
+                j += 1
+        last_dfr = sorted_df_readings[j - 1]
+
+        if (
+            i == 0
+            and prev_span is not None
+            and first_dfr.restored
+            and first_dfr.time == prev_span.end_time + time_resample
+            and first_dfr.db_value == prev_span.db_value
+        ):
+            prev_span.end_time = last_dfr.time
+            is_prev_span_extended = True
+        elif first_dfr.restored and j - i >= min_span_len:
+            spans.append(
+                DfReadingSpan(
+                    time=first_dfr.time,
+                    end_time=last_dfr.time,
+                    datafeed_id=first_dfr.datafeed_id,
+                    db_value=first_dfr.db_value,
+                    restored=True,
+                )
+            )
+        else:
+            df_readings.extend(sorted_df_readings[i:j])
+        i = j
+
+    return df_readings, spans, is_prev_span_extended
+
+
+def get_trailing_df_reading_run(df: Datafeed, next_dfr: DfReading, max_len: int) -> list[DfReading]:
+    # returns already saved restored df readings right before 'next_dfr' that have the same value,
+    # i.e. the run that 'next_dfr' continues
+    if not next_dfr.restored:
+        return []
+    time_resample = df.time_resample
+    prev_df_readings = DfReading.objects.filter(
+        datafeed__id=df.pk, time__lt=next_dfr.time, time__gte=next_dfr.time - max_len * time_resample
+    ).order_by("-time")
+    trailing_run = []
+    next_rts = next_dfr.time
+    for dfr in prev_df_readings:
+        if not dfr.restored or dfr.time != next_rts - time_resample or dfr.db_value != next_dfr.db_value:
+            break
+        trailing_run.append(dfr)
+        next_rts = dfr.time
+    return list(reversed(trailing_run))
+
+
+def save_compacted_df_readings(df: Datafeed, sorted_df_readings: list[DfReading], min_span_len: int) -> None:
+    if len(sorted_df_readings) == 0:
+        return
+
+    # the span that ends right before the first df reading can be continued
+    prev_span = DfReadingSpan.objects.filter(
+        datafeed__id=df.pk, end_time=sorted_df_readings[0].time - df.time_resample
+    ).first()
+
+    # if there is no such span, the saved df readings before the first one can start a span together with it,
+    # it is necessary when the df readings are created by small batches
+    trailing_run = []
+    if prev_span is None:
+        trailing_run = get_trailing_df_reading_run(df, sorted_df_readings[0], min_span_len)
+
+    df_readings, spans, is_prev_span_extended = compact_df_readings(
+        trailing_run + sorted_df_readings, df.time_resample, min_span_len, prev_span
+    )
+
+    if len(trailing_run) > 0:
+        if len(spans) > 0 and spans[0].time == trailing_run[0].time:
+            # the saved df readings are replaced with the span
+            DfReading.objects.filter(
+                datafeed__id=df.pk, time__gte=trailing_run[0].time, time__lte=trailing_run[-1].time
+            ).delete()
+        else:
+            df_readings = df_readings[len(trailing_run):]
+
+    DfReading.objects.bulk_create(df_readings)
+    DfReadingSpan.objects.bulk_create(spans)
+    if is_prev_span_extended:
+        prev_span.save(update_fields=["end_time"])
+    logger.debug(f"{len(df_readings)} df readings and {len(spans)} spans were saved for df {df.pk}")
+
+
+def get_df_reading_spans(df_pk: int, from_rts: int, to_rts: int) -> list[DfReadingSpan]:
+    # returns the spans overlapping ('from_rts', 'to_rts'] sorted by time
+    return list(
+        DfReadingSpan.objects.filter(datafeed__id=df_pk, time__lte=to_rts, end_time__gt=from_rts).order_by("time")
+    )
+
+
+def expand_df_reading_spans(
+    sorted_spans: Iterable[DfReadingSpan],
+    df: Datafeed,
+    from_rts: int | None = None,
+    to_rts: int | None = None,
+) -> Iterator[DfReading]:
+    """
+    Yields the df readings represented by the spans, only the ones with 'from_rts' < time <= 'to_rts'.
+    """
+
+    time_resample = df.time_resample
+    for span in sorted_spans:
+        rts = span.time
+        if from_rts is not None and rts <= from_rts:
+            # jump to the first grid point after 'from_rts'
+            rts += ((from_rts - rts) // time_resample + 1) * time_resample
+        end_rts = span.end_time if to_rts is None else min(span.end_time, to_rts)
+        while rts <= end_rts:
+            yield DfReading(time=rts, db_value=span.db_value, datafeed=df, restored=span.restored)
+            rts += time_resample
+
+
+def get_df_reading_at(df: Datafeed, rts: int) -> DfReading | None:
+    if (store := mem_dfr_store.get()) is not None:
+        rtss, values = store.get_df_values(df.pk, rts - 1, rts)
+        return DfReading(time=rts, db_value=values[0].item(), datafeed=df) if len(rtss) > 0 else None
+    dfr = DfReading.objects.filter(datafeed__id=df.pk, time=rts).first()
+    if dfr is not None:
+        return dfr
+    span = DfReadingSpan.objects.filter(datafeed__id=df.pk, time__lte=rts, end_time__gte=rts).first()
+    if span is not None and (rts - span.time) % df.time_resample == 0:
+        return DfReading(time=rts, db_value=span.db_value, datafeed=df, restored=span.restored)
+    return None
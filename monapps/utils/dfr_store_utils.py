@@ -0,0 +1,39 @@
+from contextvars import ContextVar
+
+import numpy as np
+
+
+class MemDfReadingStore:
+    """
+    Keeps the df readings of datafeeds in memory as arrays sorted by time - {df pk: (timestamps, values)}.
+    While a store is set in 'mem_dfr_store', the helpers the app functions read df readings with
+    ('get_df_frame', 'get_df_value_map', 'get_df_reading_at' and others) take them from the store instead of the db,
+    so an app function can be executed without the db. Spans are stored expanded, the stats are not stored.
+    """
+
+    def __init__(self) -> None:
+        self.arrays: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+    def add_df_values(self, df_pk: int, rtss: np.ndarray, values: np.ndarray) -> None:
+        rtss = np.asarray(rtss, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        is_set = ~np.isnan(values)
+        rtss, values = rtss[is_set], values[is_set]
+        if df_pk in self.arrays:
+            old_rtss, old_values = self.arrays[df_pk]
+            rtss = np.concatenate((old_rtss, rtss))
+            values = np.concatenate((old_values, values))
+        order = np.argsort(rtss, kind="stable")
+        self.arrays[df_pk] = (rtss[order], values[order])
+
+    def get_df_values(self, df_pk: int, start_rts: int, end_rts: int) -> tuple[np.ndarray, np.ndarray]:
+        # the timestamps and the values of the df readings with 'start_rts' < time <= 'end_rts'
+        if df_pk not in self.arrays:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        rtss, values = self.arrays[df_pk]
+        first_idx, last_idx = np.searchsorted(rtss, (start_rts, end_rts), side="right")
+        return rtss[first_idx:last_idx], values[first_idx:last_idx]
+
+
+# the store is set by the code that executes app functions in memory (see 'InMemoryAppRunner'), None - the db is used
+mem_dfr_store: ContextVar[MemDfReadingStore | None] = ContextVar("mem_dfr_store", default=None)
@@ -1,14 +1,20 @@
 import logging
+import numpy as np
 from scipy.interpolate import PchipInterpolator
+from collections.abc import Iterable, Iterator
 from typing import Sequence
+from django.db import connection
+from django.db.models import Count, Min, Max, Sum, F, Value, BigIntegerField, ExpressionWrapper, Window
+from django.db.models.functions import RowNumber
 
 from apps.datafeeds.models import Datafeed
-from apps.dsreadings.models import DsReading, NoDataMarker
-from apps.dfreadings.models import DfReading
+from apps.dsreadings.models import DsReading, NoDataMarker, DsReadingRollup
+from apps.dfreadings.models import DfReading, DfReadingStats, DfReadingSpan
 
 from common.complex_types import IndDfReadingMap
 from common.constants import DataAggTypes, NotToUseDfrTypes
 from utils.ts_utils import ceil_timestamp, create_grid
+from utils.rollup_utils import add_value_to_rollup
 
 
 logger = logging.getLogger("#dfr_utils")
@@ -47,33 +53,89 @@ def find_last_value(ds_readings: list[DsReading]) -> float | int | None:
 
 agg_map = {DataAggTypes.AVG: find_average, DataAggTypes.SUM: find_sum, DataAggTypes.LAST: find_last_value}
 
+# 'DfReadingStats' and 'DsReadingRollup' have the same fields, so the same functions are used for both
+rollup_agg_map = {
+    DataAggTypes.AVG: lambda rollup: rollup.sum / rollup.count,
+    DataAggTypes.SUM: lambda rollup: rollup.sum,
+    DataAggTypes.LAST: lambda rollup: rollup.last,
+}
+
+
+def create_df_reading_stats(sorted_ds_readings: list[DsReading], df: Datafeed, rts: int) -> DfReadingStats:
+    stats = DfReadingStats(time=rts, datafeed=df, count=0, sum=0.0)
+    for r in sorted_ds_readings:
+        add_value_to_rollup(stats, r.db_value)
+    return stats
+
+
+def aggregate_bin(
+    sorted_bin_dsrs: list[DsReading], df: Datafeed, rts: int, agg_type: DataAggTypes, with_stats: bool = False
+) -> DfReading | None:
+    """
+    Creates a native df reading from the ds readings of a bin.
+    If 'with_stats' is True, the statistics of the bin are computed in the same pass,
+    the value of the df reading is derived from them and they are attached to the df reading.
+    """
+
+    if with_stats:
+        stats = create_df_reading_stats(sorted_bin_dsrs, df, rts)
+        if stats.count == 0:
+            return None
+        dfr = DfReading(time=rts, value=rollup_agg_map[agg_type](stats), datafeed=df, restored=False)
+        dfr.stats = stats
+        return dfr
+
+    agg_value = agg_map[agg_type](sorted_bin_dsrs)
+    if agg_value is None:
+        return None
+    return DfReading(time=rts, value=agg_value, datafeed=df, restored=False)
+
+
+def bin_ds_readings(
+    sorted_ds_readings: list[DsReading], time_resamples: Iterable[int]
+) -> dict[int, dict[int, list[DsReading]]]:
+    """
+    Distributes ds readings into bins of several resolutions in one pass.
+    Returns {time_resample: {rts: [ds readings of the bin]}}, bins are ordered by 'rts'.
+    """
+
+    time_resamples = set(time_resamples)
+    bins_by_resol = {time_resample: {} for time_resample in time_resamples}
+
+    for r in sorted_ds_readings:
+        for time_resample in time_resamples:
+            bins = bins_by_resol[time_resample]
+            rts = ceil_timestamp(r.time, time_resample)
+            if rts not in bins:
+                bins[rts] = []
+            bins[rts].append(r)
+
+    return bins_by_resol
+
 
 def resample_ds_readings(
     sorted_ds_readings: list[DsReading],
     df: Datafeed,
     time_resample: int,
     agg_type: DataAggTypes,
+    bins: dict[int, list[DsReading]] | None = None,
+    with_stats: bool = False,
 ) -> IndDfReadingMap:
     """
     A generic function, can be used with different aggregation functions.
+    If the ds readings were already distributed into bins (see 'bin_ds_readings'),
+    these bins can be passed to avoid binning them again.
     """
 
-    df_reading_map = {}
-    agg_func = agg_map[agg_type]
-
-    last_df_reading_rts = 0
-    for r in sorted_ds_readings:
-        rts = ceil_timestamp(r.time, time_resample)
-        if rts not in df_reading_map:
-            df_reading_map[rts] = []
+    if bins is None:
+        bins = bin_ds_readings(sorted_ds_readings, (time_resample,))[time_resample]
 
-        df_reading_map[rts].append(r)
-        last_df_reading_rts = rts
+    df_reading_map = {}
 
-    for rts in df_reading_map:
-        agg_value = agg_func(df_reading_map[rts])
-        if agg_value is not None:
-            dfr = DfReading(time=rts, value=agg_value, datafeed=df, restored=False)
+    last_df_reading_rts = next(reversed(bins), 0)
+    for rts, bin_dsrs in bins.items():
+        dfr = aggregate_bin(bin_dsrs, df, rts, agg_type, with_stats)
+        if dfr is not None:
             df_reading_map[rts] = dfr
             # injection of 'not_to_use' property
             if rts == last_df_reading_rts:
@@ -82,6 +144,130 @@ def resample_ds_readings(
     return df_reading_map
 
 
+def iter_resampled_ds_readings(
+    sorted_ds_readings: Iterable[DsReading],
+    df: Datafeed,
+    time_resample: int,
+    agg_type: DataAggTypes,
+    with_stats: bool = False,
+) -> Iterator[DfReading]:
+    """
+    A streaming version of 'resample_ds_readings': a df reading is yielded as soon as its bin is closed,
+    so only the ds readings of the current bin are kept in memory.
+    The df reading of the last bin is marked as UNCLOSED.
+    """
+
+    bin_rts = None
+    bin_dsrs = []
+
+    for r in sorted_ds_readings:
+        rts = ceil_timestamp(r.time, time_resample)
+        if rts != bin_rts:
+            if bin_rts is not None:
+                yield aggregate_bin(bin_dsrs, df, bin_rts, agg_type, with_stats)
+            bin_rts = rts
+            bin_dsrs = []
+        bin_dsrs.append(r)
+
+    if bin_rts is not None:
+        dfr = aggregate_bin(bin_dsrs, df, bin_rts, agg_type, with_stats)
+        dfr.not_to_use = NotToUseDfrTypes.UNCLOSED
+        yield dfr
+
+
+def resample_ds_readings_in_db(
+    ds_pk: int,
+    df: Datafeed,
+    time_resample: int,
+    agg_type: DataAggTypes,
+    from_rts: int,
+    to_rts: int,
+    with_stats: bool = False,
+) -> IndDfReadingMap:
+    """
+    Does the same as 'resample_ds_readings' for the ds readings with 'from_rts' < time <= 'to_rts',
+    but the ds readings are grouped into bins by the db, so only one row per bin is fetched.
+    'resample_ds_readings' remains the reference implementation.
+    """
+
+    # the same as 'ceil_timestamp', 'time' is always positive, so the integer division can be used
+    rts_expr = ExpressionWrapper(
+        (F("time") + Value(time_resample - 1)) / Value(time_resample) * Value(time_resample),
+        output_field=BigIntegerField(),
+    )
+    qs = DsReading.objects.filter(datastream__id=ds_pk, time__gt=from_rts, time__lte=to_rts)
+
+    # the statistics of every bin are calculated with window functions,
+    # the row of the last ds reading of the bin is taken, it also gives the last value
+    rows = (
+        qs.annotate(
+            rts=rts_expr,
+            row_num=Window(RowNumber(), partition_by=rts_expr, order_by=F("time").desc()),
+            bin_count=Window(Count("time"), partition_by=rts_expr),
+            bin_sum=Window(Sum("db_value"), partition_by=rts_expr),
+            bin_min=Window(Min("db_value"), partition_by=rts_expr),
+            bin_max=Window(Max("db_value"), partition_by=rts_expr),
+        )
+        .filter(row_num=1)
+        .order_by("rts")
+        .values_list("rts", "bin_count", "bin_sum", "bin_min", "bin_max", "db_value")
+    )
+
+    df_reading_map = {}
+    agg_func = rollup_agg_map[agg_type]
+    for rts, count, sum_value, min_value, max_value, last_value in rows:
+        stats = DfReadingStats(
+            time=rts, datafeed=df, count=count, sum=sum_value, min=min_value, max=max_value, last=last_value
+        )
+        dfr = DfReading(time=rts, value=agg_func(stats), datafeed=df, restored=False)
+        if with_stats:
+            dfr.stats = stats
+        df_reading_map[rts] = dfr
+
+    # injection of 'not_to_use' property
+    if len(df_reading_map) > 0:
+        df_reading_map[next(reversed(df_reading_map))].not_to_use = NotToUseDfrTypes.UNCLOSED
+
+    return df_reading_map
+
+
+def resample_ds_rollups(
+    sorted_rollups: list[DsReadingRollup],
+    df: Datafeed,
+    agg_type: DataAggTypes,
+    with_stats: bool = False,
+) -> IndDfReadingMap:
+    """
+    Does the same as 'resample_ds_readings', but the bins are taken from the rollups,
+    the rollups should be already combined to the time resample of the datafeed.
+    """
+
+    df_reading_map = {}
+    agg_func = rollup_agg_map[agg_type]
+
+    last_df_reading_rts = sorted_rollups[-1].time if len(sorted_rollups) > 0 else 0
+    for rollup in sorted_rollups:
+        if rollup.count == 0:
+            continue
+        dfr = DfReading(time=rollup.time, value=agg_func(rollup), datafeed=df, restored=False)
+        if with_stats:
+            dfr.stats = DfReadingStats(
+                time=rollup.time,
+                datafeed=df,
+                count=rollup.count,
+                sum=rollup.sum,
+                min=rollup.min,
+                max=rollup.max,
+                last=rollup.last,
+            )
+        df_reading_map[rollup.time] = dfr
+        # injection of 'not_to_use' property
+        if rollup.time == last_df_reading_rts:
+            dfr.not_to_use = NotToUseDfrTypes.UNCLOSED
+
+    return df_reading_map
+
+
 def resample_and_augment_ds_readings(
     sorted_dsrs_and_ndms: Sequence[DsReading | NoDataMarker],
     df: Datafeed,
@@ -287,38 +473,132 @@ def restore_totalizer(
     time_change: int,
     start_rts: int,
     last_nat_dfr_from_prev_period,
-) -> IndDfReadingMap:
+) -> tuple[IndDfReadingMap, np.ndarray, np.ndarray]:
+    """
+    Fills the gaps between native df readings linearly if a gap is not longer than 'time_change'.
+    The gap after the penultimate native df reading is not filled, the last df reading is marked instead.
+    All the fill points of the batch are calculated at once with numpy and returned as arrays
+    (timestamps, db values) apart from the native df readings, so they can be inserted without creating
+    model instances (see 'bulk_insert_df_values').
+    """
 
     sorted_df_readings = sorted(df_reading_map.values(), key=lambda x: x.time)
 
     if last_nat_dfr_from_prev_period is not None:
-        # maybe not the best solution from the performance point of view
-        sorted_df_readings.insert(0, last_nat_dfr_from_prev_period)
+        sorted_df_readings = [last_nat_dfr_from_prev_period, *sorted_df_readings]
 
+    no_fill_rtss = np.empty(0, dtype=np.int64)
+    no_fill_values = np.empty(0, dtype=np.float64)
     if len(sorted_df_readings) < 2:
-        return df_reading_map
+        return df_reading_map, no_fill_rtss, no_fill_values
 
-    new_df_reading_map = df_reading_map.copy()  # add native df readings first
-    i = 0
+    # the gap before the last native df reading defines how the last reading can be used
+    delta_time = sorted_df_readings[-1].time - sorted_df_readings[-2].time
+    if delta_time > time_resample:
+        if delta_time <= time_change:
+            sorted_df_readings[-1].not_to_use = NotToUseDfrTypes.SPLINE_UNCLOSED
+        else:
+            sorted_df_readings[-1].not_to_use = NotToUseDfrTypes.SPLINE_NOT_TO_USE
+    else:
+        sorted_df_readings[-1].not_to_use = NotToUseDfrTypes.UNCLOSED
+
+    num_points = len(sorted_df_readings)
+    tss = np.fromiter((r.time for r in sorted_df_readings), dtype=np.int64, count=num_points)
+    values = np.fromiter((r.value for r in sorted_df_readings), dtype=np.float64, count=num_points)
+    delta_tss = np.diff(tss)
+    delta_values = np.diff(values)
+
+    # a totalizer cannot decrease, if it happens, the counter was reset or rolled over
+    # (in the neighbouring bins as well as across a gap)
+    is_reset = delta_values < 0
+    if is_reset.any():
+        reset_rtss = tss[1:][is_reset].tolist()
+        logger.warning(f"Totalizer reset detected in df {df.pk} before {reset_rtss}")
+
+    # only the gaps between the readings before the last one are filled,
+    # the interpolation across a reset makes no sense, so such a gap is left as it is
+    is_gap_to_fill = (delta_tss > time_resample) & (delta_tss <= time_change) & ~is_reset
+    is_gap_to_fill[-1] = False
+    gap_idxs = np.flatnonzero(is_gap_to_fill)
+
+    if len(gap_idxs) == 0:
+        return df_reading_map, no_fill_rtss, no_fill_values
+
+    # grid points strictly inside each gap
+    num_fill_points = delta_tss[gap_idxs] // time_resample - 1
+    gap_first_idxs = np.cumsum(num_fill_points) - num_fill_points
+    steps = np.arange(1, num_fill_points.sum() + 1) - np.repeat(gap_first_idxs, num_fill_points)
+    fill_rtss = np.repeat(tss[gap_idxs], num_fill_points) + steps * time_resample
+
+    k = delta_values[gap_idxs] / delta_tss[gap_idxs]
+    b = values[gap_idxs] - k * tss[gap_idxs]
+    fill_values = np.repeat(k, num_fill_points) * fill_rtss + np.repeat(b, num_fill_points)
+    if df.is_value_interger:
+        # the same rounding as the 'value' setter of 'DfReading' does
+        fill_values = np.round(fill_values)
+
+    is_after_start = fill_rtss > start_rts
+    return df_reading_map, fill_rtss[is_after_start], fill_values[is_after_start]
+
+
+def bulk_insert_df_values(df_pk: int, rtss: np.ndarray, db_values: np.ndarray, restored: bool = False) -> None:
+    """
+    Inserts df readings given as arrays without creating model instances. 'db_values' should be
+    already rounded for the datafeeds with integer values (the 'value' setter of 'DfReading' does it otherwise).
+    """
+    if len(rtss) == 0:
+        return
+    meta = DfReading._meta
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(meta.get_field(name).column) for name in ("time", "datafeed", "db_value", "restored"))
+    sql = f"INSERT INTO {qn(meta.db_table)} ({columns}) VALUES (%s, %s, %s, %s)"
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(rts, df_pk, v, restored) for rts, v in zip(rtss.tolist(), db_values.tolist())])
 
-    while i < len(sorted_df_readings):
-        delta_time = sorted_df_readings[i + 1].time - sorted_df_readings[i].time
-        if i == len(sorted_df_readings) - 2:  # if we reached the penultimate native df reading
-            if delta_time > time_resample:
-                if delta_time <= time_change:
-                    sorted_df_readings[i + 1].not_to_use = NotToUseDfrTypes.SPLINE_UNCLOSED
-                else:
-                    sorted_df_readings[i + 1].not_to_use = NotToUseDfrTypes.SPLINE_NOT_TO_USE
-            else:
-                sorted_df_readings[i + 1].not_to_use = NotToUseDfrTypes.UNCLOSED
-            break
-
-        if delta_time > time_resample and delta_time <= time_change:
-            grid = create_grid(sorted_df_readings[i].time, sorted_df_readings[i + 1].time, time_resample)
-            k = (sorted_df_readings[i + 1].value - sorted_df_readings[i].value) / delta_time
-            b = sorted_df_readings[i].value - k * sorted_df_readings[i].time
-            for rts in grid:
-                if rts > start_rts and rts not in new_df_reading_map:
-                    new_df_reading_map[rts] = DfReading(time=rts, datafeed=df, value=k * rts + b, restored=True)
-        i += 1
-    return new_df_reading_map
+
+def delete_df_readings(df: Datafeed, start_rts: int, end_rts: int) -> int:
+    """
+    Deletes the df readings of the datafeed within (start_rts, end_rts] together with everything derived from them -
+    the spans (the parts of them outside the range are kept), the stats and the restoration context.
+    Returns the number of deleted df readings.
+    """
+    num_deleted, _ = DfReading.objects.filter(datafeed_id=df.pk, time__gt=start_rts, time__lte=end_rts).delete()
+    DfReadingStats.objects.filter(datafeed_id=df.pk, time__gt=start_rts, time__lte=end_rts).delete()
+
+    # the spans overlapping the range are replaced with their parts before and after it,
+    # a span covering the whole range is split into two
+    time_resample = df.time_resample
+    spans = list(DfReadingSpan.objects.filter(datafeed_id=df.pk, time__lte=end_rts, end_time__gt=start_rts))
+    new_spans = []
+    for span in spans:
+        if span.time <= start_rts:
+            head_end_time = span.time + (start_rts - span.time) // time_resample * time_resample
+            new_spans.append(
+                DfReadingSpan(
+                    time=span.time,
+                    end_time=head_end_time,
+                    datafeed_id=df.pk,
+                    db_value=span.db_value,
+                    restored=span.restored,
+                )
+            )
+        if span.end_time > end_rts:
+            tail_time = span.time + ((end_rts - span.time) // time_resample + 1) * time_resample
+            new_spans.append(
+                DfReadingSpan(
+                    time=tail_time,
+                    end_time=span.end_time,
+                    datafeed_id=df.pk,
+                    db_value=span.db_value,
+                    restored=span.restored,
+                )
+            )
+    DfReadingSpan.objects.filter(datafeed_id=df.pk, time__in=[span.time for span in spans]).delete()
+    DfReadingSpan.objects.bulk_create(new_spans)
+
+    # the context may contain the deleted df readings, it is collected again from the db when needed
+    if df.last_nat_readings is not None:
+        df.last_nat_readings = None
+        df.update_fields.add("last_nat_readings")
+        df.save(update_fields=df.update_fields)
+    return num_deleted
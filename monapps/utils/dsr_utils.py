@@ -1,4 +1,5 @@
 import logging
+from bisect import bisect_right
 from collections.abc import Iterable
 
 from apps.datastreams.models import Datastream
@@ -11,6 +12,7 @@ from apps.dsreadings.models import (
     UnusedNoDataMarker,
 )
 from common.constants import DataAggTypes, VariableTypes
+from utils.dfr_utils import bin_ds_readings
 
 logger = logging.getLogger("#dsr_utils")
 
@@ -132,3 +134,68 @@ def roc_filter_ds_readings(
             prev_filt_ts = r.time
 
     return proc_ds_readings, non_proc_ds_readings
+
+
+class DsReadingCache:
+    """
+    Keeps the ds readings of one datastream for the interval ('from_ts', 'to_ts'] in memory,
+    at most 'max_num' of them, so 'to_ts' can be moved back when the limit is hit.
+    It is used when several datafeeds of the same datastream are resampled together,
+    so the readings are fetched from the db and distributed into bins only once.
+    Requests outside the loaded interval go to the db.
+    """
+
+    def __init__(self, ds_pk: int) -> None:
+        self.ds_pk = ds_pk
+        self.from_ts = None
+        self.to_ts = None
+        self.ds_readings: list[DsReading] = []
+        self.tss: list[int] = []
+        self.bins_by_resol: dict[int, dict[int, list[DsReading]]] = {}
+        self.bin_rtss_by_resol: dict[int, list[int]] = {}
+
+    def load(self, from_ts: int, to_ts: int, time_resamples: Iterable[int], max_num: int | None = None) -> None:
+        qs = DsReading.objects.filter(datastream__id=self.ds_pk, time__gt=from_ts, time__lte=to_ts).order_by("time")
+        self.ds_readings = list(qs if max_num is None else qs[:max_num])
+        self.from_ts = from_ts
+        self.to_ts = to_ts
+        if max_num is not None and len(self.ds_readings) == max_num:
+            # the times of the ds readings of one datastream are unique, so the interval up to the last
+            # cached reading is complete, the requests beyond it go to the db
+            self.to_ts = self.ds_readings[-1].time
+        self.tss = [r.time for r in self.ds_readings]
+        self.bins_by_resol = bin_ds_readings(self.ds_readings, time_resamples)
+        self.bin_rtss_by_resol = {resol: list(bins) for resol, bins in self.bins_by_resol.items()}
+        logger.debug(f"{len(self.ds_readings)} ds readings of ds {self.ds_pk} were cached")
+
+    def covers(self, from_ts: int, to_ts: int) -> bool:
+        return self.from_ts is not None and self.from_ts <= from_ts and to_ts <= self.to_ts
+
+    def get_ds_readings(self, from_ts: int, to_ts: int) -> list[DsReading]:
+        # returns the ds readings with 'from_ts' < time <= 'to_ts' sorted by time
+        if not self.covers(from_ts, to_ts):
+            return list(
+                DsReading.objects.filter(datastream__id=self.ds_pk, time__gt=from_ts, time__lte=to_ts).order_by("time")
+            )
+        return self.ds_readings[bisect_right(self.tss, from_ts):bisect_right(self.tss, to_ts)]
+
+    def get_bins(self, time_resample: int, from_rts: int, to_rts: int) -> dict[int, list[DsReading]] | None:
+        """
+        Returns the bins with 'from_rts' < rts <= 'to_rts' for the ds readings with 'from_rts' < time <= 'to_rts'.
+        'from_rts' and 'to_rts' are expected to be multiples of 'time_resample', otherwise
+        the first and the last bins can't be taken as they are, and None is returned.
+        """
+        if (
+            not self.covers(from_rts, to_rts)
+            or time_resample not in self.bins_by_resol
+            or from_rts % time_resample != 0
+            or to_rts % time_resample != 0
+        ):
+            return None
+        bins = self.bins_by_resol[time_resample]
+        bin_rtss = self.bin_rtss_by_resol[time_resample]
+        # the first cached bin may be incomplete if 'self.from_ts' isn't a multiple of 'time_resample',
+        # but such a bin always has rts <= 'from_rts' and isn't included
+        start = bisect_right(bin_rtss, from_rts)
+        end = bisect_right(bin_rtss, to_rts)
+        return {rts: bins[rts] for rts in bin_rtss[start:end]}
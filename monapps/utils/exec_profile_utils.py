@@ -0,0 +1,66 @@
+import time
+from contextlib import contextmanager
+from typing import Any
+
+import numpy as np
+
+
+class ExecProfiler:
+    """
+    Measures the time (ms) and the number of processed rows of every phase of an application execution.
+    The phases of one execution are added to the rolling profile of the application ('Application.exec_profile') -
+    the last 'num_samples' values of every phase, the percentiles are calculated from them when requested.
+    """
+
+    def __init__(self, is_enabled: bool) -> None:
+        self.is_enabled = is_enabled
+        self.phase_map: dict[str, list[float | int]] = {}  # {phase: [ms, rows]}
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.is_enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, (time.perf_counter() - start) * 1000)
+
+    def add_time(self, name: str, ms: float) -> None:
+        if self.is_enabled:
+            self.phase_map.setdefault(name, [0.0, 0])[0] += ms
+
+    def add_rows(self, name: str, num_rows: int) -> None:
+        if self.is_enabled:
+            self.phase_map.setdefault(name, [0.0, 0])[1] += num_rows
+
+    def add_to_profile(self, profile: dict[str, Any], num_samples: int) -> dict[str, Any]:
+        # {phase: {"ms": [...], "rows": [...]}}, a new dict is returned, so the change can be detected
+        new_profile = {name: dict(phase_samples) for name, phase_samples in profile.items()}
+        phase_map = {**self.phase_map, "total": [sum(ms for ms, _ in self.phase_map.values()), 0]}
+        for name, (ms, num_rows) in phase_map.items():
+            phase_samples = new_profile.setdefault(name, {"ms": [], "rows": []})
+            phase_samples["ms"] = [*phase_samples["ms"], round(ms, 2)][-num_samples:]
+            phase_samples["rows"] = [*phase_samples["rows"], num_rows][-num_samples:]
+        return new_profile
+
+
+def get_profile_percentiles(profile: dict[str, Any]) -> dict[str, dict[str, float | int]]:
+    # percentiles of the phase times over the samples kept in the profile, the phases with the largest sum go first
+    percentiles = {}
+    for name, phase_samples in profile.items():
+        mss = np.array(phase_samples["ms"], dtype=np.float64)
+        if len(mss) == 0:
+            continue
+        p50, p90, p99 = np.percentile(mss, (50, 90, 99))
+        percentiles[name] = {
+            "numSamples": len(mss),
+            "p50Ms": round(p50, 2),
+            "p90Ms": round(p90, 2),
+            "p99Ms": round(p99, 2),
+            "maxMs": round(mss.max(), 2),
+            "sumMs": round(mss.sum(), 2),
+            "meanRows": round(float(np.mean(phase_samples["rows"])), 1),
+        }
+    return dict(sorted(percentiles.items(), key=lambda item: -item[1]["sumMs"]))
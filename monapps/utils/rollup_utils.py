@@ -0,0 +1,124 @@
+import logging
+from collections.abc import Iterable
+
+from django.conf import settings
+
+from apps.datastreams.models import Datastream
+from apps.dsreadings.models import DsReading, DsReadingRollup
+from utils.ts_utils import ceil_timestamp
+from utils.update_utils import set_attr_if_cond
+
+logger = logging.getLogger("#rollup_utils")
+
+
+def get_rollup_tier(time_resample: int) -> int | None:
+    """
+    Returns the biggest rollup tier that 'time_resample' is a multiple of.
+    """
+    tiers = [tier for tier in settings.DS_ROLLUP_TIERS_MS if time_resample % tier == 0]
+    if len(tiers) == 0:
+        return None
+    return max(tiers)
+
+
+def add_value_to_rollup(rollup: DsReadingRollup, value: float) -> None:
+    # values are expected to come in the chronological order
+    if rollup.count == 0:
+        rollup.min = value
+        rollup.max = value
+    else:
+        rollup.min = min(rollup.min, value)
+        rollup.max = max(rollup.max, value)
+    rollup.count += 1
+    rollup.sum += value
+    rollup.last = value
+
+
+def merge_rollups(rollup: DsReadingRollup, later_rollup: DsReadingRollup) -> None:
+    # 'later_rollup' should contain the readings that are newer than the ones in 'rollup'
+    if later_rollup.count == 0:
+        return
+    if rollup.count == 0:
+        rollup.min = later_rollup.min
+        rollup.max = later_rollup.max
+    else:
+        rollup.min = min(rollup.min, later_rollup.min)
+        rollup.max = max(rollup.max, later_rollup.max)
+    rollup.count += later_rollup.count
+    rollup.sum += later_rollup.sum
+    rollup.last = later_rollup.last
+
+
+def create_rollups(
+    sorted_ds_readings: Iterable[DsReading], ds_pk: int, tiers: Iterable[int]
+) -> dict[tuple[int, int], DsReadingRollup]:
+    """
+    Aggregates ds readings into the bins of all the tiers in one pass.
+    Returns {(tier, rts): rollup}.
+    """
+    rollup_map = {}
+    for r in sorted_ds_readings:
+        for tier in tiers:
+            rts = ceil_timestamp(r.time, tier)
+            rollup = rollup_map.get((tier, rts))
+            if rollup is None:
+                rollup = DsReadingRollup(datastream_id=ds_pk, tier=tier, time=rts, count=0, sum=0.0)
+                rollup_map[(tier, rts)] = rollup
+            add_value_to_rollup(rollup, r.db_value)
+    return rollup_map
+
+
+def combine_rollups(sorted_rollups: Iterable[DsReadingRollup], time_resample: int) -> list[DsReadingRollup]:
+    """
+    Combines rollups of a smaller tier into the bins of 'time_resample',
+    'time_resample' should be a multiple of the tier.
+    """
+    combined = {}
+    for rollup in sorted_rollups:
+        rts = ceil_timestamp(rollup.time, time_resample)
+        if rts not in combined:
+            combined[rts] = DsReadingRollup(
+                datastream_id=rollup.datastream_id, tier=time_resample, time=rts, count=0, sum=0.0
+            )
+        merge_rollups(combined[rts], rollup)
+    return list(combined.values())
+
+
+def update_ds_rollups(ds: Datastream, sorted_ds_readings: list[DsReading], from_ts: int, to_ts: int) -> bool:
+    """
+    Adds ds readings to the rollups of the datastream and moves 'ds.rollup_ts' (the datastream is not saved).
+    'sorted_ds_readings' should contain ALL the ds readings of the datastream with 'from_ts' < time <= 'to_ts',
+    readings with 'time' > 'to_ts' are ignored. If there is a gap between 'ds.rollup_ts' and 'from_ts',
+    nothing is done, as the rollups would miss some readings.
+    """
+    if ds.rollup_ts < from_ts or ds.rollup_ts >= to_ts:
+        return False
+
+    new_ds_readings = [r for r in sorted_ds_readings if ds.rollup_ts < r.time <= to_ts]
+
+    if len(new_ds_readings) > 0:
+        new_rollup_map = create_rollups(new_ds_readings, ds.pk, settings.DS_ROLLUP_TIERS_MS)
+
+        # only the first bin of every tier can already exist in the db
+        existing_rollup_qs = DsReadingRollup.objects.filter(
+            datastream__id=ds.pk,
+            time__gt=ds.rollup_ts,
+            time__lte=ceil_timestamp(new_ds_readings[0].time, max(settings.DS_ROLLUP_TIERS_MS)),
+        )
+        for existing_rollup in existing_rollup_qs:
+            new_rollup = new_rollup_map.get((existing_rollup.tier, existing_rollup.time))
+            if new_rollup is None:
+                continue
+            merge_rollups(existing_rollup, new_rollup)
+            new_rollup_map[(existing_rollup.tier, existing_rollup.time)] = existing_rollup
+
+        DsReadingRollup.objects.bulk_create(
+            new_rollup_map.values(),
+            update_conflicts=True,
+            unique_fields=["datastream", "tier", "time"],
+            update_fields=["count", "sum", "min", "max", "last"],
+        )
+        logger.debug(f"{len(new_rollup_map)} rollups of ds {ds.pk} were updated")
+
+    set_attr_if_cond(to_ts, ">", ds, "rollup_ts")
+    return True
@@ -1,8 +1,12 @@
-from typing import List
+from datetime import timedelta
+from typing import List, TYPE_CHECKING
 
 from django.utils import timezone
 from django.utils.timezone import datetime
 
+if TYPE_CHECKING:
+    from django_celery_beat.models import IntervalSchedule
+
 
 def create_ts_ms_from_iso_str(iso_string: str) -> int:
     """
@@ -70,3 +74,7 @@ def create_now_ts_ms() -> int:
 
 def create_iso_str_from_ts_ms(ts_ms: int) -> str:
     return create_dt_from_ts_ms(ts_ms).isoformat()
+
+
+def get_interval_ms(interval: "IntervalSchedule") -> int:
+    return int(timedelta(**{interval.period: interval.every}).total_seconds() * 1000)